@@ -0,0 +1,313 @@
+# batch_planner.py
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+import travel_agent
+from booking_ledger import BookingLedger
+from checkpoints import create_checkpointer
+from travel_agent import (
+    EXTRACTION_TIER_STATS, METRICS, TravelPlanningState, arun_plan,
+    create_async_travel_agent, create_travel_agent, run_plan, warm_up_llm
+)
+
+# ==================== 配置区域 ====================
+DEFAULT_WORKERS = 8
+DEFAULT_CONCURRENCY = 256  # 异步模式下同时在途的规划数
+# 每个 worker 最多排队的请求数，防止一次性把整个输入文件读进内存
+QUEUE_FACTOR = 2
+
+# ==================== 输入输出 ====================
+def read_requests(lines: Iterable[str]) -> Iterator[dict]:
+    """逐行解析 JSONL 请求
+
+    每行可以是 {"id": ..., "user_input": ..., "budget": ..., "idempotency_key": ...}，也可以直接是
+    一个 JSON 字符串；缺少 id 时使用行号，缺少 idempotency_key 时由 id 与 user_input 派生。
+    无法解析或缺少 user_input 的行产出 {"id": ..., "invalid": 原因}，执行时写成一条错误结果，不中断整批。
+    """
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield {"id": line_no, "invalid": f"无法解析的 JSON: {e}"}
+            continue
+        if isinstance(record, str):
+            record = {"user_input": record}
+        if not isinstance(record, dict):
+            yield {"id": line_no, "invalid": f"请求应为对象或字符串，实际为 {type(record).__name__}"}
+            continue
+        record.setdefault("id", line_no)
+        if not isinstance(record.get("user_input"), str):
+            yield {"id": record["id"], "invalid": "缺少 user_input"}
+            continue
+        yield record
+
+# 入住期间没有空房而未能预订的结束步骤，统计时与成功、其他错误分开
+SOLD_OUT_STEPS = ("hotels_sold_out", "booking_sold_out")
+
+def plan_status(final_state: TravelPlanningState) -> str:
+    """规划结果：success / sold_out（满房）/ error"""
+    booking = final_state["booking_result"]
+    if booking and booking["status"] == "success":
+        return "success"
+    return "sold_out" if final_state.get("current_step") in SOLD_OUT_STEPS else "error"
+
+def summarize_state(final_state: TravelPlanningState) -> dict:
+    """把最终状态压缩为可序列化的结果记录"""
+    booking = final_state["booking_result"]
+    flight = final_state["flights_result"]
+    hotel = final_state["selected_hotel"]
+
+    total_cost = None
+    if booking and flight and hotel:
+        total_cost = flight["price"] + hotel["price_per_night"] * final_state["nights"]
+
+    return {
+        "status": plan_status(final_state),
+        "destination": final_state["destination"],
+        "travel_date": final_state["travel_date"],
+        "requested_travel_date": final_state.get("requested_travel_date"),
+        "nights": final_state["nights"],
+        "guest_name": final_state["guest_name"],
+        "flight_number": flight["flight_number"] if flight else None,
+        "hotel_name": hotel["name"] if hotel else None,
+        "hotel_alternatives": [alt["name"] for alt in final_state.get("hotel_alternatives") or []],
+        "booking_id": booking["booking_id"] if booking else None,
+        "total_cost": total_cost,
+        "error_message": final_state["error_message"],
+    }
+
+# ==================== 统计 ====================
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩法计算百分位数，sorted_values 需已升序排列"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def latency_summary(latencies_ms: List[float]) -> dict:
+    """汇总延迟分布（毫秒）"""
+    values = sorted(latencies_ms)
+    return {
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50": round(percentile(values, 50), 3),
+        "p90": round(percentile(values, 90), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(values[-1], 3) if values else 0.0,
+    }
+
+# ==================== 批量执行 ====================
+class ResultWriter:
+    """逐条写出结果并累计统计，不保留结果本身"""
+
+    def __init__(self, output: TextIO):
+        self.output = output
+        self.latencies: List[float] = []
+        self.succeeded = 0
+        self.sold_out = 0
+        self.failed = 0
+
+    def write(self, result: dict):
+        self.latencies.append(result["latency_ms"])
+        if result["status"] == "success":
+            self.succeeded += 1
+        elif result["status"] == "sold_out":
+            self.sold_out += 1
+        else:
+            self.failed += 1
+        self.output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    def summary(self, elapsed: float, **extra) -> dict:
+        total = self.succeeded + self.sold_out + self.failed
+        result = {
+            "total": total,
+            "succeeded": self.succeeded,
+            "sold_out": self.sold_out,
+            "failed": self.failed,
+        }
+        result.update(extra)
+        result.update({
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 3) if elapsed > 0 else 0.0,
+            "latency_ms": latency_summary(self.latencies),
+            "extraction_cache": travel_agent.EXTRACTION_CACHE.stats(),
+            "booking_ledger": travel_agent.BOOKING_LEDGER.stats(),
+            "room_inventory": travel_agent.ROOM_INVENTORY.stats(),
+            "extraction_tiers": EXTRACTION_TIER_STATS.snapshot(),
+            "llm_usage": travel_agent.llm_usage_report(),
+            "llm_resilience": travel_agent.llm_resilience_report(),
+            "node_latency": METRICS.snapshot()["nodes"],
+            "llm_latency": METRICS.snapshot()["llm"],
+        })
+        return result
+
+def _result_record(request: dict, start: float, final_state=None, error: Exception = None) -> dict:
+    if error is None:
+        result = summarize_state(final_state)
+    else:
+        result = {"status": "error", "error_message": f"{type(error).__name__}: {error}"}
+
+    result["id"] = request.get("id")
+    result["user_input"] = request.get("user_input")
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return result
+
+def _thread_id(request: dict) -> str:
+    return f"batch-{request['id']}"
+
+def plan_one(agent, request: dict) -> dict:
+    """执行单个规划请求，异常也转换为结果记录
+
+    agent 带检查点时以请求 id 作为 thread_id，重跑同一批请求会跳过已完成的规划。
+    """
+    start = time.perf_counter()
+    if "invalid" in request:
+        return _result_record(request, start, error=ValueError(request["invalid"]))
+    try:
+        final_state = run_plan(
+            agent, request["user_input"], _thread_id(request), request.get("budget"), request.get("idempotency_key")
+        )
+    except Exception as e:
+        return _result_record(request, start, error=e)
+    return _result_record(request, start, final_state)
+
+async def aplan_one(agent, request: dict) -> dict:
+    """plan_one 的异步版本"""
+    start = time.perf_counter()
+    if "invalid" in request:
+        return _result_record(request, start, error=ValueError(request["invalid"]))
+    try:
+        final_state = await arun_plan(
+            agent, request["user_input"], _thread_id(request), request.get("budget"), request.get("idempotency_key")
+        )
+    except Exception as e:
+        return _result_record(request, start, error=e)
+    return _result_record(request, start, final_state)
+
+def run_batch(requests: Iterable[dict], output: TextIO, workers: int = DEFAULT_WORKERS,
+              agent=None) -> dict:
+    """使用线程池并发执行批量请求
+
+    同时在途的请求数不超过 workers * QUEUE_FACTOR，每个请求完成后立即写出一行结果，
+    不在内存中保留结果列表。返回吞吐与延迟分布汇总。
+    """
+    agent = agent or create_travel_agent()
+    warm_up_llm()
+    max_in_flight = max(workers * QUEUE_FACTOR, 1)
+    writer = ResultWriter(output)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for request in requests:
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    writer.write(future.result())
+            pending.add(executor.submit(plan_one, agent, request))
+
+        for future in wait(pending).done:
+            writer.write(future.result())
+
+    return writer.summary(time.perf_counter() - start, mode="threads", workers=workers)
+
+async def arun_batch(requests: Iterable[dict], output: TextIO,
+                     concurrency: int = DEFAULT_CONCURRENCY, agent=None) -> dict:
+    """在单个事件循环上并发执行批量请求，同时在途的规划数不超过 concurrency"""
+    agent = agent or create_async_travel_agent()
+    warm_up_llm()
+    writer = ResultWriter(output)
+
+    start = time.perf_counter()
+    pending = set()
+    for request in requests:
+        if len(pending) >= concurrency:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                writer.write(task.result())
+        pending.add(asyncio.ensure_future(aplan_one(agent, request)))
+
+    if pending:
+        done, _ = await asyncio.wait(pending)
+        for task in done:
+            writer.write(task.result())
+
+    return writer.summary(time.perf_counter() - start, mode="async", concurrency=concurrency)
+
+# ==================== 命令行入口 ====================
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="批量旅行规划：JSONL 输入，JSONL 输出")
+    parser.add_argument("input", help="请求文件（JSONL），'-' 表示标准输入")
+    parser.add_argument("-o", "--output", default="-", help="结果文件（JSONL），默认标准输出")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="并发 worker 数")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="使用异步图在单个事件循环上执行")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="异步模式下同时在途的规划数")
+    parser.add_argument("--parallel-search", action="store_true", default=None,
+                        help="信息提取后并行查询航班和酒店")
+    parser.add_argument("--rule-only", action="store_true",
+                        help="只用规则引擎提取信息，不调用也不导入 LLM 客户端")
+    parser.add_argument("--checkpoint-db", help="把每一步的状态写入该 SQLite 文件，中断后重跑可从断点继续")
+    parser.add_argument("--ledger-db", help="预订账本写入该 SQLite 文件；重跑同一批请求不会重复预订")
+    parser.add_argument("--metrics-prom", help="结束时把指标写成 Prometheus 文本格式")
+    parser.add_argument("--metrics-jsonl", help="把每个节点 / 路由 / LLM 调用事件逐行写入该 JSONL 文件")
+    parser.add_argument("-v", "--verbose", action="store_true", help="保留各节点的打印输出")
+    args = parser.parse_args(argv)
+    if args.rule_only:
+        travel_agent.configure(rule_only=True)
+    if args.ledger_db:
+        travel_agent.configure(ledger=BookingLedger(args.ledger_db))
+
+    def execute():
+        requests = read_requests(input_file)
+        checkpointer = create_checkpointer("sqlite", args.checkpoint_db) if args.checkpoint_db else None
+        if args.use_async:
+            agent = create_async_travel_agent(parallel_search=args.parallel_search, checkpointer=checkpointer)
+            return asyncio.run(arun_batch(requests, output_file, concurrency=args.concurrency, agent=agent))
+        agent = create_travel_agent(parallel_search=args.parallel_search, checkpointer=checkpointer)
+        return run_batch(requests, output_file, workers=args.workers, agent=agent)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    metrics_file = open(args.metrics_jsonl, "w", encoding="utf-8") if args.metrics_jsonl else None
+    METRICS.set_event_log(metrics_file)
+
+    try:
+        if args.verbose:
+            summary = execute()
+        else:
+            # 节点中的 print 在批量模式下只是噪音，统一丢弃
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                summary = execute()
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+        if metrics_file is not None:
+            METRICS.set_event_log(None)
+            metrics_file.close()
+    
+    if args.metrics_prom:
+        with open(args.metrics_prom, "w", encoding="utf-8") as f:
+            f.write(METRICS.to_prometheus())
+
+    print("📊 批量执行汇总:", file=sys.stderr)
+    print(json.dumps(summary, ensure_ascii=False, indent=2), file=sys.stderr)
+    return summary
+
+if __name__ == "__main__":
+    main()
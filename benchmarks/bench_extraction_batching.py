@@ -0,0 +1,81 @@
+# benchmarks/bench_extraction_batching.py
+"""微批提取吞吐：同样的并发提取请求，逐条调用 LLM 与按窗口合并成批对比
+
+在进程内启动 mock_llm_server（固定延迟 + 按输出 token 计的生成耗时），关闭提取缓存，
+每轮同时发出 --requests 个 aextract_info_with_llm，报告每秒提取数、LLM 调用次数、
+每条请求的提示词 token 数、回退到规则提取的次数与延迟分位数。每轮开始前重置熔断器，
+延迟预算默认放宽到 --latency-budget，避免排队较长的一轮回退到规则提取、测到的不是 LLM 吞吐。
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_extraction_batching
+    python -m benchmarks.bench_extraction_batching -n 512 --latency-ms 300 --output-token-ms 20
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import os
+import time
+
+import travel_agent
+from batch_planner import latency_summary
+from load_generator import configure_agent, synthetic_inputs
+from mock_llm_server import MockLLMConfig, start_in_background
+
+# (名称, 窗口毫秒, 每批上限)，窗口为 0 表示不合并
+CONFIGS = [
+    ("逐条调用", 0, 1),
+    ("微批 10ms x8", 10, 8),
+    ("微批 20ms x16", 20, 16),
+    ("微批 50ms x32", 50, 32),
+]
+
+async def run_round(inputs, count: int) -> tuple:
+    latencies = []
+
+    async def one(user_input: str):
+        start = time.perf_counter()
+        await travel_agent.aextract_info_with_llm(user_input)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    began = time.perf_counter()
+    await asyncio.gather(*[one(next(inputs)) for _ in range(count)])
+    return count / (time.perf_counter() - began), latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="微批提取吞吐基准")
+    parser.add_argument("-n", "--requests", type=int, default=256, help="每轮同时发出的提取请求数")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="模拟 LLM 的固定延迟")
+    parser.add_argument("--output-token-ms", type=float, default=5.0, help="模拟 LLM 每个输出 token 的生成耗时")
+    parser.add_argument("--llm-max-in-flight", type=int, default=travel_agent.LLM_MAX_IN_FLIGHT)
+    parser.add_argument("--latency-budget", type=float, default=600.0, help="每次提取的延迟预算（秒）")
+    args = parser.parse_args()
+
+    server = start_in_background(config=MockLLMConfig(args.latency_ms, output_token_ms=args.output_token_ms))
+    base_url = f"http://127.0.0.1:{server.server_port}/v1"
+    inputs = itertools.cycle(list(itertools.islice(synthetic_inputs(), 1000)))
+    travel_agent.configure(tiered_extraction=False, extraction_latency_budget_s=args.latency_budget)
+    travel_agent.METRICS.set_event_log(None)
+
+    print(f"模拟 LLM：延迟 {args.latency_ms}ms + 每输出 token {args.output_token_ms}ms，"
+          f"LLM 并发上限 {args.llm_max_in_flight}，每轮 {args.requests} 个请求")
+    for name, window_ms, batch_size in CONFIGS:
+        configure_agent(base_url, "llm", args.llm_max_in_flight, cache=False,
+                        batch_window_ms=window_ms, batch_size=batch_size)
+        travel_agent.METRICS.reset()
+        travel_agent.CIRCUIT_BREAKER.reset()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            travel_agent.warm_up_llm()
+            rate, latencies = asyncio.run(run_round(inputs, args.requests))
+        calls = sum(travel_agent.METRICS.counter_values("travel_agent_llm_calls_total", "status").values())
+        usage = travel_agent.llm_usage_report()
+        fallbacks = sum(travel_agent.llm_resilience_report()["fallbacks"].values())
+        latency = latency_summary(latencies)
+        print(f"{name:<14} {rate:8.1f} 次/秒  LLM 调用 {int(calls):>4}  "
+              f"提示词 {usage['prompt_tokens'] / args.requests:6.1f} token/条（缓存命中 {usage['cache_hit_rate']:.0%}）  "
+              f"p50 {latency['p50']:7.1f}ms  p95 {latency['p95']:7.1f}ms  解析失败率 {usage['parse_failure_rate']:.1%}  "
+              f"规则回退 {fallbacks}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
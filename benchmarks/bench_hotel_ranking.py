@@ -0,0 +1,71 @@
+# benchmarks/bench_hotel_ranking.py
+"""酒店排序微基准：对比逐个比较的 Python 循环与向量化 top-k 排序
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_hotel_ranking
+"""
+import argparse
+import random
+import timeit
+
+from hotel_inventory import HotelInventory
+from hotel_ranking import rank_columns, rank_hotels
+
+def make_inventory(count: int, seed: int = 42) -> HotelInventory:
+    """生成同一城市的 count 家随机酒店"""
+    rng = random.Random(seed)
+    return HotelInventory(
+        {
+            "city": "上海",
+            "name": f"测试酒店{i}",
+            "price_per_night": rng.randint(200, 3000),
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "available": True,
+        }
+        for i in range(count)
+    )
+
+def select_best_loop(hotels, nights):
+    """原先 select_hotel_node 中的逐个比较"""
+    best_hotel = None
+    best_score = 0
+    for hotel in hotels:
+        value_score = (hotel.get("rating", 4.0) * 100) / hotel["price_per_night"]
+        if value_score > best_score:
+            best_score = value_score
+            best_hotel = hotel
+    return best_hotel
+
+def main():
+    parser = argparse.ArgumentParser(description="酒店排序微基准")
+    parser.add_argument("-c", "--count", type=int, default=10000, help="候选酒店数")
+    parser.add_argument("-k", "--top-k", type=int, default=3, help="保留的候选数")
+    parser.add_argument("-n", "--number", type=int, default=200, help="重复次数")
+    args = parser.parse_args()
+
+    inventory = make_inventory(args.count)
+    hotels = inventory.query("上海")
+    start, end = inventory.city_range("上海")
+    prices = memoryview(inventory.prices)[start:end]
+    ratings = memoryview(inventory.ratings)[start:end]
+
+    # 默认权重下三种方式应选出同一家酒店
+    best = select_best_loop(hotels, 2)
+    assert rank_hotels(hotels, 2, top_k=args.top_k)[0][0] is best
+    assert hotels[rank_columns(prices, ratings, 2, top_k=args.top_k)[0][0]] is best
+
+    cases = {
+        "Python 循环（仅最优）": lambda: select_best_loop(hotels, 2),
+        "rank_hotels（字典列表）": lambda: rank_hotels(hotels, 2, top_k=args.top_k),
+        "rank_columns（库存列存）": lambda: rank_columns(prices, ratings, 2, top_k=args.top_k),
+    }
+
+    print(f"🏨 {args.count} 家候选酒店，top-{args.top_k}，× {args.number} 次")
+    results = {}
+    for name, func in cases.items():
+        results[name] = timeit.timeit(func, number=args.number) / args.number * 1e3
+        print(f"  {name:<20} {results[name]:8.3f} ms/次")
+    return results
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# benchmarks/bench_room_inventory.py
+"""客房库存争用基准：分段锁与单把全局锁对比，并检查没有超订
+
+每个线程反复为随机酒店预订随机入住日期的多晚，再以一定概率取消（释放）。
+--hot 把所有预订集中到一家酒店的同一段日期，模拟热门房源的最坏争用。
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_room_inventory
+    python -m benchmarks.bench_room_inventory --hot
+"""
+import argparse
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+from room_inventory import RoomInventory
+
+def worker(inventory: RoomInventory, hotels, start: date, operations: int, seed: int,
+           held: Counter, held_lock: threading.Lock, hot: bool):
+    rng = random.Random(seed)
+    mine = Counter()
+    for _ in range(operations):
+        hotel = hotels[0] if hot else rng.choice(hotels)
+        check_in = start + timedelta(days=0 if hot else rng.randrange(30))
+        nights = rng.randint(1, 4)
+        if inventory.reserve(hotel, check_in, nights):
+            if rng.random() < 0.5:
+                inventory.release(hotel, check_in, nights)
+            else:
+                for key in inventory.night_keys(hotel, check_in, nights):
+                    mine[key] += 1
+    with held_lock:
+        held.update(mine)
+
+def run(stripes: int, threads: int, operations: int, hotels, rooms: int, hot: bool) -> tuple:
+    inventory = RoomInventory(rooms, stripes=stripes)
+    held, held_lock = Counter(), threading.Lock()
+    start = date(2025, 1, 1)
+    workers = [
+        threading.Thread(target=worker, args=(inventory, hotels, start, operations, seed, held, held_lock, hot))
+        for seed in range(threads)
+    ]
+    began = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    # 每一晚：仍被持有的房间数 + 剩余房间数 必须等于容量
+    consistent = all(
+        held[key] + inventory.remaining(key[0], key[1], 1) == rooms and held[key] <= rooms
+        for key in held
+    )
+    return threads * operations / elapsed, inventory.stats(), consistent
+
+def main():
+    parser = argparse.ArgumentParser(description="客房库存争用基准")
+    parser.add_argument("-t", "--threads", type=int, default=16, help="并发线程数")
+    parser.add_argument("-n", "--operations", type=int, default=20000, help="每个线程的预订次数")
+    parser.add_argument("--hotels", type=int, default=200, help="酒店数")
+    parser.add_argument("--rooms", type=int, default=20, help="每家酒店每晚的房间数")
+    parser.add_argument("--hot", action="store_true", help="所有预订争抢同一家酒店的同几晚")
+    args = parser.parse_args()
+
+    hotels = [f"测试酒店{i}" for i in range(args.hotels)]
+    for name, stripes in [("全局锁", 1), ("分段锁 x64", 64), ("分段锁 x1024", 1024)]:
+        rate, stats, consistent = run(stripes, args.threads, args.operations, hotels, args.rooms, args.hot)
+        print(f"{name:<14} {rate:12.0f} 次/秒  成功 {stats['reserved']:>7}  满房 {stats['rejected']:>7}  "
+              f"{'✅ 无超订' if consistent else '❌ 库存不一致'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/bench_startup.py
+"""启动耗时基准：在全新子进程中测量 import travel_agent 与首个规划的耗时
+
+每次测量都启动一个新的解释器，避免模块缓存影响结果；同时记录进程中是否加载了
+LLM 客户端相关的包，用来确认仅规则模式没有导入它们。
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SAMPLE_INPUT = "明天去上海，住两晚，我叫李华"
+LLM_MODULES = ["langchain_openai", "openai", "langchain_community"]
+
+# 子进程中执行的测量脚本，结果以一行 JSON 输出
+PROBE = f"""
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+import travel_agent
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    agent = travel_agent.create_travel_agent()
+    state = agent.invoke(travel_agent.create_initial_state({SAMPLE_INPUT!r}))
+planned = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_plan_ms": (planned - imported) * 1000,
+    "status": state["booking_result"]["status"] if state["booking_result"] else "error",
+    "llm_modules": [name for name in {LLM_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+MODES = {
+    "rule_only": {"TRAVEL_AGENT_RULE_ONLY": "1"},
+    "default": {"TRAVEL_AGENT_RULE_ONLY": "0"},
+}
+
+def probe(env_overrides: dict) -> dict:
+    """在新解释器中运行一次测量"""
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, **env_overrides}
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=project_root, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="启动耗时基准")
+    parser.add_argument("-n", "--number", type=int, default=5, help="每种模式启动的进程数")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"🚀 每种模式 {args.number} 个新进程，取中位数")
+    for mode, env_overrides in MODES.items():
+        runs = [probe(env_overrides) for _ in range(args.number)]
+        results[mode] = {
+            "import_ms": round(statistics.median(run["import_ms"] for run in runs), 1),
+            "first_plan_ms": round(statistics.median(run["first_plan_ms"] for run in runs), 1),
+            "llm_modules": sorted({name for run in runs for name in run["llm_modules"]}),
+        }
+        result = results[mode]
+        print(f"  {mode:<10} import {result['import_ms']:7.1f} ms   首个规划 {result['first_plan_ms']:7.1f} ms   "
+              f"LLM 包: {', '.join(result['llm_modules']) or '未加载'}")
+    return results
+
+if __name__ == "__main__":
+    main()
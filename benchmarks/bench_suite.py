@@ -0,0 +1,154 @@
+# benchmarks/bench_suite.py
+"""热路径基准套件：信息提取、航班 / 酒店查询、酒店选择与完整图执行
+
+使用桩 LLM（benchmarks/stub_llm.py），无需网络即可运行。结果写入 JSON 文件并带上
+当前提交号，便于逐个提交对比；--compare 与历史结果比较，中位数变慢超过阈值时返回非零退出码。
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_suite -o bench_results.json
+    python -m benchmarks.bench_suite --compare bench_results.json
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import travel_agent
+from benchmarks.bench_text_parser import SAMPLE_INPUTS
+from benchmarks.stub_llm import install_stub_llm
+from extraction_cache import ExtractionCache
+from room_inventory import RoomInventory
+
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2  # 中位数变慢 20% 视为回归
+# graph_invoke 每次都会预订，容量需足够大，否则库存耗尽后测到的是满房的错误路径
+BENCH_ROOMS_PER_HOTEL = 10_000_000
+
+# ==================== 基准用例 ====================
+def build_cases() -> Dict[str, Callable[[], object]]:
+    """每个用例是一个无参函数，执行一次即一次操作"""
+    stub = install_stub_llm(travel_agent.LLM_CLIENTS)
+    travel_date = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    hotels = travel_agent.search_hotels("上海", travel_date, travel_date)
+
+    def select_state():
+        state = travel_agent.create_initial_state(SAMPLE_INPUTS[0])
+        state.update({"destination": "上海", "travel_date": travel_date, "nights": 2, "hotels_result": hotels})
+        return state
+
+    agent = travel_agent.create_travel_agent(parallel_search=False)
+    inputs = itertools.cycle(SAMPLE_INPUTS)
+
+    return {
+        "extract_info_simple": lambda: travel_agent.extract_info_simple(next(inputs)),
+        "parse_extraction_response": lambda: travel_agent.parse_extraction_response(stub.content),
+        "extract_info_with_llm": lambda: travel_agent.extract_info_with_llm(next(inputs)),
+        "search_flights": lambda: travel_agent.search_flights("上海", travel_date),
+        "search_hotels": lambda: travel_agent.search_hotels("上海", travel_date, travel_date),
+        "select_hotel_node": lambda: travel_agent.select_hotel_node(select_state()),
+        "graph_invoke": lambda: agent.invoke(travel_agent.create_initial_state(next(inputs))),
+    }
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> dict:
+    """先标定单轮次数（每轮至少 min_time 秒），再重复 repeat 轮，返回每次操作的耗时（微秒）"""
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+
+    per_op = [elapsed / number * 1e6 for elapsed in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "number": number,
+        "repeat": repeat,
+        "median_us": round(statistics.median(per_op), 3),
+        "min_us": round(min(per_op), 3),
+        "max_us": round(max(per_op), 3),
+    }
+
+# ==================== 结果与对比 ====================
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """返回变慢超过阈值的用例 [(名称, 基线中位数, 当前中位数)]"""
+    regressions = []
+    print(f"📈 与基线 {(baseline.get('meta') or {}).get('commit') or '(未知提交)'} 对比", file=sys.stderr)
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            print(f"  {name:<28} 新增", file=sys.stderr)
+            continue
+        ratio = result["median_us"] / old["median_us"] if old["median_us"] else 1.0
+        mark = "❌" if ratio > 1 + threshold else "✅"
+        print(f"  {mark} {name:<26} {old['median_us']:10.2f} → {result['median_us']:10.2f} µs ({ratio - 1:+.1%})", file=sys.stderr)
+        if ratio > 1 + threshold:
+            regressions.append((name, old["median_us"], result["median_us"]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="热路径基准套件（离线，桩 LLM）")
+    parser.add_argument("-o", "--output", help="结果 JSON 文件")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT, help="每个用例重复的轮数")
+    parser.add_argument("--min-time", type=float, default=0.2, help="每轮至少运行的秒数")
+    parser.add_argument("-k", "--filter", help="只运行名称包含该字符串的用例")
+    parser.add_argument("--compare", help="与该基线结果 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="视为回归的变慢比例")
+    args = parser.parse_args(argv)
+
+    # 关闭提取缓存，每次都真正执行提取；基准中不保留事件日志；使用新的大容量客房库存
+    travel_agent.configure(cache=ExtractionCache(max_size=0), room_inventory=RoomInventory(BENCH_ROOMS_PER_HOTEL))
+    travel_agent.METRICS.set_event_log(None)
+
+    results = {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        cases = build_cases()
+        for name, func in cases.items():
+            if args.filter and args.filter not in name:
+                continue
+            results[name] = measure(func, args.repeat, args.min_time)
+            print(f"  {name:<28} {results[name]['median_us']:10.2f} µs/次", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "unix_time": time.time(),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已写入 {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+# benchmarks/bench_text_parser.py
+"""文本解析器微基准：统计每条输入的解析耗时（微秒）
+
+运行方式（在项目根目录）：
+    python -m benchmarks.bench_text_parser
+"""
+import argparse
+import timeit
+from datetime import date
+
+from text_parser import TravelTextParser
+from travel_agent import SUPPORTED_DESTINATIONS, extract_info_rules
+
+SAMPLE_INPUTS = [
+    "明天去上海，住两晚，我叫李华",
+    "后天去杭州住十晚",
+    "下周三去北京，7天，姓名王伟",
+    "这周末去广州，住一晚，名字张三",
+    "月底去东京，住三个晚上",
+    "2025-10-30 去成都",
+    "十一月三日去深圳住3晚，我是赵六",
+    "我想预订去北京的机票和酒店，住3晚，我叫张三",
+]
+
+def bench(func, inputs, number: int) -> float:
+    """返回每条输入的平均耗时（微秒）"""
+    elapsed = timeit.timeit(lambda: [func(text) for text in inputs], number=number)
+    return elapsed / (number * len(inputs)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="文本解析器微基准")
+    parser.add_argument("-n", "--number", type=int, default=2000, help="每组输入的重复次数")
+    args = parser.parse_args()
+
+    today = date.today()
+    text_parser = TravelTextParser(SUPPORTED_DESTINATIONS)
+
+    results = {
+        "TravelTextParser.parse": bench(lambda text: text_parser.parse(text, today), SAMPLE_INPUTS, args.number),
+        "extract_info_rules": bench(extract_info_rules, SAMPLE_INPUTS, args.number),
+    }
+
+    print(f"📏 {len(SAMPLE_INPUTS)} 条样例输入 × {args.number} 次")
+    for name, per_input_us in results.items():
+        print(f"  {name:<28} {per_input_us:8.2f} µs/条")
+    return results
+
+if __name__ == "__main__":
+    main()
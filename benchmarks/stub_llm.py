@@ -0,0 +1,69 @@
+# benchmarks/stub_llm.py
+"""离线基准使用的桩 LLM：不发网络请求，按固定延迟返回预置的提取结果"""
+import asyncio
+import json
+import time
+from typing import Optional
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+CANNED_EXTRACTION = {
+    "destination": "上海",
+    "travel_date": "2030-01-01",
+    "nights": 2,
+    "guest_name": "李华",
+}
+
+class StubLLM:
+    """与 ChatOpenAI 的 invoke / ainvoke / stream / astream 接口一致，返回带 token 用量的 AIMessage"""
+
+    def __init__(self, latency_s: float = 0.0, response: Optional[dict] = None):
+        self.latency_s = latency_s
+        self.content = json.dumps(response or CANNED_EXTRACTION, ensure_ascii=False)
+        self.calls = 0
+
+    def _message(self, prompt) -> AIMessage:
+        self.calls += 1
+        # prompt 可以是字符串，也可以是 [(角色, 内容), ...] 消息列表
+        text = prompt if isinstance(prompt, str) else "".join(content for _, content in prompt)
+        return AIMessage(
+            content=self.content,
+            response_metadata={"token_usage": {
+                "prompt_tokens": len(text),
+                "completion_tokens": len(self.content),
+            }}
+        )
+
+    def invoke(self, prompt: str, *args, **kwargs) -> AIMessage:
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return self._message(prompt)
+
+    async def ainvoke(self, prompt: str, *args, **kwargs) -> AIMessage:
+        if self.latency_s:
+            await asyncio.sleep(self.latency_s)
+        return self._message(prompt)
+
+    def stream(self, prompt: str, *args, **kwargs):
+        """把固定延迟平均分摊到各个分片上"""
+        self.calls += 1
+        pieces = [self.content[i:i + 8] for i in range(0, len(self.content), 8)]
+        for piece in pieces:
+            if self.latency_s:
+                time.sleep(self.latency_s / len(pieces))
+            yield AIMessageChunk(content=piece)
+
+    async def astream(self, prompt: str, *args, **kwargs):
+        self.calls += 1
+        pieces = [self.content[i:i + 8] for i in range(0, len(self.content), 8)]
+        for piece in pieces:
+            if self.latency_s:
+                await asyncio.sleep(self.latency_s / len(pieces))
+            yield AIMessageChunk(content=piece)
+
+def install_stub_llm(clients, latency_s: float = 0.0, response: Optional[dict] = None) -> StubLLM:
+    """把桩 LLM 注册为 deepseek 与 ollama 两个后端"""
+    stub = StubLLM(latency_s, response)
+    for backend in ("deepseek", "ollama"):
+        clients.register(backend, stub)
+    return stub
@@ -0,0 +1,224 @@
+# booking_ledger.py
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# ==================== 配置区域 ====================
+DEFAULT_LEDGER_DB = "bookings.sqlite3"
+GROUP_COMMIT_MAX_BATCH = 512       # 一次事务最多写入的预订数
+GROUP_COMMIT_WINDOW_S = 0.002      # 第一条写入到达后最多再等待这么久，凑够一批再提交
+
+class BookingLedger:
+    """只追加的预订账本（SQLite WAL）
+
+    每笔预订有全局唯一的 booking_id，并以调用方提供的幂等键去重：同一个键重试多少次
+    都只记一笔，返回第一次写入的记录。写入由后台线程做组提交（group commit）——把同一
+    时间窗口内到达的预订合并到一个事务里，一次 fsync 落盘多笔，并发批量规划时每秒可写入
+    数千笔。db_path 为 None 时只保存在内存中。
+    """
+
+    def __init__(self, db_path: Optional[str] = None, max_batch: int = GROUP_COMMIT_MAX_BATCH,
+                 window_s: float = GROUP_COMMIT_WINDOW_S, synchronous: str = "FULL"):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.window_s = window_s
+        self.commits = 0
+        self.appended = 0
+        self.replayed = 0
+
+        self._conn = sqlite3.connect(db_path or ":memory:", check_same_thread=False)
+        if db_path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bookings ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "booking_id TEXT NOT NULL UNIQUE, "
+            "idempotency_key TEXT NOT NULL UNIQUE, "
+            "record TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        # 已提交记录的幂等键索引，重试时不必排队等待写线程
+        self._by_key: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple[dict, Future]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    # ---------- 写入 ----------
+    @staticmethod
+    def new_booking_id() -> str:
+        return "BK" + uuid.uuid4().hex[:16].upper()
+
+    def submit(self, record: dict, idempotency_key: Optional[str] = None) -> Future:
+        """提交一笔预订，返回在记录落盘后完成的 Future（结果为账本中的记录）"""
+        key = idempotency_key or uuid.uuid4().hex
+        existing = self._lookup(key)
+        if existing is not None:
+            future = Future()
+            future.set_result(existing)
+            return future
+
+        entry = dict(record, booking_id=self.new_booking_id(), idempotency_key=key)
+        future = Future()
+        self._ensure_writer()
+        self._queue.put((entry, future))
+        return future
+
+    def append(self, record: dict, idempotency_key: Optional[str] = None) -> dict:
+        """写入一笔预订并等待落盘"""
+        return self.submit(record, idempotency_key).result()
+
+    async def aappend(self, record: dict, idempotency_key: Optional[str] = None) -> dict:
+        """append 的异步版本，等待落盘时不占用事件循环"""
+        return await asyncio.wrap_future(self.submit(record, idempotency_key))
+
+    def find(self, idempotency_key: str) -> Optional[dict]:
+        """按幂等键查找已提交的预订，没有时返回 None"""
+        return self._lookup(idempotency_key)
+
+    def peek(self, idempotency_key: str) -> Optional[dict]:
+        """与 find 相同，但不计入重放次数（只查看，不返回给重试的调用方）"""
+        return self._lookup(idempotency_key, replay=False)
+
+    def _lookup(self, key: str, replay: bool = True) -> Optional[dict]:
+        with self._lock:
+            record = self._by_key.get(key)
+            if record is None and self.db_path:
+                # 进程重启后内存索引为空，或其他进程写入了同一个键
+                row = self._conn.execute(
+                    "SELECT record FROM bookings WHERE idempotency_key = ?", (key,)
+                ).fetchone()
+                if row:
+                    record = self._by_key[key] = json.loads(row[0])
+            if record is not None:
+                self.replayed += replay
+                return dict(record)
+            return None
+
+    def _ensure_writer(self):
+        """启动写线程；写线程意外退出后下一次提交会重新拉起"""
+        if self._writer is None or not self._writer.is_alive():
+            with self._lock:
+                if self._writer is None or not self._writer.is_alive():
+                    self._writer = threading.Thread(target=self._write_loop, name="booking-ledger", daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.window_s
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[dict, Future]]):
+        """在一个事务中写入整批预订；同批内重复的幂等键只写第一笔
+
+        用 INSERT OR IGNORE 写入：同一个键已被其他进程（共享同一个账本文件）抢先写入时不会抛出
+        IntegrityError 拖垮整批，而是读回先写入的那一笔作为这次的结果。写入前已被取消的预订
+        不写入；一旦开始写入就不能再取消，调用方据 Future 的最终状态决定是否归还房间。
+        """
+        batch = [(entry, future) for entry, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        with self._lock:
+            results: List[Tuple[Future, dict]] = []
+            written: Dict[str, dict] = {}
+            appended = replayed = 0
+            try:
+                with self._conn:
+                    for entry, future in batch:
+                        key = entry["idempotency_key"]
+                        record = self._by_key.get(key) or written.get(key)
+                        if record is None:
+                            record = self._insert(entry)
+                            written[key] = record
+                            if record is entry:
+                                appended += 1
+                            else:
+                                replayed += 1
+                        else:
+                            replayed += 1
+                        results.append((future, record))
+            except sqlite3.Error as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+
+            self._by_key.update(written)
+            self.commits += 1
+            self.appended += appended
+            self.replayed += replayed
+
+        for future, record in results:
+            future.set_result(dict(record))
+
+    def _insert(self, entry: dict) -> dict:
+        """写入一笔预订（调用方持有锁并处于事务中），返回账本中该幂等键对应的记录"""
+        key = entry["idempotency_key"]
+        cursor = self._conn.execute(
+            "INSERT OR IGNORE INTO bookings (booking_id, idempotency_key, record, created_at) VALUES (?, ?, ?, ?)",
+            (entry["booking_id"], key, json.dumps(entry, ensure_ascii=False), time.time())
+        )
+        if cursor.rowcount == 1:
+            return entry
+        row = self._conn.execute("SELECT record FROM bookings WHERE idempotency_key = ?", (key,)).fetchone()
+        if row is None:
+            # 被忽略的不是幂等键而是 booking_id 冲突
+            raise sqlite3.IntegrityError(f"booking_id 冲突: {entry['booking_id']}")
+        return json.loads(row[0])
+
+    # ---------- 查询 ----------
+    def get(self, booking_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM bookings WHERE booking_id = ?", (booking_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def records(self) -> Iterator[dict]:
+        """按写入顺序遍历全部预订记录（启动时据此重建客房库存）"""
+        with self._lock:
+            rows = self._conn.execute("SELECT record FROM bookings ORDER BY seq").fetchall()
+        for (record,) in rows:
+            yield json.loads(record)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM bookings").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "appended": self.appended,
+                "replayed": self.replayed,
+                "commits": self.commits,
+                "avg_batch": round(self.appended / self.commits, 2) if self.commits else 0.0,
+                "persistent": self.db_path is not None,
+            }
+
+    def close(self):
+        """等待已提交的写入完成后关闭"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,67 @@
+# checkpoints.py
+import asyncio
+import sqlite3
+import threading
+from typing import AsyncIterator, Iterator, Optional
+
+from langgraph.checkpoint.base import CheckpointAt
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# ==================== 配置区域 ====================
+DEFAULT_CHECKPOINT_DB = "checkpoints.sqlite3"
+
+class SqliteCheckpointSaver(SqliteSaver):
+    """可在多线程和事件循环中共享的 SQLite 检查点存储
+
+    langgraph 自带的 SqliteSaver 只能在创建连接的线程中使用，也没有异步接口；
+    这里共用一个 WAL 模式的连接、用锁串行化读写，异步方法放到线程池中执行。
+    """
+
+    def __init__(self, db_path: str = DEFAULT_CHECKPOINT_DB):
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        super().__init__(conn, at=CheckpointAt.END_OF_STEP)
+        self._lock = threading.RLock()
+
+    def get_tuple(self, config):
+        with self._lock:
+            return super().get_tuple(config)
+
+    def list(self, config) -> Iterator:
+        with self._lock:
+            return iter([*super().list(config)])
+
+    def put(self, config, checkpoint):
+        with self._lock:
+            return super().put(config, checkpoint)
+
+    async def aget_tuple(self, config):
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_tuple, config)
+
+    async def alist(self, config) -> AsyncIterator:
+        tuples = await asyncio.get_running_loop().run_in_executor(None, self.list, config)
+        for checkpoint_tuple in tuples:
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint):
+        return await asyncio.get_running_loop().run_in_executor(None, self.put, config, checkpoint)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+def create_checkpointer(backend: Optional[str], db_path: str = DEFAULT_CHECKPOINT_DB):
+    """按名称创建检查点存储：None 不保存，"memory" 进程内保存，"sqlite" 写入 db_path"""
+    if backend is None:
+        return None
+    if backend == "memory":
+        return MemorySaver(at=CheckpointAt.END_OF_STEP)
+    if backend == "sqlite":
+        return SqliteCheckpointSaver(db_path)
+    raise ValueError(f"未知的检查点后端: {backend}")
+
+def thread_config(thread_id: str) -> dict:
+    """某个会话 / 请求对应的运行配置，同一 thread_id 共享一条检查点记录"""
+    return {"configurable": {"thread_id": str(thread_id)}}
@@ -0,0 +1,98 @@
+# circuit_breaker.py
+import threading
+import time
+from typing import Callable
+
+# ==================== 配置区域 ====================
+DEFAULT_FAILURE_THRESHOLD = 5     # 连续失败这么多次后打开
+DEFAULT_RECOVERY_TIMEOUT_S = 30.0 # 打开后经过这么久进入半开状态，放行探测请求
+DEFAULT_HALF_OPEN_MAX_CALLS = 1   # 半开状态下同时放行的探测请求数
+
+class CircuitBreaker:
+    """熔断器：closed（正常）→ open（直接拒绝）→ half_open（放行少量探测）
+
+    连续失败 failure_threshold 次后打开，打开期间 allow() 返回 False，调用方直接走降级路径；
+    recovery_timeout_s 之后进入半开状态，最多放行 half_open_max_calls 个探测请求：探测成功
+    则关闭，失败则重新打开并重新计时。线程安全。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    STATES = (CLOSED, OPEN, HALF_OPEN)
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 recovery_timeout_s: float = DEFAULT_RECOVERY_TIMEOUT_S,
+                 half_open_max_calls: int = DEFAULT_HALF_OPEN_MAX_CALLS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout_s = recovery_timeout_s
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = 0.0
+            self._probes = 0
+            self.opened = 0
+            self.rejected = 0
+
+    def _refresh(self):
+        """打开时间已满时转为半开（调用方持有锁）"""
+        if self._state == self.OPEN and self._clock() - self._opened_at >= self.recovery_timeout_s:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = self._clock()
+        self.opened += 1
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def allow(self) -> bool:
+        """是否放行这次调用；半开状态下放行的调用计为一次探测"""
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            # 打开期间返回的成功来自打开之前发出的调用，不据此关闭
+            if self._state != self.OPEN:
+                self._state = self.CLOSED
+                self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._refresh()
+            if self._state == self.HALF_OPEN:
+                self._open()
+            elif self._state == self.CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._open()
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
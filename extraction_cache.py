@@ -0,0 +1,117 @@
+# extraction_cache.py
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+class ExtractionCache:
+    """LLM 信息提取结果缓存
+
+    以「规范化后的用户输入 + 参考日期」为键：相对日期（明天、下周三）依赖于“今天”，
+    换了日期必须重新提取。内存层为带 TTL 的 LRU；指定 db_path 时额外写入 SQLite，
+    重启后仍然有效，并可被同一台机器上的多个进程共享。
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 6 * 3600,
+                 db_path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(user_input: str, reference_date: str) -> str:
+        """规范化用户输入：全角转半角、去首尾空白、合并连续空白"""
+        normalized = unicodedata.normalize("NFKC", user_input).strip()
+        normalized = re.sub(r"\s+", " ", normalized)
+        return f"{reference_date}|{normalized}"
+
+    def get(self, user_input: str, reference_date: str) -> Optional[dict]:
+        """查询缓存，未命中或已过期返回 None"""
+        key = self.make_key(user_input, reference_date)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[1] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(entry[0])
+            if entry:
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM extraction_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] < self.ttl_seconds:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += 1
+                    return dict(value)
+                if row:
+                    self._db.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, user_input: str, reference_date: str, extracted_info: dict):
+        """写入缓存"""
+        key = self.make_key(user_input, reference_date)
+        value = dict(extracted_info)
+        created_at = time.time()
+
+        with self._lock:
+            self._remember(key, value, created_at)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO extraction_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), created_at)
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, value: dict, created_at: float):
+        self._entries[key] = (value, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """清空缓存（包括磁盘）并重置计数"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM extraction_cache")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        """命中统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "persistent": self._db is not None,
+            }
@@ -0,0 +1,167 @@
+# fare_engine.py
+import hashlib
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+# ==================== 配置区域 ====================
+FLIGHT_ROUTES = {
+    "北京": ["CA123", "MU456", "CZ789"],
+    "上海": ["MU123", "CA456", "HO789"],
+    "广州": ["CZ123", "MU456", "CA789"],
+    "东京": ["JL123", "NH456", "CA789"],
+    "新加坡": ["SQ123", "CA456", "MU789"],
+    "深圳": ["ZH123", "CA456", "MU789"],
+    "杭州": ["CA123", "MU456", "JD789"],
+    "成都": ["CA123", "3U456", "MU789"]
+}
+BASE_PRICES = {
+    "北京": 1200, "上海": 1100, "广州": 1000,
+    "东京": 3500, "新加坡": 3200, "深圳": 900,
+    "杭州": 800, "成都": 950
+}
+DEFAULT_BASE_PRICE = 1500
+PRICE_VARIATION = 200     # 票价在基准价 ±200 元内波动
+SOLD_OUT_RATE = 0.2       # 约 20% 的日期整条航线售罄（模拟真实情况）
+DEPARTURE_TIMES = ["08:00", "10:30", "13:15", "16:45", "19:20", "22:00"]
+
+DateLike = Union[str, date]
+
+# ==================== 无状态随机数 ====================
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+def stable_key(text: str) -> int:
+    """与进程无关的 64 位键（str 的 hash() 受 PYTHONHASHSEED 影响，不能用）"""
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 混合函数，对 uint64 数组逐元素计算（溢出即按 2^64 取模）"""
+    z = x + _GOLDEN
+    z = (z ^ (z >> np.uint64(30))) * _MIX1
+    z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return z ^ (z >> np.uint64(31))
+
+def _uniform(keys: np.ndarray, stream: np.ndarray) -> np.ndarray:
+    """由 (键, 流编号) 计算 [0, 1) 均匀分布的随机数，相同输入永远得到相同结果"""
+    z = _splitmix64(_splitmix64(keys) + stream.astype(np.uint64))
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+def _to_date(value: DateLike) -> date:
+    return value if isinstance(value, date) else datetime.strptime(value, "%Y-%m-%d").date()
+
+# ==================== 票价引擎 ====================
+class FareEngine:
+    """确定性的模拟票价引擎
+
+    每个 (目的地, 日期) 的售罄状态和各航班票价都由计数器式随机数（SplitMix64）算出：
+    不使用全局 random、不持有可变状态，多线程 / 多会话并发调用互不影响，不同进程、
+    不同机器上的结果也完全一致。整段日期可以用一次 numpy 运算批量生成。
+    """
+
+    def __init__(self, routes: Optional[Dict[str, List[str]]] = None,
+                 base_prices: Optional[Dict[str, int]] = None,
+                 sold_out_rate: float = SOLD_OUT_RATE):
+        self.routes = {city: list(flights) for city, flights in (routes or FLIGHT_ROUTES).items()}
+        self.base_prices = dict(base_prices or BASE_PRICES)
+        self.sold_out_rate = sold_out_rate
+
+        self._route_keys = {city: stable_key(city) for city in self.routes}
+        # 每个航班的起飞时间固定不变，航班表按起飞时间排列
+        self._schedules: Dict[str, List[Tuple[str, str]]] = {
+            city: sorted(
+                ((DEPARTURE_TIMES[stable_key(f"{city}|{number}") % len(DEPARTURE_TIMES)], number)
+                 for number in flights)
+            )
+            for city, flights in self.routes.items()
+        }
+
+    def supports(self, destination: str) -> bool:
+        return destination in self.routes
+
+    def fare_table(self, destination: str, start: DateLike, days: int = 1) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """向量化生成 start 起连续 days 天的票价
+
+        返回 (日期列表, 售罄标记[days], 票价矩阵[days, 航班数])，航班顺序与 schedule() 一致。
+        """
+        start_date = _to_date(start)
+        dates = [(start_date + timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(days)]
+        flight_count = len(self._schedules[destination])
+
+        ordinals = np.arange(start_date.toordinal(), start_date.toordinal() + days, dtype=np.uint64)
+        keys = np.uint64(self._route_keys[destination]) ^ _splitmix64(ordinals)
+
+        # 流 0 决定当天是否售罄，流 1..N 对应各航班票价
+        sold_out = _uniform(keys, np.zeros(days, dtype=np.uint64)) < self.sold_out_rate
+        streams = np.arange(1, flight_count + 1, dtype=np.uint64)
+        draws = _uniform(keys[:, None], streams[None, :])
+
+        base_price = self.base_prices.get(destination, DEFAULT_BASE_PRICE)
+        prices = base_price - PRICE_VARIATION + np.floor(draws * (2 * PRICE_VARIATION + 1)).astype(np.int64)
+        return dates, sold_out, prices
+
+    def schedule(self, destination: str) -> List[Tuple[str, str]]:
+        """某条航线的 [(起飞时间, 航班号), ...]"""
+        return list(self._schedules.get(destination, []))
+
+    def search_range(self, destination: str, start: DateLike, days: int) -> Dict[str, List[dict]]:
+        """一次查询连续多天的全部航班，{日期: 航班列表}，售罄或不支持的日期为空列表"""
+        if not self.supports(destination) or days <= 0:
+            return {}
+
+        dates, sold_out, prices = self.fare_table(destination, start, days)
+        schedule = self._schedules[destination]
+        return {
+            day: [] if sold_out[row] else [
+                {
+                    "flight_number": number,
+                    "price": int(prices[row, col]),
+                    "departure_time": departure_time,
+                    "airline": number[:2],
+                    "date": day,
+                }
+                for col, (departure_time, number) in enumerate(schedule)
+            ]
+            for row, day in enumerate(dates)
+        }
+
+    def search(self, destination: str, travel_date: DateLike) -> List[dict]:
+        """查询某天的全部航班（按起飞时间排列），无航班时返回空列表"""
+        return self.search_range(destination, travel_date, 1).get(_to_date(travel_date).strftime("%Y-%m-%d"), [])
+
+    def search_nearby(self, destination: str, travel_date: DateLike, days: int,
+                      penalty_per_day: float, earliest: Optional[DateLike] = None) -> List[dict]:
+        """在 travel_date 前后 days 天内一次性查询全部航班，按 票价 + 每偏离一天的罚分 排序
+
+        不含 travel_date 当天与 earliest 之前的日期；每条结果附带 date_offset（相对天数）。
+        """
+        if not self.supports(destination) or days <= 0:
+            return []
+
+        center = _to_date(travel_date)
+        dates, sold_out, prices = self.fare_table(destination, center - timedelta(days=days), 2 * days + 1)
+
+        offsets = np.abs(np.arange(-days, days + 1))
+        scores = prices + penalty_per_day * offsets[:, None]
+        valid = ~sold_out & (offsets > 0)
+        if earliest is not None:
+            first = (_to_date(earliest) - center).days + days
+            valid[:max(first, 0)] = False
+        scores = np.where(valid[:, None], scores, np.inf)
+
+        rows, cols = np.nonzero(np.isfinite(scores))
+        order = np.lexsort((cols, offsets[rows], scores[rows, cols]))
+        schedule = self._schedules[destination]
+        return [
+            {
+                "flight_number": schedule[cols[i]][1],
+                "price": int(prices[rows[i], cols[i]]),
+                "departure_time": schedule[cols[i]][0],
+                "airline": schedule[cols[i]][1][:2],
+                "date": dates[rows[i]],
+                "date_offset": int(rows[i]) - days,
+            }
+            for i in order
+        ]
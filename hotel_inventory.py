@@ -0,0 +1,127 @@
+# hotel_inventory.py
+import csv
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# ==================== 配置区域 ====================
+DEFAULT_INVENTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "hotels.csv")
+
+class HotelRecord(dict):
+    """不可变的酒店记录
+
+    仍然是 dict（节点和界面按 hotel["name"] 访问、可直接 JSON 序列化），但禁止修改，
+    多个请求共享同一份库存数据时不会被某个调用方意外改写。
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("HotelRecord 是只读的，请先 dict(record) 复制后再修改")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (HotelRecord, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+def _number(value) -> float:
+    """价格保持原始的整数/小数形式，方便展示"""
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+class HotelInventory:
+    """按城市索引的酒店库存
+
+    价格、评分以 array('d') 列式存储；每个城市的行号按价格升序排列，
+    max_price 过滤只需一次二分查找。查询返回预先构建好的 HotelRecord，不做复制。
+    """
+
+    def __init__(self, rows: Iterable[dict]):
+        rows = sorted(rows, key=lambda row: (row["city"], float(row["price_per_night"])))
+
+        self.records: List[HotelRecord] = []
+        self.prices = array("d")
+        self.ratings = array("d")
+        self._city_ranges: Dict[str, Tuple[int, int]] = {}
+
+        for row in rows:
+            index = len(self.records)
+            available = str(row.get("available", True)).strip().lower() not in ("0", "false", "no", "")
+            record = HotelRecord(
+                name=row["name"],
+                city=row["city"],
+                price_per_night=_number(row["price_per_night"]),
+                available=available,
+                rating=_number(row.get("rating", 4.0)),
+            )
+            self.records.append(record)
+            self.prices.append(float(record["price_per_night"]))
+            self.ratings.append(float(record["rating"]))
+
+            start, _ = self._city_ranges.get(record["city"], (index, index))
+            self._city_ranges[record["city"]] = (start, index + 1)
+
+    @classmethod
+    def from_file(cls, path: str) -> "HotelInventory":
+        """从 CSV、JSON 数组或 JSONL 文件加载"""
+        with open(path, encoding="utf-8") as f:
+            if path.endswith(".csv"):
+                return cls(csv.DictReader(f))
+            if path.endswith(".jsonl"):
+                return cls(json.loads(line) for line in f if line.strip())
+            return cls(json.load(f))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def cities(self) -> List[str]:
+        return list(self._city_ranges)
+
+    def city_range(self, city: str) -> Tuple[int, int]:
+        """城市在列存中的行号区间 [start, end)，按价格升序"""
+        return self._city_ranges.get(city, (0, 0))
+
+    def query_indices(self, city: str, max_price: Optional[float] = None,
+                      min_rating: Optional[float] = None, available_only: bool = True) -> List[int]:
+        """返回满足条件的行号"""
+        start, end = self.city_range(city)
+        if max_price is not None:
+            end = bisect_right(self.prices, max_price, start, end)
+
+        ratings = self.ratings
+        records = self.records
+        return [
+            i for i in range(start, end)
+            if (min_rating is None or ratings[i] >= min_rating)
+            and (not available_only or records[i]["available"])
+        ]
+
+    def query(self, city: str, max_price: Optional[float] = None,
+              min_rating: Optional[float] = None, available_only: bool = True) -> List[HotelRecord]:
+        """按城市、最高价格、最低评分查询酒店"""
+        records = self.records
+        return [records[i] for i in self.query_indices(city, max_price, min_rating, available_only)]
+
+# ==================== 进程级单例 ====================
+_inventory: Optional[HotelInventory] = None
+_inventory_lock = threading.Lock()
+
+def get_hotel_inventory(path: Optional[str] = None) -> HotelInventory:
+    """获取进程内共享的酒店库存，首次调用时加载"""
+    global _inventory
+    if _inventory is None:
+        with _inventory_lock:
+            if _inventory is None:
+                _inventory = HotelInventory.from_file(path or DEFAULT_INVENTORY_PATH)
+    return _inventory
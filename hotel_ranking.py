@@ -0,0 +1,73 @@
+# hotel_ranking.py
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# ==================== 配置区域 ====================
+# 各项得分均归一化到 [0, 1]，按权重加权求和：
+#   value      性价比（评分 * 100 / 每晚价格），与最初的选择策略一致
+#   rating     评分 / 5
+#   total_cost 总价越低越好（最低总价 / 总价）
+#   budget     预算贴合度（预算内为 1，超出时按 预算 / 总价 递减）
+DEFAULT_WEIGHTS = {"value": 1.0, "rating": 0.0, "total_cost": 0.0, "budget": 0.0}
+DEFAULT_TOP_K = 3
+
+def score_columns(prices: np.ndarray, ratings: np.ndarray, nights: int,
+                  budget: Optional[float] = None,
+                  weights: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """对价格、评分两列做向量化打分"""
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    prices = np.maximum(np.asarray(prices, dtype=np.float64), 1e-9)
+    ratings = np.asarray(ratings, dtype=np.float64)
+    total_costs = prices * max(nights, 1)
+
+    scores = np.zeros(len(prices), dtype=np.float64)
+    if not len(prices):
+        return scores
+    if weights["value"]:
+        value = ratings * 100 / prices
+        # 评分全为 0 时性价比全为 0，不能除以 0
+        scores += weights["value"] * value / max(value.max(), 1e-9)
+    if weights["rating"]:
+        scores += weights["rating"] * ratings / 5.0
+    if weights["total_cost"]:
+        scores += weights["total_cost"] * total_costs.min() / total_costs
+    if weights["budget"] and budget:
+        scores += weights["budget"] * np.minimum(1.0, budget / total_costs)
+    return scores
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """部分选择出得分最高的 k 个下标（降序），不对全部候选排序"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+def rank_columns(prices: Sequence[float], ratings: Sequence[float], nights: int,
+                 budget: Optional[float] = None, weights: Optional[Dict[str, float]] = None,
+                 top_k: int = DEFAULT_TOP_K) -> Tuple[np.ndarray, np.ndarray]:
+    """列式输入的排序，返回 (下标, 得分)
+
+    可直接传入 HotelInventory 的 array('d') 列或其 memoryview 切片，numpy 通过缓冲区协议读取，不复制数据。
+    """
+    scores = score_columns(prices, ratings, nights, budget, weights)
+    indices = top_k_indices(scores, top_k)
+    return indices, scores[indices]
+
+def rank_hotels(hotels: List[dict], nights: int, budget: Optional[float] = None,
+                weights: Optional[Dict[str, float]] = None,
+                top_k: int = DEFAULT_TOP_K) -> List[Tuple[dict, float]]:
+    """对酒店列表打分并返回前 k 名 [(hotel, score), ...]，按得分降序"""
+    if not hotels:
+        return []
+
+    count = len(hotels)
+    prices = np.fromiter((hotel["price_per_night"] for hotel in hotels), dtype=np.float64, count=count)
+    ratings = np.fromiter((hotel.get("rating", 4.0) for hotel in hotels), dtype=np.float64, count=count)
+
+    indices, scores = rank_columns(prices, ratings, nights, budget, weights, top_k)
+    return [(hotels[i], float(score)) for i, score in zip(indices, scores)]
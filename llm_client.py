@@ -0,0 +1,293 @@
+# llm_client.py
+import asyncio
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from metrics import token_counts, token_usage
+
+# ==================== 配置区域 ====================
+DEFAULT_MAX_IN_FLIGHT = 8        # 每个后端同时在途的请求上限
+DEFAULT_KEEPALIVE_EXPIRY = 60.0  # 空闲长连接保留秒数
+
+# 提示词：字符串，或 [(角色, 内容), ...] 消息列表（角色为 system / user）
+Prompt = Union[str, Sequence[Tuple[str, str]]]
+# 拿到在途名额、真正开始调用时的回调：调用方据此从这一刻起计算超时，本地排队不计入
+SlotCallback = Optional[Callable[[], None]]
+
+def message_dicts(prompt: Prompt) -> List[dict]:
+    """转换为 OpenAI chat.completions 的 messages 参数"""
+    if isinstance(prompt, str):
+        return [{"role": "user", "content": prompt}]
+    return [{"role": role, "content": content} for role, content in prompt]
+
+class LLMClientManager:
+    """进程级 LLM 客户端管理
+
+    每个后端（deepseek / ollama）只创建一次客户端并在进程内复用：DeepSeek 使用共享的
+    httpx 连接池保持长连接，避免每次提取都重新建立 TLS 连接；同时用信号量限制每个后端
+    的在途请求数。
+    """
+
+    def __init__(self, api_key: str, base_url: str, model: str = "deepseek-chat",
+                 ollama_model: str = "deepseek-r1:1.5b", temperature: float = 0.1,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY, metrics=None,
+                 json_mode: bool = False, timeout: Optional[float] = None, max_retries: Optional[int] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.ollama_model = ollama_model
+        self.temperature = temperature
+        self.max_in_flight = max_in_flight
+        self.keepalive_expiry = keepalive_expiry
+        # 可选的 metrics.Metrics，记录每次调用的耗时、状态和 token 数
+        self.metrics = metrics
+        # JSON 模式：DeepSeek 使用 response_format=json_object，Ollama 使用 format="json"
+        self.json_mode = json_mode
+        # HTTP 超时（秒）与 openai 客户端的自动重试次数，None 表示使用 openai 的默认值
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        self._clients: Dict[str, object] = {}
+        self._openai_client = None
+        self._async_openai_client = None
+        # 直接用 openai 客户端流式调用的后端（可以拿到流末尾的 token 用量）
+        self._raw_stream_backends = set()
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        # asyncio 信号量绑定事件循环，因此按循环分别维护
+        self._async_slots = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, backend: str = "deepseek"):
+        """获取（必要时创建）指定后端的 LLM 实例"""
+        client = self._clients.get(backend)
+        if client is not None:
+            return client
+
+        with self._lock:
+            if backend not in self._clients:
+                if backend == "deepseek":
+                    self._clients[backend] = self._create_deepseek()
+                elif backend == "ollama":
+                    self._clients[backend] = self._create_ollama()
+                else:
+                    raise ValueError(f"未知的 LLM 后端: {backend}")
+                self._slots[backend] = threading.BoundedSemaphore(self.max_in_flight)
+            return self._clients[backend]
+
+    def register(self, backend: str, llm):
+        """注入自定义的 LLM 实例（例如基准测试用的桩对象），之后 get / invoke 都使用它"""
+        with self._lock:
+            self._clients[backend] = llm
+            self._raw_stream_backends.discard(backend)
+            self._slots[backend] = threading.BoundedSemaphore(self.max_in_flight)
+
+    def _create_deepseek(self):
+        import httpx
+        import openai
+        from langchain_openai import ChatOpenAI
+
+        print(f"🌐 使用 DeepSeek API（连接池上限 {self.max_in_flight}）")
+        limits = httpx.Limits(
+            max_connections=self.max_in_flight,
+            max_keepalive_connections=self.max_in_flight,
+            keepalive_expiry=self.keepalive_expiry
+        )
+        self._openai_client = openai.OpenAI(
+            api_key=self.api_key, base_url=self.base_url,
+            http_client=httpx.Client(limits=limits), **self._request_kwargs()
+        )
+        self._async_openai_client = openai.AsyncOpenAI(
+            api_key=self.api_key, base_url=self.base_url,
+            http_client=httpx.AsyncClient(limits=limits), **self._request_kwargs()
+        )
+        self._raw_stream_backends.add("deepseek")
+        return ChatOpenAI(
+            model=self.model,
+            api_key=self.api_key,
+            base_url=self.base_url,
+            temperature=self.temperature,
+            client=self._openai_client.chat.completions,
+            async_client=self._async_openai_client.chat.completions,
+            model_kwargs=self._json_kwargs()
+        )
+
+    def _request_kwargs(self) -> dict:
+        kwargs = {}
+        if self.timeout is not None:
+            kwargs["timeout"] = self.timeout
+        if self.max_retries is not None:
+            kwargs["max_retries"] = self.max_retries
+        return kwargs
+
+    def _json_kwargs(self) -> dict:
+        return {"response_format": {"type": "json_object"}} if self.json_mode else {}
+
+    def _create_ollama(self):
+        from langchain_community.llms import Ollama
+
+        print(f"🖥️  使用本地 Ollama 模型")
+        if self.json_mode:
+            return Ollama(model=self.ollama_model, temperature=self.temperature, format="json")
+        return Ollama(model=self.ollama_model, temperature=self.temperature)
+
+    @contextmanager
+    def slot(self, backend: str = "deepseek", on_acquired: SlotCallback = None):
+        """占用一个在途请求名额，拿到后调用 on_acquired"""
+        self.get(backend)
+        semaphore = self._slots[backend]
+        semaphore.acquire()
+        try:
+            if on_acquired is not None:
+                on_acquired()
+            yield
+        finally:
+            semaphore.release()
+
+    def _record(self, backend: str, start: float, response, status: Optional[str] = None):
+        if self.metrics is not None:
+            status = status or ("ok" if response is not None else "error")
+            usage = token_usage(response) if response is not None else None
+            self.metrics.record_llm(backend, time.perf_counter() - start, status, usage)
+
+    def _call_kwargs(self, backend: str, timeout: Optional[float]) -> dict:
+        """单次调用的 HTTP 超时（覆盖客户端默认值），只对基于 openai 客户端的后端生效"""
+        return {"timeout": timeout} if timeout is not None and backend in self._raw_stream_backends else {}
+
+    def invoke(self, prompt: Prompt, backend: str = "deepseek", timeout: Optional[float] = None,
+               on_slot: SlotCallback = None):
+        """在并发上限内调用 LLM；timeout 为这次调用的 HTTP 超时，on_slot 在拿到名额时调用"""
+        llm = self.get(backend)
+        with self.slot(backend, on_slot):
+            start, response = time.perf_counter(), None
+            try:
+                response = llm.invoke(prompt, **self._call_kwargs(backend, timeout))
+                return response
+            finally:
+                self._record(backend, start, response)
+
+    @asynccontextmanager
+    async def aslot(self, backend: str = "deepseek", on_acquired: SlotCallback = None):
+        """异步占用一个在途请求名额（按当前事件循环计数），拿到后调用 on_acquired"""
+        self.get(backend)
+        loop = asyncio.get_running_loop()
+        loop_slots = self._async_slots.setdefault(loop, {})
+        if backend not in loop_slots:
+            loop_slots[backend] = asyncio.Semaphore(self.max_in_flight)
+        async with loop_slots[backend]:
+            if on_acquired is not None:
+                on_acquired()
+            yield
+
+    async def ainvoke(self, prompt: Prompt, backend: str = "deepseek", timeout: Optional[float] = None,
+                      on_slot: SlotCallback = None):
+        """在并发上限内异步调用 LLM，不占用线程"""
+        llm = self.get(backend)
+        async with self.aslot(backend, on_slot):
+            start, response, status = time.perf_counter(), None, None
+            try:
+                response = await llm.ainvoke(prompt, **self._call_kwargs(backend, timeout))
+                return response
+            except asyncio.CancelledError:
+                # 超时或对冲请求中落后的一方被取消，不算 LLM 出错
+                status = "cancelled"
+                raise
+            finally:
+                self._record(backend, start, response, status)
+
+    def _raw_stream_params(self, prompt: Prompt) -> dict:
+        return dict(
+            model=self.model, messages=message_dicts(prompt), temperature=self.temperature,
+            stream=True, stream_options={"include_usage": True}, **self._json_kwargs()
+        )
+
+    def stream(self, prompt: Prompt, backend: str = "deepseek", on_slot: SlotCallback = None) -> Iterator[str]:
+        """在并发上限内流式调用 LLM，逐段产出文本；流结束或被关闭后才释放名额并记录耗时与 token 用量
+
+        DeepSeek 直接使用 openai 客户端并请求 include_usage，流的最后一个分片带有 token 用量
+        （含命中提示词缓存的部分）；其他后端没有用量信息。
+        """
+        llm = self.get(backend)
+        with self.slot(backend, on_slot):
+            start, status, usage = time.perf_counter(), "error", None
+            try:
+                if backend in self._raw_stream_backends:
+                    with self._openai_client.chat.completions.create(**self._raw_stream_params(prompt)) as chunks:
+                        for chunk in chunks:
+                            if chunk.usage is not None:
+                                usage = chunk.usage.model_dump()
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                yield chunk.choices[0].delta.content
+                else:
+                    for chunk in llm.stream(prompt):
+                        yield getattr(chunk, "content", chunk)
+                status = "ok"
+            except GeneratorExit:
+                # 调用方拿到需要的内容后提前关闭流，不算失败
+                status = "ok"
+                raise
+            finally:
+                self._record_stream(backend, start, status, usage)
+
+    async def astream(self, prompt: Prompt, backend: str = "deepseek", on_slot: SlotCallback = None) -> AsyncIterator[str]:
+        """stream 的异步版本"""
+        llm = self.get(backend)
+        async with self.aslot(backend, on_slot):
+            start, status, usage = time.perf_counter(), "error", None
+            try:
+                if backend in self._raw_stream_backends:
+                    chunks = await self._async_openai_client.chat.completions.create(**self._raw_stream_params(prompt))
+                    async with chunks:
+                        async for chunk in chunks:
+                            if chunk.usage is not None:
+                                usage = chunk.usage.model_dump()
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                yield chunk.choices[0].delta.content
+                else:
+                    async for chunk in llm.astream(prompt):
+                        yield getattr(chunk, "content", chunk)
+                status = "ok"
+            except GeneratorExit:
+                status = "ok"
+                raise
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            finally:
+                self._record_stream(backend, start, status, usage)
+
+    def _record_stream(self, backend: str, start: float, status: str, usage: Optional[dict]):
+        if self.metrics is not None:
+            counts = token_counts(usage) if usage else None
+            self.metrics.record_llm(backend, time.perf_counter() - start, status, counts)
+
+    def warm_up(self, backend: str = "deepseek") -> bool:
+        """预热：提前创建客户端并建立到 DeepSeek 的长连接，失败不影响后续调用"""
+        try:
+            self.get(backend)
+            if backend == "deepseek":
+                # /models 不消耗 token，只为完成 TCP + TLS 握手并把连接放回连接池
+                self._openai_client.models.list()
+            print(f"🔥 {backend} 客户端预热完成")
+            return True
+        except Exception as e:
+            print(f"⚠️  {backend} 客户端预热失败: {e}")
+            return False
+
+    def warm_up_in_background(self, backend: str = "deepseek") -> threading.Thread:
+        """在后台线程中预热，不阻塞启动"""
+        thread = threading.Thread(target=self.warm_up, args=(backend,), daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """关闭连接池"""
+        with self._lock:
+            if self._openai_client is not None:
+                self._openai_client.close()
+                self._openai_client = None
+            self._clients.clear()
+            self._slots.clear()
@@ -0,0 +1,251 @@
+# load_generator.py
+"""压测工具：按目标请求速率驱动旅行规划智能体，报告吞吐与 p50/p95/p99 延迟
+
+开环压测：第 i 个请求在 start + i / rate 时刻发出，不等待前一个请求完成；延迟从计划发出时刻算起，
+系统跟不上时排队时间也计入延迟（避免"协调遗漏"让延迟看起来偏低）。
+配合 mock_llm_server.py 使用时不消耗 DeepSeek 额度。
+
+运行方式：
+    python load_generator.py --spawn-mock --rate 50 --duration 30 --extraction llm
+    python load_generator.py --base-url http://127.0.0.1:8000/v1 --rate 20 -n 500
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from typing import Iterator, List, Optional
+
+import travel_agent
+from batch_planner import latency_summary, plan_status
+from extraction_cache import ExtractionCache
+from llm_client import LLMClientManager
+from room_inventory import RoomInventory
+
+# ==================== 配置区域 ====================
+DEFAULT_BASE_URL = "http://127.0.0.1:8000/v1"
+DEFAULT_RATE = 10.0          # 每秒请求数
+DEFAULT_DURATION = 10.0      # 秒
+DEFAULT_MAX_IN_FLIGHT = 1024 # 在途请求超过该值时新请求直接记为拒绝，防止压垮本机
+# 每次压测使用新的客房库存；默认容量足够大，压测的是预订成功的路径而不是满房后的错误路径
+DEFAULT_ROOMS_PER_HOTEL = 1_000_000
+
+NAMES = ["张三", "李华", "王伟", "赵六", "陈晨", "刘洋", "杨帆", "周杰"]
+DATES = ["明天", "后天", "下周三", "这周末", "月底", "十一月三日"]
+NIGHTS = ["一晚", "两晚", "3晚", "五晚", "一周"]
+
+def synthetic_inputs(seed: int = 0) -> Iterator[str]:
+    """无限生成随机组合的规划请求（目的地 / 日期 / 晚数 / 姓名）"""
+    rng = random.Random(seed)
+    destinations = travel_agent.SUPPORTED_DESTINATIONS
+    while True:
+        yield f"{rng.choice(DATES)}去{rng.choice(destinations)}，住{rng.choice(NIGHTS)}，我叫{rng.choice(NAMES)}"
+
+def file_inputs(path: str) -> Iterator[str]:
+    """循环读取 batch_planner 格式的 JSONL 请求文件中的 user_input"""
+    with open(path, encoding="utf-8") as f:
+        texts = [json.loads(line)["user_input"] for line in f if line.strip()]
+    if not texts:
+        raise ValueError(f"{path} 中没有请求")
+    while True:
+        yield from texts
+
+# ==================== 压测 ====================
+class LoadStats:
+    """累计每个请求的结果，只保存延迟数值"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.succeeded = 0
+        self.sold_out = 0
+        self.failed = 0
+        self.errors = 0
+        self.rejected = 0
+
+    def record(self, latency_ms: float, status: str):
+        self.latencies.append(latency_ms)
+        if status == "success":
+            self.succeeded += 1
+        elif status == "sold_out":
+            self.sold_out += 1
+        elif status == "exception":
+            self.errors += 1
+        else:
+            self.failed += 1
+
+async def _plan(agent, user_input: str, scheduled: float, stats: LoadStats):
+    try:
+        final_state = await agent.ainvoke(travel_agent.create_initial_state(user_input))
+        status = plan_status(final_state)
+    except Exception:
+        status = "exception"
+    stats.record((time.perf_counter() - scheduled) * 1000, status)
+
+async def run_load(agent, inputs: Iterator[str], rate: float, total: int,
+                   max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> dict:
+    """以 rate 请求/秒发出 total 个请求，等待全部完成后返回汇总"""
+    stats = LoadStats()
+    pending = set()
+    start = time.perf_counter()
+
+    for i in range(total):
+        scheduled = start + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        pending = {task for task in pending if not task.done()}
+        if len(pending) >= max_in_flight:
+            stats.rejected += 1
+            continue
+        pending.add(asyncio.ensure_future(_plan(agent, next(inputs), scheduled, stats)))
+
+    send_elapsed = time.perf_counter() - start
+    if pending:
+        await asyncio.wait(pending)
+    elapsed = time.perf_counter() - start
+
+    completed = stats.succeeded + stats.sold_out + stats.failed + stats.errors
+    snapshot = travel_agent.METRICS.snapshot()
+    return {
+        "target_rps": rate,
+        "offered_rps": round(total / send_elapsed, 3) if send_elapsed > 0 else 0.0,
+        "total": total,
+        "succeeded": stats.succeeded,
+        "sold_out": stats.sold_out,
+        "failed": stats.failed,
+        "errors": stats.errors,
+        "rejected": stats.rejected,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(completed / elapsed, 3) if elapsed > 0 else 0.0,
+        "latency_ms": latency_summary(stats.latencies),
+        "llm_latency": snapshot["llm"],
+        "llm_calls": snapshot["counters"].get("travel_agent_llm_calls_total", []),
+        "extraction_tiers": travel_agent.EXTRACTION_TIER_STATS.snapshot(),
+        "room_inventory": travel_agent.ROOM_INVENTORY.stats(),
+        "flight_prefetch": travel_agent.FLIGHT_PREFETCHER.stats(),
+        "extraction_batches": travel_agent.EXTRACTION_BATCHER.stats(),
+        "llm_resilience": travel_agent.llm_resilience_report(),
+        "llm_usage": travel_agent.llm_usage_report(),
+    }
+
+def spawn_mock_server(port: int, latency_ms: float, jitter_ms: float, error_rate: float,
+                      output_token_ms: float = 0.0, slow_rate: float = 0.0, slow_ms: float = 0.0) -> subprocess.Popen:
+    """在子进程中启动 mock_llm_server.py，等它开始监听后返回"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mock_llm_server.py")
+    process = subprocess.Popen(
+        [sys.executable, script, "--port", str(port), "--latency-ms", str(latency_ms),
+         "--jitter-ms", str(jitter_ms), "--error-rate", str(error_rate), "--output-token-ms", str(output_token_ms),
+         "--slow-rate", str(slow_rate), "--slow-ms", str(slow_ms)],
+        stdout=subprocess.PIPE, text=True
+    )
+    # 服务开始监听后才会打印启动信息
+    print(process.stdout.readline().rstrip(), file=sys.stderr)
+    return process
+
+def configure_agent(base_url: str, extraction: str, llm_max_in_flight: int, cache: bool,
+                    batch_window_ms: float = 0.0, batch_size: int = travel_agent.EXTRACTION_BATCH_SIZE):
+    """把智能体指向 base_url 上的 OpenAI 兼容服务，并设置提取方式；batch_window_ms > 0 时开启微批提取"""
+    travel_agent.configure(
+        cache=None if cache else ExtractionCache(max_size=0),
+        use_api=True,
+        rule_only=extraction == "rules",
+        tiered_extraction=extraction == "tiered",
+        extraction_batching=batch_window_ms > 0,
+        llm_clients=LLMClientManager(
+            api_key="mock", base_url=base_url, max_in_flight=llm_max_in_flight,
+            metrics=travel_agent.METRICS if travel_agent.METRICS_ENABLED else None,
+            json_mode=travel_agent.LLM_JSON_MODE,
+            timeout=travel_agent.LLM_CALL_TIMEOUT_S,
+            max_retries=travel_agent.LLM_MAX_RETRIES
+        )
+    )
+    travel_agent.EXTRACTION_BATCHER.window_s = batch_window_ms / 1000
+    travel_agent.EXTRACTION_BATCHER.max_batch = batch_size
+    travel_agent.EXTRACTION_BATCHER.max_concurrent_batches = llm_max_in_flight
+
+# ==================== 命令行入口 ====================
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="按目标速率压测旅行规划智能体")
+    parser.add_argument("--base-url", default=DEFAULT_BASE_URL, help="OpenAI 兼容服务地址")
+    parser.add_argument("--spawn-mock", action="store_true", help="自动在子进程中启动 mock_llm_server.py")
+    parser.add_argument("--mock-port", type=int, default=8000)
+    parser.add_argument("--mock-latency-ms", type=float, default=300.0)
+    parser.add_argument("--mock-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--mock-output-token-ms", type=float, default=0.0)
+    parser.add_argument("--mock-slow-rate", type=float, default=0.0)
+    parser.add_argument("--mock-slow-ms", type=float, default=0.0)
+    parser.add_argument("-r", "--rate", type=float, default=DEFAULT_RATE, help="目标请求速率（每秒）")
+    parser.add_argument("-d", "--duration", type=float, default=DEFAULT_DURATION, help="发送请求的时长（秒）")
+    parser.add_argument("-n", "--requests", type=int, help="请求总数（指定后忽略 --duration）")
+    parser.add_argument("--input", help="batch_planner 格式的 JSONL 请求文件，默认随机生成请求")
+    parser.add_argument("--extraction", choices=["tiered", "llm", "rules"], default="llm",
+                        help="信息提取方式：llm 每个请求都调用 LLM，tiered 规则不确定时才调用，rules 只用规则")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0,
+                        help="微批提取的收集窗口（毫秒），0 表示不合并")
+    parser.add_argument("--batch-size", type=int, default=travel_agent.EXTRACTION_BATCH_SIZE,
+                        help="微批提取每批最多合并的请求数")
+    parser.add_argument("--llm-timeout", type=float, default=travel_agent.LLM_CALL_TIMEOUT_S,
+                        help="单次 LLM 调用超时（秒）")
+    parser.add_argument("--latency-budget", type=float, default=travel_agent.EXTRACTION_LATENCY_BUDGET_S,
+                        help="一次信息提取（含对冲请求）的总延迟预算（秒），超出后使用规则提取")
+    parser.add_argument("--hedge", action="store_true", help="第一次 LLM 调用超过 p95 耗时仍未返回时发出对冲请求")
+    parser.add_argument("--cache", action="store_true", help="启用提取缓存（默认关闭，让每个请求都走提取）")
+    parser.add_argument("--rooms-per-hotel", type=int, default=DEFAULT_ROOMS_PER_HOTEL,
+                        help="本次压测每家酒店每晚的房间数，设小可以压测满房路径")
+    parser.add_argument("--parallel-search", action="store_true", default=None, help="并行查询航班和酒店")
+    parser.add_argument("--llm-max-in-flight", type=int, default=travel_agent.LLM_MAX_IN_FLIGHT,
+                        help="同时在途的 LLM 请求上限")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="同时在途的规划上限，超过时新请求记为拒绝")
+    parser.add_argument("--seed", type=int, default=0, help="随机请求的种子")
+    parser.add_argument("-o", "--output", help="把汇总写入该 JSON 文件")
+    args = parser.parse_args(argv)
+
+    mock = None
+    if args.spawn_mock:
+        mock = spawn_mock_server(args.mock_port, args.mock_latency_ms, args.mock_jitter_ms, args.mock_error_rate,
+                                 args.mock_output_token_ms, args.mock_slow_rate, args.mock_slow_ms)
+        args.base_url = f"http://127.0.0.1:{args.mock_port}/v1"
+
+    total = args.requests or max(int(args.rate * args.duration), 1)
+    inputs = file_inputs(args.input) if args.input else synthetic_inputs(args.seed)
+    travel_agent.configure(
+        room_inventory=RoomInventory(args.rooms_per_hotel), llm_call_timeout_s=args.llm_timeout,
+        extraction_latency_budget_s=args.latency_budget, llm_hedging=args.hedge
+    )
+    configure_agent(args.base_url, args.extraction, args.llm_max_in_flight, args.cache,
+                    args.batch_window_ms, args.batch_size)
+    travel_agent.METRICS.set_event_log(None)
+
+    print(f"🚀 压测: {total} 个请求, 目标 {args.rate}/s, 提取方式 {args.extraction}, LLM 服务 {args.base_url}",
+          file=sys.stderr)
+    try:
+        # 节点中的 print 在压测时只是噪音，统一丢弃
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            agent = travel_agent.create_async_travel_agent(parallel_search=args.parallel_search)
+            travel_agent.warm_up_llm()
+            summary = asyncio.run(run_load(agent, inputs, args.rate, total, args.max_in_flight))
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait()
+
+    summary["extraction"] = args.extraction
+    summary["base_url"] = args.base_url
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+
+    latency = summary["latency_ms"]
+    print(f"📊 吞吐 {summary['throughput_rps']}/s，成功 {summary['succeeded']}/{total}，满房 {summary['sold_out']}，"
+          f"p50 {latency['p50']}ms，p95 {latency['p95']}ms，p99 {latency['p99']}ms", file=sys.stderr)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return summary
+
+if __name__ == "__main__":
+    main()
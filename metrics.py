@@ -0,0 +1,236 @@
+# metrics.py
+import asyncio
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+# ==================== 配置区域 ====================
+# 延迟直方图的桶上界（秒）：Prometheus 客户端的默认桶，再补上亚毫秒级的桶（搜索、选择等节点远低于 5ms）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class Histogram:
+    """固定桶直方图：只保存各桶计数、总和与次数，内存不随请求数增长"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """按桶线性插值估算分位数（与 PromQL 的 histogram_quantile 相同）"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+        }
+
+def label_set(**pairs) -> Labels:
+    """把关键字参数转换为可哈希的标签元组"""
+    return tuple(sorted((key, str(value)) for key, value in pairs.items()))
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+class Metrics:
+    """节点与 LLM 调用的结构化指标
+
+    每个图节点记录耗时与结果（ok / exception），每个条件路由记录走向，每次 LLM 调用记录
+    耗时、状态与 token 数（含命中提示词缓存的 token）。可导出为 Prometheus 文本格式，
+    也可把每个事件实时追加为一行 JSON（set_event_log）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._event_log: Optional[TextIO] = None
+        self._collected: Dict[str, Tuple[str, str, Callable[[], Dict[Labels, float]]]] = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.node_latency: Dict[Labels, Histogram] = {}
+            self.llm_latency: Dict[Labels, Histogram] = {}
+            self.counters: Dict[str, Dict[Labels, float]] = {}
+
+    # ---------- 记录 ----------
+    def _count(self, name: str, labels: Labels, value: float = 1):
+        series = self.counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0) + value
+
+    def _emit(self, event: dict):
+        if self._event_log is not None:
+            event["ts"] = round(time.time(), 6)
+            self._event_log.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+    def record_node(self, node: str, seconds: float, outcome: str):
+        with self._lock:
+            labels = label_set(node=node)
+            self.node_latency.setdefault(labels, Histogram()).observe(seconds)
+            self._count("travel_agent_node_calls_total", label_set(node=node, outcome=outcome))
+            self._emit({"kind": "node", "node": node, "seconds": round(seconds, 6), "outcome": outcome})
+
+    def record_route(self, source: str, route: str):
+        with self._lock:
+            self._count("travel_agent_routes_total", label_set(source=source, route=route))
+            self._emit({"kind": "route", "source": source, "route": route})
+
+    def record_llm(self, backend: str, seconds: float, status: str, usage: Optional[dict] = None):
+        usage = usage or {}
+        with self._lock:
+            self.llm_latency.setdefault(label_set(backend=backend), Histogram()).observe(seconds)
+            self._count("travel_agent_llm_calls_total", label_set(backend=backend, status=status))
+            for kind in ("prompt", "completion", "cached"):
+                if usage.get(kind):
+                    self._count("travel_agent_llm_tokens_total", label_set(backend=backend, kind=kind), usage[kind])
+            self._emit({"kind": "llm", "backend": backend, "seconds": round(seconds, 6), "status": status, **usage})
+
+    def increment(self, name: str, value: float = 1, **labels):
+        """累加一个计数器（如提取结果解析成功 / 失败次数）"""
+        with self._lock:
+            self._count(name, label_set(**labels), value)
+
+    def counter_values(self, name: str, label: str) -> Dict[str, float]:
+        """按某个标签汇总计数器，{标签值: 合计}"""
+        with self._lock:
+            totals: Dict[str, float] = {}
+            for labels, value in self.counters.get(name, {}).items():
+                key = dict(labels).get(label, "")
+                totals[key] = totals.get(key, 0) + value
+            return totals
+
+    def llm_quantile(self, backend: str, q: float, min_count: int = 1) -> Optional[float]:
+        """某个后端 LLM 调用耗时的分位数（秒），样本少于 min_count 时返回 None"""
+        with self._lock:
+            hist = self.llm_latency.get(label_set(backend=backend))
+            if hist is None or hist.count < min_count:
+                return None
+            return hist.quantile(q)
+
+    def register_collected(self, name: str, help_text: str, collect: Callable[[], Dict[Labels, float]],
+                           kind: str = "gauge"):
+        """注册导出时才读取的指标（如提取缓存命中数），collect 返回 {标签: 值}"""
+        self._collected[name] = (help_text, kind, collect)
+
+    def set_event_log(self, stream: Optional[TextIO]):
+        """设置 JSON Lines 事件输出，None 表示关闭"""
+        with self._lock:
+            self._event_log = stream
+
+    # ---------- 导出 ----------
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "nodes": {dict(labels)["node"]: hist.summary() for labels, hist in self.node_latency.items()},
+                "llm": {dict(labels)["backend"]: hist.summary() for labels, hist in self.llm_latency.items()},
+                "counters": {
+                    name: [{**dict(labels), "value": value} for labels, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus 文本格式（exposition format 0.0.4）"""
+        lines: List[str] = []
+        with self._lock:
+            for name, help_text, series in [
+                ("travel_agent_node_latency_seconds", "图节点耗时", self.node_latency),
+                ("travel_agent_llm_latency_seconds", "LLM 调用耗时", self.llm_latency),
+            ]:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for labels, hist in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels, ('le', str(bound)))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {hist.sum}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {hist.count}")
+
+            for name, series in sorted(self.counters.items()):
+                lines += [f"# TYPE {name} counter"]
+                lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in sorted(series.items())]
+
+        for name, (help_text, kind, collect) in sorted(self._collected.items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in sorted(collect().items())]
+        return "\n".join(lines) + "\n"
+
+    # ---------- 埋点 ----------
+    def instrument_node(self, name: str, node: Callable) -> Callable:
+        """包装图节点（同步或异步），记录耗时与是否抛出异常"""
+        if asyncio.iscoroutinefunction(node):
+            @functools.wraps(node)
+            async def async_wrapper(state):
+                start = time.perf_counter()
+                outcome = "exception"
+                try:
+                    result = await node(state)
+                    outcome = "ok"
+                    return result
+                finally:
+                    self.record_node(name, time.perf_counter() - start, outcome)
+            return async_wrapper
+
+        @functools.wraps(node)
+        def wrapper(state):
+            start = time.perf_counter()
+            outcome = "exception"
+            try:
+                result = node(state)
+                outcome = "ok"
+                return result
+            finally:
+                self.record_node(name, time.perf_counter() - start, outcome)
+        return wrapper
+
+    def instrument_route(self, source: str, route: Callable) -> Callable:
+        """包装条件路由，记录每次选择的分支（成功路径或 error）"""
+        @functools.wraps(route)
+        def wrapper(state):
+            target = route(state)
+            for branch in target if isinstance(target, list) else [target]:
+                self.record_route(source, branch)
+            return target
+        return wrapper
+
+def token_usage(response) -> dict:
+    """从 LLM 响应中取出 token 数：prompt / completion / cached（命中提示词缓存的部分）"""
+    metadata = getattr(response, "response_metadata", None) or {}
+    return token_counts(metadata.get("token_usage") or {})
+
+def token_counts(usage: dict) -> dict:
+    """把 OpenAI 兼容接口返回的 usage 字典转换为 prompt / completion / cached"""
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt": usage.get("prompt_tokens", 0),
+        "completion": usage.get("completion_tokens", 0),
+        # DeepSeek 返回 prompt_cache_hit_tokens，OpenAI 返回 prompt_tokens_details.cached_tokens
+        "cached": usage.get("prompt_cache_hit_tokens") or details.get("cached_tokens", 0),
+    }
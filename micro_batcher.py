@@ -0,0 +1,141 @@
+# micro_batcher.py
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+# ==================== 配置区域 ====================
+DEFAULT_MAX_BATCH = 16           # 一批最多合并的请求数
+DEFAULT_WINDOW_S = 0.02          # 第一条请求到达后最多再等待这么久，凑够一批再处理
+DEFAULT_CONCURRENT_BATCHES = 8   # 同时处理的批数
+
+class MicroBatcher:
+    """把并发到达的请求合并成批处理
+
+    第一条请求到达后最多等待 window_s，或凑满 max_batch 条，就把这一批交给
+    process(items) -> results（与 items 一一对应）处理，再把每个结果交给各自的 Future。
+    process 在线程池中执行，一批处理期间下一批照常收集；process 抛出异常时整批请求都得到
+    该异常，results 中某一项是异常实例时只有对应的请求得到它。已被调用方取消的请求（超时、
+    对冲落败）不再交给 process。后台线程在第一次提交时才启动，max_batch / window_s 可以在运行中修改。
+    """
+
+    def __init__(self, process: Callable[[List[object]], List[object]], max_batch: int = DEFAULT_MAX_BATCH,
+                 window_s: float = DEFAULT_WINDOW_S, max_concurrent_batches: int = DEFAULT_CONCURRENT_BATCHES,
+                 name: str = "micro-batcher"):
+        self.process = process
+        self.max_batch = max_batch
+        self.window_s = window_s
+        self.max_concurrent_batches = max_concurrent_batches
+        self.name = name
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self.failures = 0
+
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple[object, Future]]]" = queue.Queue()
+        self._collector: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ---------- 提交 ----------
+    def submit(self, item) -> Future:
+        """提交一条请求，返回在所属批次处理完后完成的 Future"""
+        future = Future()
+        self._ensure_collector()
+        self._queue.put((item, future))
+        return future
+
+    def call(self, item):
+        """提交一条请求并等待结果"""
+        return self.submit(item).result()
+
+    async def acall(self, item):
+        """call 的异步版本，等待批次处理时不占用事件循环"""
+        return await asyncio.wrap_future(self.submit(item))
+
+    def _ensure_collector(self):
+        if self._collector is None:
+            with self._lock:
+                if self._collector is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_concurrent_batches, thread_name_prefix=self.name
+                    )
+                    self._collector = threading.Thread(target=self._collect_loop, name=self.name, daemon=True)
+                    self._collector.start()
+
+    # ---------- 批处理 ----------
+    def _collect_loop(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.window_s
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._executor.submit(self._run, batch)
+
+    def _run(self, batch: List[Tuple[object, Future]]):
+        # 标记为运行中后调用方无法再取消；已取消的请求直接丢弃
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        items = [item for item, _ in batch]
+        try:
+            results = self.process(items)
+            if len(results) != len(items):
+                raise ValueError(f"批处理返回 {len(results)} 个结果，期望 {len(items)} 个")
+        except Exception as e:
+            with self._lock:
+                self.failures += 1
+            for _, future in batch:
+                self._settle(future, e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.items += len(items)
+            self.largest = max(self.largest, len(items))
+        for (_, future), result in zip(batch, results):
+            self._settle(future, result)
+
+    @staticmethod
+    def _settle(future: Future, result):
+        """交付一条请求的结果（异常实例作为异常交付），单个 Future 出错不影响同批其他请求"""
+        try:
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    # ---------- 统计 ----------
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "failures": self.failures,
+                "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+                "largest": self.largest,
+            }
+
+    def close(self):
+        """处理完已提交的请求后停止后台线程"""
+        if self._collector is not None:
+            self._queue.put(None)
+            self._collector.join()
+            self._collector = None
+            self._executor.shutdown(wait=True)
+            self._executor = None
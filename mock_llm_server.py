@@ -0,0 +1,274 @@
+# mock_llm_server.py
+"""本地 OpenAI 兼容的模拟 LLM 服务，用于压测而不消耗 DeepSeek 额度
+
+实现 ChatOpenAI 用到的 POST /v1/chat/completions（含 stream=true 的 SSE）与 GET /v1/models。
+延迟、抖动与错误率可配置；回复是与提示词中用户输入相符的提取 JSON（由规则解析器生成），
+解析不出的字段使用固定的默认值。最后一条消息之前的内容（如固定的系统提示词）视为可缓存前缀，
+再次出现时在 usage 中报告 prompt_cache_hit_tokens，模拟 DeepSeek 的上下文缓存。用户消息中有多条
+编号的请求时按批量提取返回 {"results": [...]}；--output-token-ms 让生成耗时随输出长度增长。
+
+运行方式：
+    python mock_llm_server.py --port 8000 --latency-ms 300 --jitter-ms 100 --error-rate 0.01
+    python mock_llm_server.py --latency-ms 300 --output-token-ms 20
+    python mock_llm_server.py --latency-ms 300 --slow-rate 0.05 --slow-ms 5000
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from fare_engine import FLIGHT_ROUTES
+from text_parser import TravelTextParser
+
+# ==================== 配置区域 ====================
+DEFAULT_PORT = 8000
+CANNED_EXTRACTION = {"destination": "北京", "nights": 2, "guest_name": "游客"}
+
+USER_INPUT_PATTERN = re.compile(r'用户输入[:：]\s*"(.*?)"', re.S)
+TODAY_PATTERN = re.compile(r"今天是\s*(\d{4}-\d{2}-\d{2})")
+FIELD_PATTERN = re.compile(r'"(destination|travel_date|nights|guest_name)"\s*:')
+BATCH_LINE_PATTERN = re.compile(r"^\d+\.\s*用户输入.*$", re.M)
+REQUESTED_FIELDS_PATTERN = re.compile(r"请只提取以下字段[:：]\s*([a-z_, ]+)")
+EXTRACTION_FIELD_NAMES = ("destination", "travel_date", "nights", "guest_name")
+
+class MockLLMConfig:
+    """服务行为配置，可在运行中修改（例如压测过程中临时提高错误率）"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, model: str = "deepseek-chat", seed: Optional[int] = None,
+                 output_token_ms: float = 0.0, slow_rate: float = 0.0, slow_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        # 每个输出 token 的生成耗时，批量请求的回复更长、耗时也更长
+        self.output_token_ms = output_token_ms
+        # 长尾：以 slow_rate 的概率额外延迟 slow_ms（模拟上游偶发卡顿）
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.model = model
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """返回 (本次延迟秒数, 是否返回错误)"""
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+            failed = self._random.random() < self.error_rate
+            slow = self.slow_ms if self.slow_rate and self._random.random() < self.slow_rate else 0.0
+        return max(self.latency_ms + jitter, 0.0) / 1000 + slow / 1000, failed
+
+def canned_extraction(prompt: str, parser: TravelTextParser) -> dict:
+    """根据提示词中的用户输入生成提取结果；提示词只要求部分字段时只返回这些字段"""
+    today_match = TODAY_PATTERN.search(prompt)
+    today = datetime.strptime(today_match.group(1), "%Y-%m-%d").date() if today_match else date.today()
+
+    result = dict(CANNED_EXTRACTION, travel_date=today.strftime("%Y-%m-%d"))
+    input_match = USER_INPUT_PATTERN.search(prompt)
+    if input_match:
+        parsed = parser.parse(input_match.group(1), today)
+        result.update({field: parsed[field] for field in result if parsed.get(field)})
+
+    fields_match = REQUESTED_FIELDS_PATTERN.search(prompt)
+    if fields_match:
+        requested = [field for field in re.split(r"[,\s]+", fields_match.group(1)) if field in EXTRACTION_FIELD_NAMES]
+    else:
+        requested = FIELD_PATTERN.findall(prompt)
+    if requested:
+        result = {field: result[field] for field in dict.fromkeys(requested)}
+    return result
+
+def canned_response(prompt: str, parser: TravelTextParser) -> dict:
+    """单条请求返回提取结果；多条编号的请求返回 {"results": [...]}，按编号顺序一一对应"""
+    lines = BATCH_LINE_PATTERN.findall(prompt)
+    if not lines:
+        return canned_extraction(prompt, parser)
+    today_match = TODAY_PATTERN.search(prompt)
+    header = today_match.group(0) + "\n" if today_match else ""
+    return {"results": [canned_extraction(header + line, parser) for line in lines]}
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文约 1 字 1 token，其余约 4 字符 1 token"""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk + (len(text) - cjk) // 4 + 1
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    server_version = "MockLLM/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": self.server.config.model, "object": "model", "owned_by": "mock"}
+            ]})
+        else:
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found", "type": "invalid_request_error"}})
+            return
+
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.server.config
+        delay, failed = config.draw()
+        time.sleep(delay)
+
+        if failed:
+            self._send_json(config.error_status, {"error": {"message": "mock upstream error", "type": "server_error"}})
+            return
+
+        messages = [str(message.get("content", "")) for message in request.get("messages", [])]
+        prompt = "\n".join(messages)
+        content = json.dumps(canned_response(prompt, self.server.parser), ensure_ascii=False)
+        usage = {
+            "prompt_tokens": estimate_tokens(prompt),
+            "completion_tokens": estimate_tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        cached = self.server.cached_prefix_tokens(messages[:-1])
+        usage["prompt_cache_hit_tokens"] = cached
+        usage["prompt_cache_miss_tokens"] = usage["prompt_tokens"] - cached
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+        generation_s = usage["completion_tokens"] * config.output_token_ms / 1000
+        if request.get("stream"):
+            include_usage = bool((request.get("stream_options") or {}).get("include_usage"))
+            self._stream(completion_id, content, usage, include_usage, generation_s)
+            return
+        time.sleep(generation_s)
+
+        self._send_json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": config.model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id: str, content: str, usage: dict, include_usage: bool = False,
+                generation_s: float = 0.0):
+        """SSE 流式返回：每个分片几个字符，最后发送 [DONE]
+
+        include_usage 时与 OpenAI 一致，在 [DONE] 之前单独发送一个 choices 为空、只带 usage 的分片。
+        """
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send(delta: Optional[dict], finish_reason=None, extra=None):
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": self.server.config.model,
+                "choices": [] if delta is None else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send({"role": "assistant", "content": ""})
+        pieces = range(0, len(content), 8)
+        for start in pieces:
+            if generation_s:
+                time.sleep(generation_s / len(pieces))
+            send({"content": content[start:start + 8]})
+        if include_usage:
+            send({}, "stop")
+            send(None, extra={"usage": usage})
+        else:
+            send({}, "stop", {"usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+class MockLLMServer(ThreadingHTTPServer):
+    """记录见过的提示词前缀，用于模拟上下文缓存命中"""
+
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._prefixes = set()
+        self._prefix_lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # 客户端超时或取消了对冲请求中落后的一方时会提前断开，不打印堆栈
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+    def cached_prefix_tokens(self, prefix_messages) -> int:
+        """前缀（最后一条消息之前的全部消息）以前出现过时返回其 token 数，否则记住它并返回 0"""
+        if not prefix_messages:
+            return 0
+        prefix = "\n".join(prefix_messages)
+        with self._prefix_lock:
+            if prefix in self._prefixes:
+                return estimate_tokens(prefix)
+            self._prefixes.add(prefix)
+            return 0
+
+def create_server(host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                  config: Optional[MockLLMConfig] = None) -> ThreadingHTTPServer:
+    """创建（未启动的）模拟服务；port=0 时由系统分配端口"""
+    server = MockLLMServer((host, port), MockLLMHandler)
+    server.config = config or MockLLMConfig()
+    server.parser = TravelTextParser(list(FLIGHT_ROUTES))
+    return server
+
+def start_in_background(host: str = "127.0.0.1", port: int = 0,
+                        config: Optional[MockLLMConfig] = None) -> ThreadingHTTPServer:
+    """在后台线程中启动，返回 server；base_url 为 http://host:server.server_port/v1"""
+    server = create_server(host, port, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的模拟 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="平均响应延迟")
+    parser.add_argument("--jitter-ms", type=float, default=100.0, help="延迟在 ±jitter 内均匀抖动")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回错误的概率")
+    parser.add_argument("--error-status", type=int, default=500, help="错误时的 HTTP 状态码（如 429、503）")
+    parser.add_argument("--output-token-ms", type=float, default=0.0, help="每个输出 token 的生成耗时")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="额外延迟 --slow-ms 的请求比例（长尾）")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="长尾请求的额外延迟")
+    parser.add_argument("--seed", type=int, help="随机种子，便于复现")
+    args = parser.parse_args(argv)
+
+    config = MockLLMConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, seed=args.seed,
+                           output_token_ms=args.output_token_ms, slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+    server = create_server(args.host, args.port, config)
+    print(f"🧪 模拟 LLM 服务: http://{args.host}:{server.server_port}/v1 "
+          f"(延迟 {args.latency_ms}±{args.jitter_ms}ms, 错误率 {args.error_rate:.1%})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
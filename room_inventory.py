@@ -0,0 +1,131 @@
+# room_inventory.py
+import threading
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# ==================== 配置区域 ====================
+DEFAULT_ROOMS_PER_HOTEL = 20
+DEFAULT_LOCK_STRIPES = 64
+
+DateLike = Union[str, date]
+NightKey = Tuple[str, str]  # (酒店名, 入住日期 YYYY-MM-DD)
+
+def _to_date(value: DateLike) -> date:
+    return value if isinstance(value, date) else datetime.strptime(value, "%Y-%m-%d").date()
+
+class RoomInventory:
+    """按 (酒店, 日期) 计数的客房库存
+
+    多晚预订要么全部扣减、要么一晚都不扣。锁按 (酒店, 日期) 分段（striped lock）：
+    一次预订只锁住它涉及的几个分段，按分段编号升序加锁避免死锁，不同酒店 / 不同日期的
+    预订可以并发进行，不会在一把全局锁上排队。某一晚首次被访问时才按容量初始化计数。
+    """
+
+    def __init__(self, rooms_per_hotel: int = DEFAULT_ROOMS_PER_HOTEL,
+                 capacities: Optional[Dict[str, int]] = None, stripes: int = DEFAULT_LOCK_STRIPES):
+        self.rooms_per_hotel = rooms_per_hotel
+        self.capacities = dict(capacities or {})
+        self._locks = [threading.Lock() for _ in range(max(stripes, 1))]
+        # 每个键只在持有其分段锁时修改
+        self._remaining: Dict[NightKey, int] = {}
+        # 计数器按分段存放，在已持有的分段锁下累加，不需要额外的全局锁
+        self._reserved = [0] * len(self._locks)
+        self._rejected = [0] * len(self._locks)
+        self._released = [0] * len(self._locks)
+
+    def capacity(self, hotel: str) -> int:
+        return self.capacities.get(hotel, self.rooms_per_hotel)
+
+    @staticmethod
+    def night_keys(hotel: str, check_in: DateLike, nights: int) -> List[NightKey]:
+        """入住期间每一晚的键"""
+        start = _to_date(check_in)
+        return [(hotel, (start + timedelta(days=offset)).strftime("%Y-%m-%d")) for offset in range(max(nights, 1))]
+
+    def _stripes(self, keys: List[NightKey]) -> List[int]:
+        return sorted({hash(key) % len(self._locks) for key in keys})
+
+    def _acquire(self, stripes: List[int]):
+        for index in stripes:
+            self._locks[index].acquire()
+
+    def _release_locks(self, stripes: List[int]):
+        for index in reversed(stripes):
+            self._locks[index].release()
+
+    def _left(self, key: NightKey) -> int:
+        left = self._remaining.get(key)
+        return self.capacity(key[0]) if left is None else left
+
+    # ---------- 查询 ----------
+    def remaining(self, hotel: str, check_in: DateLike, nights: int = 1) -> int:
+        """入住期间每晚剩余房数的最小值，即还能整段预订的房间数"""
+        keys = self.night_keys(hotel, check_in, nights)
+        stripes = self._stripes(keys)
+        self._acquire(stripes)
+        try:
+            return min(self._left(key) for key in keys)
+        finally:
+            self._release_locks(stripes)
+
+    # ---------- 预订与释放 ----------
+    def reserve(self, hotel: str, check_in: DateLike, nights: int, rooms: int = 1) -> bool:
+        """原子地为 check_in 起连续 nights 晚各扣减 rooms 间，任一晚不足时不做任何修改并返回 False"""
+        keys = self.night_keys(hotel, check_in, nights)
+        stripes = self._stripes(keys)
+        self._acquire(stripes)
+        try:
+            if any(self._left(key) < rooms for key in keys):
+                self._rejected[stripes[0]] += 1
+                return False
+            for key in keys:
+                self._remaining[key] = self._left(key) - rooms
+            self._reserved[stripes[0]] += 1
+            return True
+        finally:
+            self._release_locks(stripes)
+
+    def restore(self, bookings: Iterable[dict]) -> int:
+        """按已有预订（账本记录，含 hotel_name / check_in / nights）扣减库存，返回计入的预订数
+
+        进程重启后计数从容量重新开始，需在新建的库存上调用一次，让已落盘的预订继续占用房间。
+        超出容量的部分按 0 计，不会因历史数据拒绝启动。
+        """
+        restored = 0
+        for booking in bookings:
+            check_in, nights = booking.get("check_in"), booking.get("nights") or 0
+            if booking.get("status") != "success" or not check_in or nights <= 0:
+                continue
+            try:
+                keys = self.night_keys(booking["hotel_name"], check_in, nights)
+            except (KeyError, ValueError):
+                continue
+            stripes = self._stripes(keys)
+            self._acquire(stripes)
+            try:
+                for key in keys:
+                    self._remaining[key] = max(self._left(key) - 1, 0)
+            finally:
+                self._release_locks(stripes)
+            restored += 1
+        return restored
+
+    def release(self, hotel: str, check_in: DateLike, nights: int, rooms: int = 1):
+        """归还 reserve 扣减的房间（预订失败、取消或重复提交时调用）"""
+        keys = self.night_keys(hotel, check_in, nights)
+        stripes = self._stripes(keys)
+        self._acquire(stripes)
+        try:
+            for key in keys:
+                self._remaining[key] = min(self._left(key) + rooms, self.capacity(hotel))
+            self._released[stripes[0]] += 1
+        finally:
+            self._release_locks(stripes)
+
+    def stats(self) -> dict:
+        return {
+            "reserved": sum(self._reserved),
+            "rejected": sum(self._rejected),
+            "released": sum(self._released),
+            "stripes": len(self._locks),
+        }
@@ -0,0 +1,77 @@
+# stream_json.py
+import json
+from typing import Dict, Optional
+
+class IncrementalJSONParser:
+    """流式解析 LLM 输出中的第一个 JSON 对象
+
+    每次 feed 一段文本，返回这段文本中刚刚写完的顶层字段 {字段: 值}——字段值一结束
+    （遇到顶层的逗号或右花括号）就可用，不必等整个回复生成完。对象之前的说明文字、
+    代码块标记等会被跳过；嵌套的对象 / 数组整体作为一个值解析。
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, object] = {}
+        self.complete = False
+        self.failed = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._token = []  # 当前顶层键或值的原始文本
+
+    def feed(self, text: str) -> Dict[str, object]:
+        new_fields = {}
+        for ch in text:
+            if self.complete or self.failed:
+                break
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                self._token.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._token.append(ch)
+            elif ch in "{[":
+                self._depth += 1
+                self._token.append(ch)
+            elif ch in "]}" and self._depth > 1:
+                self._depth -= 1
+                self._token.append(ch)
+            elif self._depth == 1 and ch == ":" and self._key is None:
+                self._key = self._decode("".join(self._token))
+                self._token = []
+            elif self._depth == 1 and ch in ",}":
+                if self._key is not None:
+                    value = self._decode("".join(self._token))
+                    if not self.failed:
+                        self.fields[self._key] = new_fields[self._key] = value
+                self._key, self._token = None, []
+                if ch == "}":
+                    self._depth = 0
+                    self.complete = True
+            else:
+                self._token.append(ch)
+        return new_fields
+
+    def _decode(self, raw: str):
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            self.failed = True
+            return None
+
+    def result(self) -> Optional[dict]:
+        """对象完整且解析成功时返回全部字段，否则返回 None"""
+        return dict(self.fields) if self.complete and not self.failed else None
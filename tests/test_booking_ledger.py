@@ -0,0 +1,51 @@
+# tests/test_booking_ledger.py
+import asyncio
+import time
+
+import pytest
+
+import travel_agent
+from booking_ledger import BookingLedger
+from room_inventory import RoomInventory
+
+def test_cancelled_booking_is_skipped_and_writer_survives():
+    ledger = BookingLedger(window_s=0.2)
+    cancelled = ledger.submit({"guest_name": "张三"}, "k1")
+    assert cancelled.cancel()
+    kept = ledger.submit({"guest_name": "李四"}, "k2")
+    assert kept.result(timeout=2)["idempotency_key"] == "k2"
+    assert ledger.count() == 1
+    assert ledger.append({"guest_name": "王五"}, "k3")["idempotency_key"] == "k3"
+    ledger.close()
+
+def test_writer_restarts_after_exit():
+    ledger = BookingLedger()
+    ledger.append({"guest_name": "张三"}, "k1")
+    ledger._queue.put(None)
+    ledger._writer.join(timeout=2)
+    assert not ledger._writer.is_alive()
+    assert ledger.append({"guest_name": "李四"}, "k2")["idempotency_key"] == "k2"
+    ledger.close()
+
+def test_cancelled_async_booking_keeps_rooms_once_committed(monkeypatch):
+    ledger, inventory = BookingLedger(window_s=0.2), RoomInventory(rooms_per_hotel=1)
+    monkeypatch.setattr(travel_agent, "BOOKING_LEDGER", ledger)
+    monkeypatch.setattr(travel_agent, "ROOM_INVENTORY", inventory)
+
+    async def book():
+        return await travel_agent.abook_flight_and_hotel("CA1234", "北京饭店", "张三", "k1", "2030-01-01", 2)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(book(), 0.01))
+    deadline = time.perf_counter() + 2
+    while ledger.count() == 0 and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert ledger.count() == 1
+    assert inventory.remaining("北京饭店", "2030-01-01", 2) == 0
+    ledger.close()
+
+def test_plan_idempotency_key_depends_on_reference_date():
+    key = travel_agent.plan_idempotency_key("t1", "明天去北京", "2030-01-01")
+    assert key == travel_agent.plan_idempotency_key("t1", "明天去北京", "2030-01-01")
+    assert key != travel_agent.plan_idempotency_key("t1", "明天去北京", "2030-01-02")
@@ -0,0 +1,62 @@
+# tests/test_guarded_llm.py
+import asyncio
+import time
+
+import pytest
+
+import travel_agent
+from circuit_breaker import CircuitBreaker
+
+@pytest.fixture
+def hung_llm(monkeypatch):
+    """LLM 拿到名额后一直不返回；对冲延迟加单次超时超出延迟预算"""
+    def request(user_input, today, fields=None, known=None, on_start=None):
+        on_start(travel_agent.LLM_CALL_TIMEOUT_S)
+        time.sleep(0.6)
+        return {}
+
+    async def arequest(user_input, today, fields=None, known=None, on_start=None):
+        on_start(travel_agent.LLM_CALL_TIMEOUT_S)
+        await asyncio.sleep(0.6)
+        return {}
+
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout_s=60)
+    monkeypatch.setattr(travel_agent, "request_llm_fields", request)
+    monkeypatch.setattr(travel_agent, "arequest_llm_fields", arequest)
+    monkeypatch.setattr(travel_agent, "CIRCUIT_BREAKER", breaker)
+    monkeypatch.setattr(travel_agent, "EXTRACTION_BATCHING", False)
+    monkeypatch.setattr(travel_agent, "LLM_HEDGING", True)
+    monkeypatch.setattr(travel_agent, "LLM_HEDGE_MIN_SAMPLES", 10 ** 9)
+    monkeypatch.setattr(travel_agent, "LLM_HEDGE_DEFAULT_DELAY_S", 0.15)
+    monkeypatch.setattr(travel_agent, "LLM_CALL_TIMEOUT_S", 0.2)
+    monkeypatch.setattr(travel_agent, "EXTRACTION_LATENCY_BUDGET_S", 0.3)
+    return breaker
+
+def test_timeouts_open_breaker_with_hedging(hung_llm):
+    for _ in range(2):
+        with pytest.raises(travel_agent.LLMUnavailable) as info:
+            travel_agent.guarded_llm_fields("去北京", "2030-01-01")
+        assert info.value.reason == "timeout"
+    assert hung_llm.state == CircuitBreaker.OPEN
+    with pytest.raises(travel_agent.LLMUnavailable) as info:
+        travel_agent.guarded_llm_fields("去北京", "2030-01-01")
+    assert info.value.reason == "circuit_open"
+
+def test_async_timeouts_open_breaker_with_hedging(hung_llm):
+    async def run():
+        for _ in range(2):
+            with pytest.raises(travel_agent.LLMUnavailable) as info:
+                await travel_agent.aguarded_llm_fields("去北京", "2030-01-01")
+            assert info.value.reason == "timeout"
+
+    asyncio.run(run())
+    assert hung_llm.state == CircuitBreaker.OPEN
+
+def test_hedge_that_outlives_budget_still_counts_timeout(hung_llm, monkeypatch):
+    # 对冲能在预算内发出，但主调用跑满超时后预算耗尽时对冲仍未结束
+    monkeypatch.setattr(travel_agent, "LLM_HEDGE_DEFAULT_DELAY_S", 0.05)
+    monkeypatch.setattr(travel_agent, "EXTRACTION_LATENCY_BUDGET_S", 0.25)
+    with pytest.raises(travel_agent.LLMUnavailable) as info:
+        travel_agent.guarded_llm_fields("去北京", "2030-01-01")
+    assert info.value.reason == "timeout"
+    assert hung_llm.stats()["consecutive_failures"] == 1
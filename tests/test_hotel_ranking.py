@@ -0,0 +1,18 @@
+# tests/test_hotel_ranking.py
+import numpy as np
+
+from hotel_ranking import rank_columns, rank_hotels, score_columns
+
+def test_all_zero_ratings_score_zero_without_nan():
+    scores = score_columns(np.array([300.0, 500.0]), np.array([0.0, 0.0]), nights=2)
+    assert np.isfinite(scores).all()
+    assert (scores == 0).all()
+
+def test_all_zero_ratings_still_rank_every_hotel():
+    hotels = [{"name": "A", "price_per_night": 300, "rating": 0}, {"name": "B", "price_per_night": 500, "rating": 0}]
+    ranked = rank_hotels(hotels, nights=2, weights={"total_cost": 1.0})
+    assert [hotel["name"] for hotel, _ in ranked] == ["A", "B"]
+
+def test_empty_columns_rank_nothing():
+    indices, scores = rank_columns([], [], nights=1)
+    assert len(indices) == 0 and len(scores) == 0
@@ -0,0 +1,53 @@
+# tests/test_micro_batcher.py
+import asyncio
+import threading
+
+import pytest
+
+import travel_agent
+from micro_batcher import MicroBatcher
+
+def test_cancelled_request_does_not_strand_the_batch():
+    release = threading.Event()
+    batcher = MicroBatcher(lambda items: release.wait() and [item * 2 for item in items], window_s=0.2)
+    first, second = batcher.submit(1), batcher.submit(2)
+    assert first.cancel()
+    release.set()
+    assert second.result(timeout=2) == 4
+    batcher.close()
+
+def test_async_timeout_cancels_only_that_request():
+    batcher = MicroBatcher(lambda items: [item * 2 for item in items], window_s=0.2)
+
+    async def run():
+        waiter = asyncio.ensure_future(batcher.acall(2))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(batcher.acall(1), 0.05)
+        return await asyncio.wait_for(waiter, 2)
+
+    assert asyncio.run(run()) == 4
+    batcher.close()
+
+def test_exception_result_fails_only_its_request():
+    batcher = MicroBatcher(lambda items: [ValueError(item) if item < 0 else item for item in items], window_s=0.05)
+    bad, good = batcher.submit(-1), batcher.submit(3)
+    assert good.result(timeout=2) == 3
+    with pytest.raises(ValueError):
+        bad.result(timeout=2)
+    batcher.close()
+
+def test_extract_batch_isolates_failing_date_group(monkeypatch):
+    class FakeClients:
+        def invoke(self, messages, backend, timeout=None, on_slot=None):
+            if "2030-01-02" in messages[-1][1]:
+                raise ConnectionError("boom")
+            return type("Reply", (), {"content": '{"results": [{"nights": 3}]}'})()
+
+    monkeypatch.setattr(travel_agent, "LLM_CLIENTS", FakeClients())
+    monkeypatch.setattr(travel_agent, "CIRCUIT_BREAKER", travel_agent.CircuitBreaker())
+    results = travel_agent._extract_batch([
+        ("住三晚", "2030-01-01", ["nights"], None),
+        ("住两晚", "2030-01-02", ["nights"], None),
+    ])
+    assert results[0] == {"nights": 3}
+    assert isinstance(results[1], ConnectionError)
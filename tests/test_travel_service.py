@@ -0,0 +1,13 @@
+# tests/test_travel_service.py
+import asyncio
+from http import HTTPStatus
+
+import pytest
+
+import travel_service
+
+def test_batch_larger_than_pool_capacity_is_rejected_with_413():
+    service = travel_service.TravelService(None, travel_service.WorkerPool(2, 3))
+    with pytest.raises(travel_service.HTTPError) as info:
+        asyncio.run(service.handle_batch({"requests": ["后天去杭州住三晚"] * 6}))
+    assert info.value.status == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
@@ -0,0 +1,175 @@
+# text_parser.py
+import calendar
+import re
+from datetime import date, timedelta
+from typing import List, Optional
+
+# ==================== 中文数字 ====================
+CN_DIGITS = {
+    "零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+    "五": 5, "六": 6, "七": 7, "八": 8, "九": 9
+}
+CN_UNITS = {"十": 10, "百": 100}
+
+WEEKDAYS = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6, "末": 5}
+
+def cn_to_int(text: str) -> int:
+    """把阿拉伯数字或中文数字（两、十一、二十五、一百）转换为整数"""
+    if text.isdigit():
+        return int(text)
+
+    total = current = 0
+    for ch in text:
+        if ch in CN_DIGITS:
+            current = CN_DIGITS[ch]
+        elif ch in CN_UNITS:
+            total += (current or 1) * CN_UNITS[ch]
+            current = 0
+    return total + current
+
+# ==================== 解析器 ====================
+NUM = r"(?:[0-9]+|[零〇一二两三四五六七八九十百]+)"
+NAME_BOUNDARY = r"(?=[\s，。！？、；,.!?]|$)"
+DEFAULT_MAX_NIGHTS = 90
+
+class TravelTextParser:
+    """旅行需求文本解析器
+
+    所有规则在构造时编译成一个带命名分组的正则，parse() 只对输入做一次 finditer，
+    按命中的分组分派处理：目的地、相对/绝对日期、中文或阿拉伯数字的晚数、姓名，
+    以及“出现了线索但无法解析”的提示，供调用方评估置信度。晚数超出 1..max_nights 时不采用，
+    只记为提示（nights_hint），交给调用方的下一级提取器判断。
+    """
+
+    def __init__(self, destinations: List[str], max_nights: int = DEFAULT_MAX_NIGHTS):
+        self.destinations = list(destinations)
+        self.max_nights = max_nights
+        cities = "|".join(re.escape(city) for city in sorted(self.destinations, key=len, reverse=True))
+
+        # 分支顺序即优先级：同一位置上越具体的规则越靠前
+        self.pattern = re.compile("|".join([
+            rf"(?P<destination>{cities})",
+            r"(?P<iso_date>(?P<iso_y>\d{4})[-/.](?P<iso_m>\d{1,2})[-/.](?P<iso_d>\d{1,2}))",
+            rf"(?P<cn_date>(?:(?P<cn_y>\d{{4}})年)?(?P<cn_m>{NUM})月(?P<cn_d>{NUM})[日号])",
+            r"(?P<rel_day>今天|明天|后天|大后天)",
+            rf"(?P<later>(?P<later_n>{NUM})\s*个?(?P<later_unit>天|周|星期|礼拜)[之以]?后)",
+            r"(?P<week>(?P<week_prefix>下下|下|这|本)?个?(?:周|星期|礼拜)(?P<week_day>[一二三四五六日天末]))",
+            r"(?P<month_end>月底|月末)",
+            rf"(?P<nights>(?P<nights_n>{NUM})\s*个?\s*(?:晚上?|夜))",
+            rf"(?P<days>(?P<days_n>{NUM})\s*天)",
+            rf"(?P<weeks>(?P<weeks_n>{NUM})\s*个?(?:周|星期|礼拜))",
+            r"(?P<name>(?:名字是|名字叫|名字|我叫|姓名[是为:：]?|我是|称我为|叫我)"
+            rf"(?:\s*(?=(?P<name_bounded>[一-龥]{{2,4}}?){NAME_BOUNDARY})|\s*(?=(?P<name_loose>[一-龥]{{2}})))?)",
+            r"(?P<date_hint>月|日|号|周|星期|礼拜)",
+            r"(?P<nights_hint>晚|夜)",
+        ]))
+
+    def parse(self, text: str, today: date) -> dict:
+        """解析一条输入；未识别的字段为 None"""
+        result = {
+            "destination": None,
+            "travel_date": None,
+            "nights": None,
+            "guest_name": None,
+            "name_bounded": False,
+            "date_hint": False,
+            "nights_hint": False,
+            "name_hint": False,
+        }
+        day_count = None
+        travel_date = None
+
+        for match in self.pattern.finditer(text):
+            kind = match.lastgroup
+
+            if kind == "destination":
+                # 多个城市时优先取“去/到/飞/往”后面的那个
+                preceded = match.start() > 0 and text[match.start() - 1] in "去到飞往"
+                if result["destination"] is None or preceded:
+                    result["destination"] = match.group(kind)
+            elif kind == "nights":
+                if result["nights"] is None:
+                    result["nights"] = cn_to_int(match.group("nights_n"))
+            elif kind == "days":
+                if day_count is None:
+                    day_count = cn_to_int(match.group("days_n"))
+            elif kind == "weeks":
+                if day_count is None:
+                    day_count = cn_to_int(match.group("weeks_n")) * 7
+            elif kind == "name":
+                name = match.group("name_bounded") or match.group("name_loose")
+                if name and result["guest_name"] is None:
+                    result["guest_name"] = name
+                    result["name_bounded"] = bool(match.group("name_bounded"))
+                elif not name:
+                    result["name_hint"] = True
+            elif kind == "date_hint":
+                result["date_hint"] = True
+            elif kind == "nights_hint":
+                result["nights_hint"] = True
+            elif travel_date is None:
+                travel_date = self._resolve_date(kind, match, today)
+                if travel_date is None:
+                    result["date_hint"] = True
+
+        # “住两晚”比“玩3天”更直接，只有没提晚数时才用天数
+        if result["nights"] is None:
+            result["nights"] = day_count
+        if result["nights"] is not None and not 1 <= result["nights"] <= self.max_nights:
+            # “一百二十晚”“零晚”之类：有晚数线索但不可信
+            result["nights"] = None
+            result["nights_hint"] = True
+        if travel_date is not None:
+            result["travel_date"] = travel_date.strftime("%Y-%m-%d")
+        return result
+
+    def _resolve_date(self, kind: str, match, today: date) -> Optional[date]:
+        try:
+            if kind == "iso_date":
+                return date(int(match.group("iso_y")), int(match.group("iso_m")), int(match.group("iso_d")))
+
+            if kind == "cn_date":
+                month, day = cn_to_int(match.group("cn_m")), cn_to_int(match.group("cn_d"))
+                if match.group("cn_y"):
+                    return date(int(match.group("cn_y")), month, day)
+                # 没写年份时取今天之后最近的那一天
+                candidate = date(today.year, month, day)
+                return candidate if candidate >= today else date(today.year + 1, month, day)
+        except ValueError:
+            return None
+
+        if kind == "rel_day":
+            offsets = {"今天": 0, "明天": 1, "后天": 2, "大后天": 3}
+            return today + timedelta(days=offsets[match.group(kind)])
+
+        if kind == "later":
+            unit_days = 1 if match.group("later_unit") == "天" else 7
+            return today + timedelta(days=cn_to_int(match.group("later_n")) * unit_days)
+
+        if kind == "week":
+            return self._resolve_weekday(match.group("week_prefix"), match.group("week_day"), today)
+
+        if kind == "month_end":
+            return today.replace(day=calendar.monthrange(today.year, today.month)[1])
+
+        return None
+
+    @staticmethod
+    def _resolve_weekday(prefix: Optional[str], day: str, today: date) -> date:
+        """下周X：今天之后的第一个星期X（与提示词中的约定一致）；这周X / 周X：本周的星期X，已过则顺延"""
+        weekday = WEEKDAYS[day]
+        if prefix in ("下", "下下"):
+            offset = (weekday - today.weekday() + 7) % 7 or 7
+            if day == "末":
+                # 下周末：本周末之后的那个周末
+                offset = (weekday - today.weekday()) % 7 + 7
+            if prefix == "下下":
+                offset += 7
+            return today + timedelta(days=offset)
+
+        offset = weekday - today.weekday()
+        if day == "末" and today.weekday() == 6:
+            offset = 0
+        elif offset < 0:
+            offset += 7
+        return today + timedelta(days=offset)
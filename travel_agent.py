@@ -1,19 +1,167 @@
 # travel_agent.py
 import os
-from typing import Dict, List, TypedDict, Optional
-from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
-from langgraph.graph import StateGraph, END
+from typing import Callable, Dict, List, TypedDict, Optional
 from datetime import datetime, timedelta
-import re
 import json
-import random
+import threading
+import hashlib
+import uuid
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from booking_ledger import BookingLedger
+from circuit_breaker import CircuitBreaker
+from extraction_cache import ExtractionCache
+from fare_engine import FareEngine
+from hotel_inventory import get_hotel_inventory
+from hotel_ranking import rank_hotels
+from llm_client import LLMClientManager
+from metrics import Metrics, label_set
+from micro_batcher import MicroBatcher
+from room_inventory import RoomInventory
+from stream_json import IncrementalJSONParser
+from text_parser import TravelTextParser
+
+# LangGraph、检查点和 LLM 客户端（langchain_openai / openai / langchain_community）都在首次用到时才导入，
+# 导入本模块只加载规则解析、票价引擎等轻量依赖
 
 # ==================== 配置区域 ====================
 USE_API = True
+# 仅规则模式：信息提取只用规则引擎，既不调用也不导入任何 LLM 客户端；
+# 也可以通过环境变量 TRAVEL_AGENT_RULE_ONLY=1 开启（便于批量 worker 快速启动）
+RULE_ONLY = os.environ.get("TRAVEL_AGENT_RULE_ONLY") == "1"
 DEEPSEEK_API_KEY = "sk-a83*****************59d"
 DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
 
+# 信息提取缓存：EXTRACTION_CACHE_DB 为 None 时只使用内存
+EXTRACTION_CACHE_SIZE = 1024
+EXTRACTION_CACHE_TTL = 6 * 3600
+EXTRACTION_CACHE_DB = None
+
+# 指标：记录每个节点、每个路由和每次 LLM 调用，可导出为 Prometheus 文本或 JSON Lines
+METRICS_ENABLED = True
+METRICS = Metrics()
+
+# LLM 客户端：进程内复用，限制在途请求数
+LLM_MAX_IN_FLIGHT = 8
+# JSON 模式：要求 LLM 只输出一个 JSON 对象（DeepSeek response_format=json_object）
+LLM_JSON_MODE = True
+
+# 超时：单次 LLM 调用从拿到在途名额起最长等待时间（本地排队不计入），以及一次信息提取（含排队和对冲请求）
+# 的总延迟预算，超出后回退到规则提取；客户端不再自动重试，失败由对冲、熔断和规则回退处理
+LLM_CALL_TIMEOUT_S = 8.0
+LLM_BATCH_TIMEOUT_PER_ITEM_S = 1.0   # 微批调用每多合并一条请求，超时增加的秒数（输出随条数增长）
+EXTRACTION_LATENCY_BUDGET_S = 10.0
+LLM_MAX_RETRIES = 0
+LLM_QUEUE_POLL_S = 0.05              # 调用还在排队时，检查是否已拿到名额的间隔
+
+# 熔断：连续失败 N 次后打开，打开期间信息提取直接使用规则，之后放行一个探测请求
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RECOVERY_S = 30.0
+
+# 对冲请求：第一次调用超过历史 p95 耗时仍未返回时再发一次相同请求，取先返回的结果
+LLM_HEDGING = False
+LLM_HEDGE_QUANTILE = 0.95
+LLM_HEDGE_MIN_SAMPLES = 20       # 样本不足时使用默认延迟
+LLM_HEDGE_DEFAULT_DELAY_S = 2.0
+
+LLM_CLIENTS = LLMClientManager(
+    api_key=DEEPSEEK_API_KEY,
+    base_url=DEEPSEEK_BASE_URL,
+    max_in_flight=LLM_MAX_IN_FLIGHT,
+    metrics=METRICS if METRICS_ENABLED else None,
+    json_mode=LLM_JSON_MODE,
+    timeout=LLM_CALL_TIMEOUT_S,
+    max_retries=LLM_MAX_RETRIES
+)
+CIRCUIT_BREAKER = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RECOVERY_S)
+
+# 酒店库存文件（CSV / JSON / JSONL），None 表示使用 data/hotels.csv
+HOTEL_INVENTORY_PATH = None
+
+# 检查点：None 不保存，"memory" 进程内保存，"sqlite" 写入 CHECKPOINT_DB；
+# 开启后按 thread_id 记录每一步完成后的状态，中断的规划可从最后完成的节点继续
+CHECKPOINT_BACKEND = None
+CHECKPOINT_DB = "checkpoints.sqlite3"
+
+# 模拟票价引擎：按 (目的地, 日期) 确定性生成，线程安全
+FARE_ENGINE = FareEngine()
+
+# 灵活日期：当天无航班时在前后 N 天内查找替代航班（0 表示关闭），每偏离一天按该罚分（元）计入排序
+FLEXIBLE_DATE_DAYS = 3
+FLEXIBLE_DATE_PENALTY = 100
+
+# 酒店排序：各指标权重（见 hotel_ranking.DEFAULT_WEIGHTS）与保留的候选数
+HOTEL_RANKING_WEIGHTS = {"value": 1.0, "rating": 0.0, "total_cost": 0.0, "budget": 0.0}
+HOTEL_TOP_K = 3
+
+# 分级提取：先用规则，只有无法确定的字段才调用 LLM
+TIERED_EXTRACTION = True
+
+# 并行查询：信息提取后同时查询航班和酒店，在汇合节点检查结果
+PARALLEL_SEARCH = False
+
+# 流式提取：边接收 LLM 输出边解析 JSON，目的地和日期一确定就在后台提前查询航班
+STREAMING_EXTRACTION = True
+FLIGHT_PREFETCH_WORKERS = 4
+
+# 微批提取：把窗口内（或凑满 N 条）并发到达的提取请求合并成一次 LLM 调用，
+# 返回 JSON 数组后分发给各自的规划；开启后不再流式提取
+EXTRACTION_BATCHING = False
+EXTRACTION_BATCH_WINDOW_S = 0.02
+EXTRACTION_BATCH_SIZE = 16
+
+EXTRACTION_CACHE = ExtractionCache(
+    max_size=EXTRACTION_CACHE_SIZE,
+    ttl_seconds=EXTRACTION_CACHE_TTL,
+    db_path=EXTRACTION_CACHE_DB
+)
+
+# 预订账本：只追加、按幂等键去重，BOOKING_LEDGER_DB 为 None 时只保存在内存中
+BOOKING_LEDGER_DB = None
+BOOKING_LEDGER = BookingLedger(BOOKING_LEDGER_DB)
+
+# 客房库存：每家酒店每晚的房间数，预订时按入住期间原子扣减
+ROOMS_PER_HOTEL = 20
+ROOM_INVENTORY = RoomInventory(ROOMS_PER_HOTEL)
+# 计数只在内存中，启动时按账本中已有的预订重新扣减（BOOKING_LEDGER_DB 落盘时重启后依然有效）
+ROOM_INVENTORY.restore(BOOKING_LEDGER.records())
+
+# ==================== 共享资源 ====================
+def configure(cache: Optional[ExtractionCache] = None, ledger: Optional[BookingLedger] = None,
+              room_inventory: Optional[RoomInventory] = None, *,
+              use_api: Optional[bool] = None, rule_only: Optional[bool] = None,
+              tiered_extraction: Optional[bool] = None, extraction_batching: Optional[bool] = None,
+              llm_clients: Optional[LLMClientManager] = None, llm_call_timeout_s: Optional[float] = None,
+              extraction_latency_budget_s: Optional[float] = None, llm_hedging: Optional[bool] = None):
+    """替换进程级共享的提取缓存、预订账本、客房库存与配置区域中的开关，参数为 None 的保持不变
+
+    节点每次调用时读取 travel_agent.EXTRACTION_CACHE 等模块变量，替换后立即生效；其他模块应通过
+    travel_agent.X 读取，from travel_agent import X 按值导入的名字仍指向旧对象。换了账本时，客房库存
+    （room_inventory，默认按当前容量新建）按新账本中已有的预订重新扣减。其余关键字参数对应配置区域
+    中同名的大写变量（如 rule_only 对应 RULE_ONLY）。
+    """
+    global EXTRACTION_CACHE, BOOKING_LEDGER, ROOM_INVENTORY
+    settings = {
+        "USE_API": use_api, "RULE_ONLY": rule_only, "TIERED_EXTRACTION": tiered_extraction,
+        "EXTRACTION_BATCHING": extraction_batching, "LLM_CLIENTS": llm_clients,
+        "LLM_CALL_TIMEOUT_S": llm_call_timeout_s, "EXTRACTION_LATENCY_BUDGET_S": extraction_latency_budget_s,
+        "LLM_HEDGING": llm_hedging,
+    }
+    globals().update({name: value for name, value in settings.items() if value is not None})
+    if cache is not None:
+        EXTRACTION_CACHE = cache
+    if ledger is not None:
+        BOOKING_LEDGER = ledger
+        if room_inventory is None:
+            room_inventory = RoomInventory(ROOM_INVENTORY.rooms_per_hotel, ROOM_INVENTORY.capacities)
+        room_inventory.restore(ledger.records())
+    if room_inventory is not None:
+        ROOM_INVENTORY = room_inventory
+
 # ==================== 状态定义 ====================
 class TravelPlanningState(TypedDict):
     """旅行规划的状态管理"""
@@ -21,272 +169,960 @@ class TravelPlanningState(TypedDict):
     guest_name: str
     destination: str
     travel_date: str
+    requested_travel_date: Optional[str]
     nights: int
     extracted_info: dict
     flights_result: Optional[dict]
+    flight_options: List[dict]
     hotels_result: List[dict]
     selected_hotel: Optional[dict]
+    hotel_alternatives: List[dict]
+    budget: Optional[float]
+    idempotency_key: Optional[str]
     booking_result: Optional[dict]
     current_step: str
     error_message: Optional[str]
     execution_log: List[str]
 
+def create_initial_state(user_input: str, budget: Optional[float] = None,
+                         idempotency_key: Optional[str] = None) -> TravelPlanningState:
+    """根据用户输入构造初始状态，budget 为整趟行程的酒店预算（可选），
+    idempotency_key 用于预订去重：同一个键重试只会预订一次（None 表示每次都是新预订）"""
+    return {
+        "user_input": user_input,
+        "guest_name": "", "destination": "", "travel_date": "", "requested_travel_date": None, "nights": 0,
+        "extracted_info": {}, "flights_result": None, "flight_options": [], "hotels_result": [],
+        "selected_hotel": None, "hotel_alternatives": [], "budget": budget,
+        "idempotency_key": idempotency_key,
+        "booking_result": None, "current_step": "start",
+        "error_message": None, "execution_log": []
+    }
+
+def llm_backend() -> str:
+    """当前使用的 LLM 后端"""
+    return "deepseek" if USE_API else "ollama"
+
 def get_llm():
-    """获取 LLM 实例"""
-    if USE_API:
-        print(f"🌐 使用 DeepSeek API")
-        return ChatOpenAI(
-            model="deepseek-chat",
-            api_key=DEEPSEEK_API_KEY,
-            base_url=DEEPSEEK_BASE_URL,
-            temperature=0.1
-        )
-    else:
-        from langchain_community.llms import Ollama
-        print(f"🖥️  使用本地 Ollama 模型")
-        return Ollama(model="deepseek-r1:1.5b", temperature=0.1)
+    """获取 LLM 实例（进程内复用）"""
+    return LLM_CLIENTS.get(llm_backend())
+
+def warm_up_llm(background: bool = False):
+    """预热 LLM 连接；仅规则模式下什么也不做，避免导入 LLM 客户端"""
+    if RULE_ONLY:
+        return None
+    if background:
+        return LLM_CLIENTS.warm_up_in_background(llm_backend())
+    return LLM_CLIENTS.warm_up(llm_backend())
 
 # ==================== 改进的模拟 API 函数 ====================
-def search_flights(destination: str, date: str) -> Optional[dict]:
-    """查询指定日期飞往某地的航班信息 - 改进版"""
+def _query_flight_options(destination: str, date: str) -> List[dict]:
+    try:
+        return FARE_ENGINE.search(destination, date)
+    except ValueError:
+        # 日期格式无法识别时按无航班处理
+        return []
+
+def search_flight_options(destination: str, date: str) -> List[dict]:
+    """查询指定日期飞往某地的全部航班（按起飞时间排列），信息提取阶段已提前查询时直接取结果"""
     print(f"🔍 正在查询 {date} 前往 {destination} 的航班...")
     
-    # 支持的目的地列表
-    supported_destinations = {
-        "北京": ["CA123", "MU456", "CZ789"],
-        "上海": ["MU123", "CA456", "HO789"], 
-        "广州": ["CZ123", "MU456", "CA789"],
-        "东京": ["JL123", "NH456", "CA789"],
-        "新加坡": ["SQ123", "CA456", "MU789"],
-        "深圳": ["ZH123", "CA456", "MU789"],
-        "杭州": ["CA123", "MU456", "JD789"],
-        "成都": ["CA123", "3U456", "MU789"]
-    }
-    
-    # 检查目的地是否支持
-    if destination not in supported_destinations:
-        return None
-    
-    # 为每个日期生成一致的随机结果（基于日期哈希）
-    random.seed(hash(date) % 1000)  # 确保同一天的结果一致
-    
-    # 80%的概率有航班，20%的概率无航班（模拟真实情况）
-    if random.random() < 0.2:
-        return None
-    
-    flight_number = random.choice(supported_destinations[destination])
-    base_prices = {
-        "北京": 1200, "上海": 1100, "广州": 1000, 
-        "东京": 3500, "新加坡": 3200, "深圳": 900,
-        "杭州": 800, "成都": 950
-    }
-    
-    # 价格波动 ±20%
-    base_price = base_prices.get(destination, 1500)
-    price_variation = random.randint(-200, 200)
-    price = base_price + price_variation
-    
-    # 随机起飞时间
-    departure_times = ["08:00", "10:30", "13:15", "16:45", "19:20", "22:00"]
-    departure_time = random.choice(departure_times)
+    prefetched = FLIGHT_PREFETCHER.take(destination, date)
+    if prefetched is not None:
+        print("⚡ 使用提前查询的航班结果")
+        return prefetched.result()
+    return _query_flight_options(destination, date)
+
+def cheapest_flight(flights: List[dict]) -> Optional[dict]:
+    """票价最低的航班，同价取起飞更早的"""
+    return min(flights, key=lambda flight: flight["price"]) if flights else None
+
+def search_flights(destination: str, date: str) -> Optional[dict]:
+    """查询指定日期飞往某地的航班信息，返回票价最低的一班"""
+    return cheapest_flight(search_flight_options(destination, date))
+
+def search_flexible_dates(destination: str, travel_date: str, days: int = FLEXIBLE_DATE_DAYS) -> List[dict]:
+    """在 travel_date 前后 days 天内一次性查找替代航班，按票价与日期接近程度排序"""
+    print(f"🔍 正在查询 {travel_date} 前后 {days} 天前往 {destination} 的航班...")
     
-    return {
-        "flight_number": flight_number,
-        "price": price,
-        "departure_time": departure_time,
-        "airline": flight_number[:2]
-    }
+    try:
+        return FARE_ENGINE.search_nearby(
+            destination, travel_date, days, FLEXIBLE_DATE_PENALTY,
+            earliest=datetime.now().strftime("%Y-%m-%d")
+        )
+    except ValueError:
+        return []
+
+def search_hotels(destination: str, check_in_date: str, check_out_date: str,
+                  booked_hotel: Optional[str] = None) -> List[dict]:
+    """根据地点和日期查询酒店 - 改进版：只返回入住期间每晚都有空房的酒店
 
-def search_hotels(destination: str, check_in_date: str, check_out_date: str) -> List[dict]:
-    """根据地点和日期查询酒店 - 改进版"""
+    booked_hotel 为该规划此前已订到的酒店（重试或重跑时）：它的房间已计入库存，满房也照常返回，
+    预订节点据此按幂等键返回原来的预订。
+    """
     print(f"🔍 正在查询 {destination} 从 {check_in_date} 到 {check_out_date} 的酒店...")
     
-    hotels_data = {
-        "北京": [
-            {"name": "北京王府井酒店", "price_per_night": 800, "available": True, "rating": 4.3},
-            {"name": "北京国贸大酒店", "price_per_night": 1200, "available": True, "rating": 4.5},
-            {"name": "北京华尔道夫酒店", "price_per_night": 1600, "available": True, "rating": 4.6}
-        ],
-        "上海": [
-            {"name": "上海外滩华尔道夫", "price_per_night": 1500, "available": True, "rating": 4.7},
-            {"name": "上海浦东香格里拉", "price_per_night": 1300, "available": True, "rating": 4.6},
-            {"name": "上海半岛酒店", "price_per_night": 2200, "available": True, "rating": 4.8}
-        ],
-        "广州": [
-            {"name": "广州白天鹅宾馆", "price_per_night": 900, "available": True, "rating": 4.4},
-            {"name": "广州四季酒店", "price_per_night": 1400, "available": True, "rating": 4.7},
-            {"name": "广州文华东方酒店", "price_per_night": 1600, "available": True, "rating": 4.6}
-        ],
-        "东京": [
-            {"name": "东京帝国酒店", "price_per_night": 2000, "available": True, "rating": 4.6},
-            {"name": "安缦东京", "price_per_night": 4500, "available": True, "rating": 4.9},
-            {"name": "东京柏悦酒店", "price_per_night": 2800, "available": True, "rating": 4.7}
-        ],
-        "新加坡": [
-            {"name": "滨海湾金沙酒店", "price_per_night": 2500, "available": True, "rating": 4.8},
-            {"name": "莱佛士酒店", "price_per_night": 3500, "available": True, "rating": 4.9},
-            {"name": "文华东方酒店", "price_per_night": 1800, "available": True, "rating": 4.7}
-        ],
-        "深圳": [
-            {"name": "深圳瑞吉酒店", "price_per_night": 1100, "available": True, "rating": 4.5},
-            {"name": "深圳君悦酒店", "price_per_night": 900, "available": True, "rating": 4.4},
-            {"name": "深圳四季酒店", "price_per_night": 1300, "available": True, "rating": 4.6}
-        ],
-        "杭州": [
-            {"name": "杭州西湖国宾馆", "price_per_night": 1200, "available": True, "rating": 4.6},
-            {"name": "杭州柏悦酒店", "price_per_night": 1400, "available": True, "rating": 4.7},
-            {"name": "杭州西子湖四季酒店", "price_per_night": 1600, "available": True, "rating": 4.8}
-        ],
-        "成都": [
-            {"name": "成都瑞吉酒店", "price_per_night": 1000, "available": True, "rating": 4.5},
-            {"name": "成都尼依格罗酒店", "price_per_night": 1100, "available": True, "rating": 4.6},
-            {"name": "成都华尔道夫酒店", "price_per_night": 1300, "available": True, "rating": 4.7}
-        ]
-    }
-    
-    return hotels_data.get(destination, [])
+    hotels = get_hotel_inventory(HOTEL_INVENTORY_PATH).query(destination)
+    try:
+        nights = (datetime.strptime(check_out_date, "%Y-%m-%d") - datetime.strptime(check_in_date, "%Y-%m-%d")).days
+    except ValueError:
+        return hotels
+    return [hotel for hotel in hotels
+            if hotel["name"] == booked_hotel or ROOM_INVENTORY.remaining(hotel["name"], check_in_date, nights) > 0]
 
-def book_flight_and_hotel(flight_number: str, hotel_name: str, guest_name: str) -> dict:
-    """预订机票和酒店"""
-    print(f"📦 正在为 {guest_name} 预订航班 {flight_number} 和酒店 {hotel_name}...")
-    import hashlib
-    booking_id = "BK" + flight_number + hashlib.md5(hotel_name.encode()).hexdigest()[:6].upper()
-    
+def _booking_record(flight_number: str, hotel_name: str, guest_name: str,
+                    check_in: Optional[str], nights: int) -> dict:
     return {
-        "status": "success", 
-        "booking_id": booking_id,
+        "status": "success",
         "flight_number": flight_number,
         "hotel_name": hotel_name,
         "guest_name": guest_name,
+        "check_in": check_in,
+        "nights": nights,
+        # 区分本次写入与并发重试先写入的记录，后者需要归还本次扣减的房间
+        "reservation_id": uuid.uuid4().hex,
         "message": "预订成功！请查收确认邮件。",
         "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
 
+def _sold_out_result(flight_number: str, hotel_name: str, guest_name: str) -> dict:
+    return {
+        "status": "sold_out",
+        "flight_number": flight_number,
+        "hotel_name": hotel_name,
+        "guest_name": guest_name,
+        "message": f"{hotel_name} 在入住期间已满房",
+    }
+
+def _reserve_rooms(hotel_name: str, check_in: Optional[str], nights: int) -> bool:
+    """扣减入住期间的客房；没有入住日期或晚数时不占用库存"""
+    if not check_in or nights <= 0:
+        return True
+    try:
+        return ROOM_INVENTORY.reserve(hotel_name, check_in, nights)
+    except ValueError:
+        return True
+
+def _settle_rooms(record: dict, result: Optional[dict]):
+    """账本没有采用本次写入（写入失败或并发重试已先写入）时归还扣减的房间"""
+    if record["check_in"] and record["nights"] > 0 and (result or {}).get("reservation_id") != record["reservation_id"]:
+        try:
+            ROOM_INVENTORY.release(record["hotel_name"], record["check_in"], record["nights"])
+        except ValueError:
+            pass
+
+def book_flight_and_hotel(flight_number: str, hotel_name: str, guest_name: str,
+                          idempotency_key: Optional[str] = None,
+                          check_in: Optional[str] = None, nights: int = 0) -> dict:
+    """预订机票和酒店：先原子扣减入住期间的客房，再写入预订账本
+
+    相同 idempotency_key 的重试返回第一次的预订且不再占用房间；满房时返回 status 为 sold_out。
+    """
+    print(f"📦 正在为 {guest_name} 预订航班 {flight_number} 和酒店 {hotel_name}...")
+    existing = BOOKING_LEDGER.find(idempotency_key) if idempotency_key else None
+    if existing is not None:
+        return existing
+    if not _reserve_rooms(hotel_name, check_in, nights):
+        return _sold_out_result(flight_number, hotel_name, guest_name)
+
+    record, result = _booking_record(flight_number, hotel_name, guest_name, check_in, nights), None
+    try:
+        result = BOOKING_LEDGER.append(record, idempotency_key)
+        return result
+    finally:
+        _settle_rooms(record, result)
+
+async def asearch_flight_options(destination: str, date: str) -> List[dict]:
+    """search_flight_options 的异步版本，接入真实供应商时在此处 await 网络请求"""
+    prefetched = FLIGHT_PREFETCHER.take(destination, date)
+    if prefetched is not None:
+        print(f"⚡ 使用提前查询的 {date} 前往 {destination} 的航班结果")
+        return await asyncio.wrap_future(prefetched)
+    return search_flight_options(destination, date)
+
+# ==================== 航班预取 ====================
+class FlightPrefetcher:
+    """在后台提前查询航班
+
+    流式提取一解析出目的地和日期就开始查询，与 LLM 继续生成其余字段并行；查询节点
+    按 (目的地, 日期) 取走结果。最终提取结果与预取的键不同时不会被使用，超过上限的
+    旧结果按先进先出丢弃。
+    """
+
+    def __init__(self, workers: int = FLIGHT_PREFETCH_WORKERS, max_pending: int = 256):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.started = 0
+        self.hits = 0
+        self._pending: "OrderedDict[tuple, Future]" = OrderedDict()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self, destination: str, travel_date: str) -> bool:
+        """开始预取，目的地不支持、日期无效或已在预取时返回 False"""
+        if not isinstance(destination, str) or not FARE_ENGINE.supports(destination):
+            return False
+        try:
+            datetime.strptime(travel_date, "%Y-%m-%d")
+        except (TypeError, ValueError):
+            return False
+        
+        key = (destination, travel_date)
+        with self._lock:
+            if key in self._pending:
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="flight-prefetch")
+            self._pending[key] = self._executor.submit(_query_flight_options, destination, travel_date)
+            while len(self._pending) > self.max_pending:
+                self._pending.popitem(last=False)
+            self.started += 1
+        print(f"🛫 已提前查询 {travel_date} 前往 {destination} 的航班")
+        return True
+
+    def take(self, destination: str, travel_date: str) -> Optional[Future]:
+        """取走预取结果的 Future，没有时返回 None"""
+        with self._lock:
+            future = self._pending.pop((destination, travel_date), None)
+            if future is not None:
+                self.hits += 1
+            return future
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"started": self.started, "hits": self.hits, "pending": len(self._pending)}
+
+FLIGHT_PREFETCHER = FlightPrefetcher()
+
+class _ExtractionStream:
+    """累积 LLM 的流式输出；目的地与日期都确定后提前查询一次航班"""
+
+    def __init__(self, known: Optional[dict] = None):
+        self.parser = IncrementalJSONParser()
+        self.parts: List[str] = []
+        self.known = dict(known or {})
+        self.prefetched = False
+        self._maybe_prefetch()
+
+    def feed(self, chunk: str) -> bool:
+        """追加一段输出，JSON 对象已完整时返回 True"""
+        self.parts.append(chunk)
+        self.known.update(self.parser.feed(chunk))
+        self._maybe_prefetch()
+        return self.parser.complete
+
+    def _maybe_prefetch(self):
+        if not self.prefetched and self.known.get("destination") and self.known.get("travel_date"):
+            self.prefetched = True
+            FLIGHT_PREFETCHER.start(self.known["destination"], self.known["travel_date"])
+
+    @property
+    def content(self) -> str:
+        return "".join(self.parts)
+
+def stream_llm_extraction(prompt, known: Optional[dict] = None, on_slot: Optional[Callable[[], None]] = None) -> str:
+    """流式调用 LLM 并返回 JSON 对象部分的输出
+
+    known 为调用前已确定的字段（如规则已明确的目的地），与流中解析出的字段一起决定何时预取航班。
+    JSON 对象结束后仍读完流——JSON 模式下之后只剩结束标记和 token 用量，读完才能记录用量。
+    """
+    extraction, complete = _ExtractionStream(known), False
+    with contextlib.closing(LLM_CLIENTS.stream(prompt, llm_backend(), on_slot)) as chunks:
+        for chunk in chunks:
+            if not complete:
+                complete = extraction.feed(chunk)
+    return extraction.content
+
+async def astream_llm_extraction(prompt, known: Optional[dict] = None,
+                                 on_slot: Optional[Callable[[], None]] = None) -> str:
+    """stream_llm_extraction 的异步版本"""
+    extraction, complete = _ExtractionStream(known), False
+    chunks = LLM_CLIENTS.astream(prompt, llm_backend(), on_slot)
+    try:
+        async for chunk in chunks:
+            if not complete:
+                complete = extraction.feed(chunk)
+    finally:
+        await chunks.aclose()
+    return extraction.content
+
+async def asearch_flights(destination: str, date: str) -> Optional[dict]:
+    """search_flights 的异步版本"""
+    return cheapest_flight(await asearch_flight_options(destination, date))
+
+async def asearch_hotels(destination: str, check_in_date: str, check_out_date: str,
+                         booked_hotel: Optional[str] = None) -> List[dict]:
+    """search_hotels 的异步版本"""
+    return search_hotels(destination, check_in_date, check_out_date, booked_hotel)
+
+async def abook_flight_and_hotel(flight_number: str, hotel_name: str, guest_name: str,
+                                 idempotency_key: Optional[str] = None,
+                                 check_in: Optional[str] = None, nights: int = 0) -> dict:
+    """book_flight_and_hotel 的异步版本，等待账本落盘时不阻塞事件循环"""
+    print(f"📦 正在为 {guest_name} 预订航班 {flight_number} 和酒店 {hotel_name}...")
+    existing = BOOKING_LEDGER.find(idempotency_key) if idempotency_key else None
+    if existing is not None:
+        return existing
+    if not _reserve_rooms(hotel_name, check_in, nights):
+        return _sold_out_result(flight_number, hotel_name, guest_name)
+
+    record = _booking_record(flight_number, hotel_name, guest_name, check_in, nights)
+    future = BOOKING_LEDGER.submit(record, idempotency_key)
+    # 按写入的最终结果归还房间：等待方被取消时写入照常完成，已落盘的预订保留房间
+    future.add_done_callback(
+        lambda done: _settle_rooms(record, None if done.cancelled() or done.exception() else done.result())
+    )
+    return await asyncio.shield(asyncio.wrap_future(future))
+
 # ==================== 改进的信息提取 ====================
+# 固定的系统提示词放在最前面，每次请求完全相同，可命中 DeepSeek 的前缀缓存；
+# 今天的日期、用户输入等可变内容全部放在最后的用户消息里
+EXTRACTION_SYSTEM_PROMPT = """你是旅行规划助手，负责从用户输入中提取预订信息，只输出一个 JSON 对象（json），不要输出其他内容。
+
+JSON 格式（字段均为必填，类型必须一致）：
+{"destination": string, "travel_date": string, "nights": integer, "guest_name": string}
+
+字段说明：
+- destination：目的地城市名，如：北京、上海、广州、东京、新加坡、深圳、杭州、成都
+- travel_date：出发日期，格式必须为 YYYY-MM-DD；根据用户消息中的"今天"计算相对日期，用户没有指定日期时使用今天
+- nights：入住晚数，1 到 90 之间的整数
+- guest_name：客人姓名，中文姓名，不要包含标点
+
+如果用户消息要求只提取部分字段，JSON 中只包含这些字段。"""
+
+def build_extraction_messages(user_input: str, today: str, fields: Optional[List[str]] = None) -> list:
+    """构造信息提取消息：固定的系统提示词在前，日期、用户输入与需要的字段在后"""
+    user_message = f'今天是 {today}\n用户输入: "{user_input}"'
+    if fields:
+        user_message += "\n请只提取以下字段：" + ", ".join(fields)
+    return [("system", EXTRACTION_SYSTEM_PROMPT), ("user", user_message)]
+
+MAX_NIGHTS = 90
+
+def _valid_field(field: str, value) -> bool:
+    if field in ("destination", "guest_name"):
+        return isinstance(value, str) and bool(value.strip())
+    if field == "travel_date":
+        try:
+            return isinstance(value, str) and datetime.strptime(value, "%Y-%m-%d") is not None
+        except ValueError:
+            return False
+    if field == "nights":
+        return isinstance(value, int) and not isinstance(value, bool) and 1 <= value <= MAX_NIGHTS
+    return False
+
+def _load_json_object(content: str):
+    """取出回复中第一个 { 到最后一个 } 之间的 JSON，无法解析时返回 None"""
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(content[start:end + 1])
+    except json.JSONDecodeError as e:
+        print(f"JSON 解析失败: {e}")
+        return None
+
+def _validated_fields(parsed, fields: Optional[List[str]] = None) -> dict:
+    """只保留 fields 中类型与格式都正确的字段，并记录解析结果 ok（全部有效）/ partial / invalid"""
+    fields = fields or EXTRACTION_FIELDS
+    extracted_info = {}
+    if isinstance(parsed, dict):
+        extracted_info = {field: parsed[field] for field in fields if _valid_field(field, parsed.get(field))}
+    if len(extracted_info) == len(fields):
+        outcome = "ok"
+    else:
+        outcome = "partial" if extracted_info else "invalid"
+    METRICS.increment("travel_agent_extraction_parse_total", outcome=outcome)
+    return extracted_info
+
+def parse_extraction_response(content: str, fields: Optional[List[str]] = None) -> dict:
+    """严格解析 LLM 返回的 JSON 对象，只保留 fields 中类型与格式都正确的字段
+
+    不再为缺失或格式错误的字段填默认值；每次解析按结果记录 ok（全部有效）/ partial / invalid。
+    """
+    return _validated_fields(_load_json_object(content), fields)
+
+def _merge_llm_extraction(user_input: str, today: str, llm_info: dict) -> dict:
+    """LLM 字段齐全时直接使用并写入缓存；缺失或无效的字段由规则提取补齐"""
+    if len(llm_info) == len(EXTRACTION_FIELDS):
+        EXTRACTION_CACHE.set(user_input, today, llm_info)
+        return llm_info
+    extracted_info = extract_info_simple(user_input)
+    extracted_info.update(llm_info)
+    return extracted_info
+
+def request_llm_fields(user_input: str, today: str, fields: Optional[List[str]] = None,
+                       known: Optional[dict] = None, on_start: Optional[Callable[[float], None]] = None) -> dict:
+    """请 LLM 提取 fields（默认全部字段），返回通过校验的字段；开启微批时与并发的请求合并为一次调用
+
+    on_start 在 LLM 调用拿到在途名额、真正开始时以这次调用的超时秒数回调。
+    """
+    if EXTRACTION_BATCHING:
+        return EXTRACTION_BATCHER.call((user_input, today, fields, on_start))
+    
+    prompt = build_extraction_messages(user_input, today, fields)
+    on_slot = (lambda: on_start(LLM_CALL_TIMEOUT_S)) if on_start is not None else None
+    if STREAMING_EXTRACTION:
+        content = stream_llm_extraction(prompt, known, on_slot)
+    else:
+        content = LLM_CLIENTS.invoke(prompt, llm_backend(), on_slot=on_slot).content
+    print(f"🤖 DeepSeek 解析结果: {content}")
+    return parse_extraction_response(content, fields)
+
+async def arequest_llm_fields(user_input: str, today: str, fields: Optional[List[str]] = None,
+                              known: Optional[dict] = None, on_start: Optional[Callable[[float], None]] = None) -> dict:
+    """request_llm_fields 的异步版本"""
+    if EXTRACTION_BATCHING:
+        return await EXTRACTION_BATCHER.acall((user_input, today, fields, on_start))
+    
+    prompt = build_extraction_messages(user_input, today, fields)
+    on_slot = (lambda: on_start(LLM_CALL_TIMEOUT_S)) if on_start is not None else None
+    if STREAMING_EXTRACTION:
+        content = await astream_llm_extraction(prompt, known, on_slot)
+    else:
+        content = (await LLM_CLIENTS.ainvoke(prompt, llm_backend(), on_slot=on_slot)).content
+    print(f"🤖 DeepSeek 解析结果: {content}")
+    return parse_extraction_response(content, fields)
+
 def extract_info_with_llm(user_input: str) -> dict:
     """使用 DeepSeek API 提取信息 - 改进版"""
+    # 获取当前日期作为参考
+    today = datetime.now().strftime("%Y-%m-%d")
+    
+    cached_info = EXTRACTION_CACHE.get(user_input, today)
+    if cached_info:
+        print(f"⚡ 命中提取缓存: {cached_info}")
+        return cached_info
+    
     try:
-        llm = get_llm()
-        
-        # 获取当前日期作为参考
-        today = datetime.now().strftime("%Y-%m-%d")
-        
-        prompt = f"""
-        请从以下用户输入中精确提取旅行规划的关键信息：
-        
-        用户输入: "{user_input}"
-        
-        今天是 {today}，请根据这个参考日期计算相对日期。
+        return _merge_llm_extraction(user_input, today, guarded_llm_fields(user_input, today))
         
-        请提取以下信息：
-        1. 目的地 (destination) - 如：北京、上海、广州、东京、新加坡、深圳、杭州、成都等
-        2. 旅行日期 (travel_date) - 格式必须为：YYYY-MM-DD
-        3. 入住晚数 (nights) - 数字
-        4. 客人姓名 (guest_name) - 中文姓名
-        
-        重要：如果用户没有指定具体日期，请使用 {today} 作为默认日期。
-        
-        请严格按照以下JSON格式返回，不要添加任何其他内容：
-        {{
-            "destination": "提取到的目的地",
-            "travel_date": "计算后的具体日期", 
-            "nights": 入住晚数,
-            "guest_name": "提取到的姓名"
-        }}
-        """
-        
-        response = llm.invoke(prompt)
-        print(f"🤖 DeepSeek 解析结果: {response.content}")
-        
-        # 尝试解析 JSON 响应
-        try:
-            json_match = re.search(r'\{[^}]+\}', response.content)
-            if json_match:
-                extracted_info = json.loads(json_match.group())
-                
-                # 验证必要字段并设置默认值
-                required_fields = ["destination", "travel_date", "nights", "guest_name"]
-                for field in required_fields:
-                    if field not in extracted_info:
-                        if field == "nights":
-                            extracted_info[field] = 2
-                        elif field == "travel_date":
-                            extracted_info[field] = today
-                        elif field == "destination":
-                            extracted_info[field] = "北京"
-                        elif field == "guest_name":
-                            extracted_info[field] = "游客"
-                
-                return extracted_info
-        except json.JSONDecodeError as e:
-            print(f"JSON 解析失败: {e}")
-        
-        # 如果解析失败，使用简单规则
+    except LLMUnavailable as e:
+        print(f"⚠️  LLM 暂不可用（{e}），使用规则提取")
+        return extract_info_simple(user_input)
+    except Exception as e:
+        print(f"DeepSeek API 调用失败: {e}")
         return extract_info_simple(user_input)
+
+async def aextract_info_with_llm(user_input: str) -> dict:
+    """extract_info_with_llm 的异步版本"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    
+    cached_info = EXTRACTION_CACHE.get(user_input, today)
+    if cached_info:
+        print(f"⚡ 命中提取缓存: {cached_info}")
+        return cached_info
+    
+    try:
+        return _merge_llm_extraction(user_input, today, await aguarded_llm_fields(user_input, today))
         
+    except LLMUnavailable as e:
+        print(f"⚠️  LLM 暂不可用（{e}），使用规则提取")
+        return extract_info_simple(user_input)
     except Exception as e:
         print(f"DeepSeek API 调用失败: {e}")
         return extract_info_simple(user_input)
 
 def extract_info_simple(user_input: str) -> dict:
     """简化版信息提取 - 改进版"""
-    # 获取当前日期作为默认
-    today = datetime.now()
+    extracted_info, _ = extract_info_rules(user_input)
+    return extracted_info
+
+# ==================== 微批信息提取 ====================
+# 批量提示词同样是固定前缀，可命中上下文缓存；JSON 模式只允许顶层为对象，数组放在 results 中
+BATCH_EXTRACTION_SYSTEM_PROMPT = EXTRACTION_SYSTEM_PROMPT + """
+
+用户消息包含多条编号的请求（每行一条），请返回 {"results": [...]}：results 按编号顺序为每条请求
+给出一个上述格式的对象，数组长度必须与请求条数相同。"""
+
+def build_batch_extraction_messages(requests: List[tuple], today: str) -> list:
+    """构造批量提取消息，requests 为 [(用户输入, 需要的字段或 None), ...]"""
+    lines = [f"今天是 {today}"]
+    for i, (user_input, fields) in enumerate(requests, 1):
+        line = f'{i}. 用户输入: "{user_input}"'
+        if fields:
+            line += " 请只提取以下字段：" + ", ".join(fields)
+        lines.append(line)
+    return [("system", BATCH_EXTRACTION_SYSTEM_PROMPT), ("user", "\n".join(lines))]
+
+def parse_batch_extraction_response(content: str, fields_list: List[Optional[List[str]]]) -> List[dict]:
+    """解析 {"results": [...]}，逐条校验；缺失或格式错误的条目返回空字典"""
+    parsed = _load_json_object(content)
+    results = parsed.get("results") if isinstance(parsed, dict) else None
+    if not isinstance(results, list):
+        results = []
+    return [
+        _validated_fields(results[i] if i < len(results) else None, fields)
+        for i, fields in enumerate(fields_list)
+    ]
+
+def batch_call_timeout(size: int) -> float:
+    """合并 size 条请求的一次 LLM 调用的超时：输出 token 随条数增长，超时也随之放宽"""
+    return LLM_CALL_TIMEOUT_S + max(size - 1, 0) * LLM_BATCH_TIMEOUT_PER_ITEM_S
+
+def _extract_batch(items: List[tuple]) -> List[dict]:
+    """微批处理函数：items 为 [(用户输入, 今天, 字段, on_start), ...]，同一天的请求合并为一次 LLM 调用
+
+    熔断器按批记录：一次批量调用失败只算一次失败，而不是批内每条请求各算一次。某一天的调用失败时
+    只有这一组请求得到该异常（以异常实例作为结果返回），其他日期的请求不受影响。
+    """
+    results: List[object] = [{} for _ in items]
+    groups: Dict[str, List[int]] = {}
+    for i, (_, today, _, _) in enumerate(items):
+        groups.setdefault(today, []).append(i)
+    
+    for today, indexes in groups.items():
+        requests = [(items[i][0], items[i][2]) for i in indexes]
+        timeout = batch_call_timeout(len(requests))
+        callbacks = [items[i][3] for i in indexes if items[i][3] is not None]
+        try:
+            content = LLM_CLIENTS.invoke(
+                build_batch_extraction_messages(requests, today), llm_backend(), timeout=timeout,
+                on_slot=lambda: [on_start(timeout) for on_start in callbacks]
+            ).content
+        except Exception as e:
+            CIRCUIT_BREAKER.record_failure()
+            for i in indexes:
+                results[i] = e
+            continue
+        CIRCUIT_BREAKER.record_success()
+        print(f"🤖 DeepSeek 批量解析 {len(requests)} 条: {content}")
+        for i, llm_info in zip(indexes, parse_batch_extraction_response(content, [fields for _, fields in requests])):
+            results[i] = llm_info
+    return results
+
+EXTRACTION_BATCHER = MicroBatcher(
+    _extract_batch,
+    max_batch=EXTRACTION_BATCH_SIZE,
+    window_s=EXTRACTION_BATCH_WINDOW_S,
+    max_concurrent_batches=LLM_MAX_IN_FLIGHT,
+    name="extraction-batcher"
+)
+
+# ==================== LLM 调用保护 ====================
+# 信息提取的 LLM 调用都经过这里：熔断打开时直接放弃；每次调用从拿到在途名额起计算超时，整次提取（含本地排队）
+# 有延迟预算；可选地在第一次调用超过 p95 耗时后发出对冲请求。放弃时抛出 LLMUnavailable，调用方回退到规则提取。
+# 只有 LLM 本身的超时和出错计入熔断，本地排队耗尽预算不算 API 故障
+class LLMUnavailable(Exception):
+    """LLM 暂不可用（熔断打开、超时、调用失败或排队超出延迟预算）"""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+
+class _LLMAttempt:
+    """一次 LLM 调用尝试；start 由 LLM 客户端在拿到在途名额时回调，此后才开始计算超时"""
+
+    def __init__(self):
+        self.future = None
+        self.started_at: Optional[float] = None
+        self.deadline: Optional[float] = None
+
+    def start(self, timeout_s: float):
+        now = time.monotonic()
+        self.deadline = now + timeout_s
+        self.started_at = now
+
+# 同步调用在线程中执行，调用方才能按超时放弃等待
+LLM_CALL_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-call")
+
+def _admit_llm_call():
+    if not CIRCUIT_BREAKER.allow():
+        METRICS.increment("travel_agent_llm_fallback_total", reason="circuit_open")
+        raise LLMUnavailable("circuit_open")
+
+def _hedge_delay() -> Optional[float]:
+    """发出对冲请求前等待的秒数；未开启对冲或开启微批（对冲会让整批重复）时返回 None"""
+    if not LLM_HEDGING or EXTRACTION_BATCHING:
+        return None
+    observed = METRICS.llm_quantile(llm_backend(), LLM_HEDGE_QUANTILE, LLM_HEDGE_MIN_SAMPLES)
+    return observed if observed is not None else LLM_HEDGE_DEFAULT_DELAY_S
+
+def _hedge_at(first: _LLMAttempt, hedge: Optional[_LLMAttempt], delay: Optional[float],
+              deadline: float) -> Optional[float]:
+    """发出对冲请求的时刻：第一次调用拿到名额后再过 delay 秒
+
+    已对冲、尚未开始，或对冲请求在延迟预算内等不到自己的超时（delay + LLM_CALL_TIMEOUT_S 超出
+    剩余预算）时返回 None——这样的对冲只会把超时拖成预算耗尽，让熔断器看不到失败。
+    """
+    if delay is None or hedge is not None or first.started_at is None:
+        return None
+    hedge_at = first.started_at + delay
+    return hedge_at if hedge_at + LLM_CALL_TIMEOUT_S <= deadline else None
+
+def _next_wake(deadline: float, attempts, hedge_at: Optional[float]) -> float:
+    """下一次需要检查的时刻；还在排队的调用何时拿到名额无法预知，按 LLM_QUEUE_POLL_S 轮询"""
+    now = time.monotonic()
+    times = [deadline] + [attempt.deadline if attempt.deadline is not None else now + LLM_QUEUE_POLL_S
+                          for attempt in attempts]
+    if hedge_at is not None:
+        times.append(hedge_at)
+    return min(times)
+
+def _expired(pending: dict) -> list:
+    """移出已超过各自超时的调用并返回它们"""
+    now = time.monotonic()
+    expired = [future for future, attempt in pending.items()
+               if attempt.deadline is not None and now >= attempt.deadline]
+    for future in expired:
+        del pending[future]
+    return expired
+
+def _give_up(attempts: list, pending: dict, error: Optional[BaseException], batched: bool) -> LLMUnavailable:
+    """确定放弃原因、记录熔断与回退指标，返回要抛出的异常
+
+    有调用（第一次或对冲）已经运行超过 LLM_CALL_TIMEOUT_S 时记为 timeout；还有调用未结束、且都
+    没有跑满超时，说明延迟预算耗在本地排队上，记为 budget，不计入熔断；其余为 error（调用失败）
+    或 timeout。微批的失败已由 _extract_batch 按批记录。
+    """
+    now = time.monotonic()
+    timed_out = any(attempt is not None and attempt.deadline is not None and now >= attempt.deadline
+                    for attempt in attempts)
+    if pending and not timed_out:
+        reason, error = "budget", None
+    else:
+        reason = "error" if error is not None and not pending else "timeout"
+        if not batched:
+            CIRCUIT_BREAKER.record_failure()
+    METRICS.increment("travel_agent_llm_fallback_total", reason=reason)
+    return LLMUnavailable(reason, str(error) if error is not None else "")
+
+def _succeed(result: dict, hedged: bool, batched: bool) -> dict:
+    if not batched:
+        CIRCUIT_BREAKER.record_success()
+    if hedged:
+        METRICS.increment("travel_agent_llm_hedges_total", result="won")
+    return result
+
+def guarded_llm_fields(user_input: str, today: str, fields: Optional[List[str]] = None,
+                       known: Optional[dict] = None) -> dict:
+    """带超时、延迟预算、熔断与对冲的 request_llm_fields"""
+    _admit_llm_call()
+    batched, delay = EXTRACTION_BATCHING, _hedge_delay()
+    deadline = time.monotonic() + EXTRACTION_LATENCY_BUDGET_S
+
+    def launch() -> _LLMAttempt:
+        attempt = _LLMAttempt()
+        attempt.future = LLM_CALL_EXECUTOR.submit(request_llm_fields, user_input, today, fields, known, attempt.start)
+        pending[attempt.future] = attempt
+        return attempt
+
+    pending: Dict[Future, _LLMAttempt] = {}
+    first, hedge, error = launch(), None, None
+    
+    while pending:
+        wake = _next_wake(deadline, pending.values(), _hedge_at(first, hedge, delay, deadline))
+        done, _ = wait(list(pending), timeout=max(wake - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        for future in done:
+            attempt = pending.pop(future)
+            if future.exception() is None:
+                return _succeed(future.result(), attempt is hedge, batched)
+            error = future.exception()
+        
+        if time.monotonic() >= deadline:
+            break
+        # 超时的调用继续在线程中执行完，结果被丢弃
+        _expired(pending)
+        hedge_at = _hedge_at(first, hedge, delay, deadline)
+        if hedge_at is not None and time.monotonic() >= hedge_at and pending:
+            METRICS.increment("travel_agent_llm_hedges_total", result="launched")
+            hedge = launch()
+    
+    raise _give_up([first, hedge], pending, error, batched)
+
+async def aguarded_llm_fields(user_input: str, today: str, fields: Optional[List[str]] = None,
+                              known: Optional[dict] = None) -> dict:
+    """guarded_llm_fields 的异步版本，超时或落后的调用会被取消"""
+    _admit_llm_call()
+    batched, delay = EXTRACTION_BATCHING, _hedge_delay()
+    deadline = time.monotonic() + EXTRACTION_LATENCY_BUDGET_S
+
+    def launch() -> _LLMAttempt:
+        attempt = _LLMAttempt()
+        attempt.future = asyncio.ensure_future(arequest_llm_fields(user_input, today, fields, known, attempt.start))
+        pending[attempt.future] = attempt
+        return attempt
+
+    pending: Dict[asyncio.Future, _LLMAttempt] = {}
+    first, hedge, error = launch(), None, None
+    
+    try:
+        while pending:
+            wake = _next_wake(deadline, pending.values(), _hedge_at(first, hedge, delay, deadline))
+            done, _ = await asyncio.wait(list(pending), timeout=max(wake - time.monotonic(), 0),
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                attempt = pending.pop(future)
+                if future.exception() is None:
+                    return _succeed(future.result(), attempt is hedge, batched)
+                error = future.exception()
+            
+            if time.monotonic() >= deadline:
+                break
+            for future in _expired(pending):
+                future.cancel()
+            hedge_at = _hedge_at(first, hedge, delay, deadline)
+            if hedge_at is not None and time.monotonic() >= hedge_at and pending:
+                METRICS.increment("travel_agent_llm_hedges_total", result="launched")
+                hedge = launch()
+        
+        raise _give_up([first, hedge], pending, error, batched)
+    finally:
+        for future in pending:
+            future.cancel()
+
+def llm_resilience_report() -> dict:
+    """熔断器状态、回退到规则提取的次数（按原因）与对冲请求次数"""
+    return {
+        "circuit": CIRCUIT_BREAKER.stats(),
+        "fallbacks": {reason: int(count) for reason, count in
+                      METRICS.counter_values("travel_agent_llm_fallback_total", "reason").items()},
+        "hedges": {result: int(count) for result, count in
+                   METRICS.counter_values("travel_agent_llm_hedges_total", "result").items()},
+    }
+
+METRICS.register_collected(
+    "travel_agent_llm_circuit_state", "LLM 熔断器状态（当前所处状态为 1）",
+    lambda: {label_set(state=state): int(CIRCUIT_BREAKER.state == state) for state in CircuitBreaker.STATES}
+)
+
+# ==================== 分级信息提取 ====================
+# 规则引擎先提取并为每个字段打分，只有低于阈值的字段才交给 LLM
+SUPPORTED_DESTINATIONS = ["北京", "上海", "广州", "东京", "新加坡", "深圳", "杭州", "成都"]
+
+# 预编译的单遍解析器：目的地、相对日期、中文数字晚数、姓名
+TEXT_PARSER = TravelTextParser(SUPPORTED_DESTINATIONS, MAX_NIGHTS)
+
+CONFIDENCE_THRESHOLD = 0.6
+EXPLICIT_CONFIDENCE = 1.0      # 规则明确命中
+DEFAULT_CONFIDENCE = 0.8       # 用户未提及，使用默认值
+AMBIGUOUS_CONFIDENCE = 0.5     # 命中但边界不清
+UNRESOLVED_CONFIDENCE = 0.0    # 有线索但规则无法解析
+
+EXTRACTION_FIELDS = ["destination", "travel_date", "nights", "guest_name"]
+
+def extract_info_rules(user_input: str, today: Optional[datetime] = None) -> tuple:
+    """规则提取，返回 (提取结果, 每个字段的置信度)"""
+    today = today or datetime.now()
     
     extracted_info = {
         "destination": "北京",
-        "travel_date": today.strftime("%Y-%m-%d"),  # 使用当前日期
+        "travel_date": today.strftime("%Y-%m-%d"),
         "nights": 2,
         "guest_name": "游客"
     }
+    confidence = {field: DEFAULT_CONFIDENCE for field in EXTRACTION_FIELDS}
     
-    # 目的地提取
-    destinations = ["北京", "上海", "广州", "东京", "Singapore", "深圳", "杭州", "成都"]
-    for dest in destinations:
-        if dest in user_input:
-            extracted_info["destination"] = dest
-            break
+    parsed = TEXT_PARSER.parse(user_input, today.date())
     
-    # 晚数提取
-    night_patterns = {
-        "一晚": 1, "1晚": 1, "一天": 1, "1天": 1,
-        "两晚": 2, "2晚": 2, "两天": 2, "2天": 2, 
-        "三晚": 3, "3晚": 3, "三天": 3, "3天": 3,
-        "四晚": 4, "4晚": 4, "四天": 4, "4天": 4,
-        "五晚": 5, "5晚": 5, "五天": 5, "5天": 5
-    }
+    # 目的地：没有命中支持的城市时交给 LLM，避免把“巴黎”误当成默认的北京
+    if parsed["destination"]:
+        extracted_info["destination"] = parsed["destination"]
+        confidence["destination"] = EXPLICIT_CONFIDENCE
+    else:
+        confidence["destination"] = UNRESOLVED_CONFIDENCE
     
-    for pattern, nights in night_patterns.items():
-        if pattern in user_input:
-            extracted_info["nights"] = nights
-            break
+    # 日期、晚数：出现了线索却没解析出来，说明规则没看懂
+    if parsed["travel_date"]:
+        extracted_info["travel_date"] = parsed["travel_date"]
+        confidence["travel_date"] = EXPLICIT_CONFIDENCE
+    elif parsed["date_hint"]:
+        confidence["travel_date"] = UNRESOLVED_CONFIDENCE
     
-    # 姓名提取 - 改进版
-    name_patterns = [
-        r'名字是(\S{2,4})', r'我叫(\S{2,4})', r'姓名(\S{2,4})',
-        r'我是(\S{2,4})', r'称我为(\S{2,4})'
-    ]
+    if parsed["nights"]:
+        extracted_info["nights"] = parsed["nights"]
+        confidence["nights"] = EXPLICIT_CONFIDENCE
+    elif parsed["nights_hint"]:
+        confidence["nights"] = UNRESOLVED_CONFIDENCE
     
-    for pattern in name_patterns:
-        match = re.search(pattern, user_input)
-        if match:
-            name = match.group(1)
-            if name and len(name) >= 2:
-                extracted_info["guest_name"] = name
-                break
+    # 姓名：后面紧跟标点/空白/结尾才算完整匹配
+    if parsed["guest_name"]:
+        extracted_info["guest_name"] = parsed["guest_name"]
+        confidence["guest_name"] = EXPLICIT_CONFIDENCE if parsed["name_bounded"] else AMBIGUOUS_CONFIDENCE
+    elif parsed["name_hint"]:
+        confidence["guest_name"] = UNRESOLVED_CONFIDENCE
     
+    return extracted_info, confidence
+
+class ExtractionTierStats:
+    """统计每一级提取器回答请求的次数"""
+
+    TIERS = ["cache", "rules", "llm", "fallback"]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.tiers = {tier: 0 for tier in self.TIERS}
+            self.llm_fields = {field: 0 for field in EXTRACTION_FIELDS}
+
+    def record(self, tier: str, llm_fields: Optional[List[str]] = None):
+        with self._lock:
+            self.tiers[tier] += 1
+            for field in llm_fields or []:
+                self.llm_fields[field] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = sum(self.tiers.values())
+            return {
+                "total": total,
+                "tiers": dict(self.tiers),
+                "rates": {tier: round(count / total, 4) if total else 0.0 for tier, count in self.tiers.items()},
+                "llm_fields": dict(self.llm_fields),
+            }
+
+EXTRACTION_TIER_STATS = ExtractionTierStats()
+
+METRICS.register_collected(
+    "travel_agent_extraction_cache_lookups_total", "信息提取缓存查询次数",
+    lambda: {
+        label_set(result="hit"): EXTRACTION_CACHE.stats()["hits"],
+        label_set(result="miss"): EXTRACTION_CACHE.stats()["misses"],
+    },
+    kind="counter"
+)
+METRICS.register_collected(
+    "travel_agent_flight_prefetch_total", "流式提取期间提前查询航班的次数（started）与被查询节点使用的次数（hits）",
+    lambda: {label_set(result=result): FLIGHT_PREFETCHER.stats()[result] for result in ("started", "hits")},
+    kind="counter"
+)
+METRICS.register_collected(
+    "travel_agent_extraction_batches_total", "微批提取成功处理的批数（batches）、请求数（items）与失败的批数（failures）",
+    lambda: {label_set(kind=kind): EXTRACTION_BATCHER.stats()[kind] for kind in ("batches", "items", "failures")},
+    kind="counter"
+)
+METRICS.register_collected(
+    "travel_agent_extraction_tier_total", "各级提取器回答的请求数",
+    lambda: {label_set(tier=tier): count for tier, count in EXTRACTION_TIER_STATS.snapshot()["tiers"].items()},
+    kind="counter"
+)
+
+def llm_usage_report() -> dict:
+    """LLM token 用量与提取结果解析情况：提示词 / 命中缓存的 token、缓存命中率、解析失败率"""
+    tokens = METRICS.counter_values("travel_agent_llm_tokens_total", "kind")
+    parses = METRICS.counter_values("travel_agent_extraction_parse_total", "outcome")
+    prompt, cached = int(tokens.get("prompt", 0)), int(tokens.get("cached", 0))
+    parsed = int(sum(parses.values()))
+    return {
+        "prompt_tokens": prompt,
+        "cached_tokens": cached,
+        "completion_tokens": int(tokens.get("completion", 0)),
+        "cache_hit_rate": round(cached / prompt, 4) if prompt else 0.0,
+        "parses": {outcome: int(parses.get(outcome, 0)) for outcome in ("ok", "partial", "invalid")},
+        "parse_failure_rate": round(1 - parses.get("ok", 0) / parsed, 4) if parsed else 0.0,
+    }
+
+def _plan_tiered_extraction(user_input: str, today: str):
+    """返回 (缓存结果, 规则结果, 需要 LLM 的字段)"""
+    cached_info = EXTRACTION_CACHE.get(user_input, today)
+    if cached_info:
+        return cached_info, None, []
+    
+    rule_info, confidence = extract_info_rules(user_input)
+    low_fields = [field for field in EXTRACTION_FIELDS if confidence[field] < CONFIDENCE_THRESHOLD]
+    return None, rule_info, low_fields
+
+def _confident_fields(rule_info: dict, low_fields: List[str]) -> dict:
+    """规则已经确定、不需要 LLM 补全的字段"""
+    return {field: value for field, value in rule_info.items() if field not in low_fields}
+
+def _finish_tiered_extraction(user_input: str, today: str, rule_info: dict, llm_info: dict) -> dict:
+    if not llm_info:
+        EXTRACTION_TIER_STATS.record("fallback")
+        return rule_info
+    
+    extracted_info = dict(rule_info)
+    extracted_info.update(llm_info)
+    EXTRACTION_TIER_STATS.record("llm", list(llm_info))
+    EXTRACTION_CACHE.set(user_input, today, extracted_info)
+    return extracted_info
+
+def extract_info_rule_only(user_input: str) -> dict:
+    """仅规则模式：无法确定的字段直接使用默认值"""
+    EXTRACTION_TIER_STATS.record("rules")
+    extracted_info = extract_info_simple(user_input)
+    print(f"📏 仅规则模式: {extracted_info}")
     return extracted_info
 
+def extract_info_tiered(user_input: str) -> dict:
+    """分级信息提取：缓存 → 规则 → 仅针对低置信度字段调用 LLM"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    
+    cached_info, rule_info, low_fields = _plan_tiered_extraction(user_input, today)
+    if cached_info:
+        EXTRACTION_TIER_STATS.record("cache")
+        print(f"⚡ 命中提取缓存: {cached_info}")
+        return cached_info
+    if not low_fields:
+        EXTRACTION_TIER_STATS.record("rules")
+        print(f"📏 规则引擎已足够: {rule_info}")
+        return rule_info
+    
+    print(f"🤖 规则无法确定 {low_fields}，调用 LLM 补全")
+    llm_info = {}
+    try:
+        llm_info = guarded_llm_fields(user_input, today, low_fields, _confident_fields(rule_info, low_fields))
+    except LLMUnavailable as e:
+        print(f"⚠️  LLM 暂不可用（{e}），使用规则提取")
+    except Exception as e:
+        print(f"DeepSeek API 调用失败: {e}")
+    
+    return _finish_tiered_extraction(user_input, today, rule_info, llm_info)
+
+async def aextract_info_tiered(user_input: str) -> dict:
+    """extract_info_tiered 的异步版本"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    
+    cached_info, rule_info, low_fields = _plan_tiered_extraction(user_input, today)
+    if cached_info:
+        EXTRACTION_TIER_STATS.record("cache")
+        print(f"⚡ 命中提取缓存: {cached_info}")
+        return cached_info
+    if not low_fields:
+        EXTRACTION_TIER_STATS.record("rules")
+        print(f"📏 规则引擎已足够: {rule_info}")
+        return rule_info
+    
+    print(f"🤖 规则无法确定 {low_fields}，调用 LLM 补全")
+    llm_info = {}
+    try:
+        llm_info = await aguarded_llm_fields(user_input, today, low_fields, _confident_fields(rule_info, low_fields))
+    except LLMUnavailable as e:
+        print(f"⚠️  LLM 暂不可用（{e}），使用规则提取")
+    except Exception as e:
+        print(f"DeepSeek API 调用失败: {e}")
+    
+    return _finish_tiered_extraction(user_input, today, rule_info, llm_info)
+
 # ==================== 工具节点 ====================
 def extract_information_node(state: TravelPlanningState) -> TravelPlanningState:
     """信息提取节点"""
     print("\n📍 步骤1: 提取用户需求信息...")
     
-    user_input = state["user_input"]
-    
-    # 使用 DeepSeek API 进行智能提取
-    extracted_info = extract_info_with_llm(user_input)
+    # 分级提取：规则足够时不调用 DeepSeek
+    if RULE_ONLY:
+        extracted_info = extract_info_rule_only(state["user_input"])
+    elif TIERED_EXTRACTION:
+        extracted_info = extract_info_tiered(state["user_input"])
+    else:
+        extracted_info = extract_info_with_llm(state["user_input"])
+    return _apply_extracted_info(state, extracted_info)
+
+async def aextract_information_node(state: TravelPlanningState) -> TravelPlanningState:
+    """信息提取节点（异步）"""
+    print("\n📍 步骤1: 提取用户需求信息...")
     
+    if RULE_ONLY:
+        extracted_info = extract_info_rule_only(state["user_input"])
+    elif TIERED_EXTRACTION:
+        extracted_info = await aextract_info_tiered(state["user_input"])
+    else:
+        extracted_info = await aextract_info_with_llm(state["user_input"])
+    return _apply_extracted_info(state, extracted_info)
+
+def _apply_extracted_info(state: TravelPlanningState, extracted_info: dict) -> TravelPlanningState:
     state["extracted_info"] = extracted_info
     state["destination"] = extracted_info["destination"]
     state["travel_date"] = extracted_info["travel_date"] 
@@ -306,7 +1142,37 @@ def search_flights_node(state: TravelPlanningState) -> TravelPlanningState:
     """查询航班节点 - 改进版"""
     print(f"\n📍 步骤2: 查询前往 {state['destination']} 的航班...")
     
-    flights_result = search_flights(state["destination"], state["travel_date"])
+    flight_options = search_flight_options(state["destination"], state["travel_date"])
+    return _apply_flights_result(state, flight_options)
+
+async def asearch_flights_node(state: TravelPlanningState) -> TravelPlanningState:
+    """查询航班节点（异步）"""
+    print(f"\n📍 步骤2: 查询前往 {state['destination']} 的航班...")
+    
+    flight_options = await asearch_flight_options(state["destination"], state["travel_date"])
+    return _apply_flights_result(state, flight_options)
+
+def _shift_to_flexible_date(state: TravelPlanningState) -> List[dict]:
+    """当天无航班时改签到综合排序最好的邻近日期，返回该日期的全部航班"""
+    alternatives = search_flexible_dates(state["destination"], state["travel_date"])
+    if not alternatives:
+        return []
+    
+    best = alternatives[0]
+    state["requested_travel_date"] = state["travel_date"]
+    state["travel_date"] = best["date"]
+    state["execution_log"].append(f"🔁 {state['requested_travel_date']} 无航班，改为 {best['date']}")
+    print(f"  🔁 {state['requested_travel_date']} 无航班，改为 {best['date']}（{best['date_offset']:+d} 天）")
+    
+    flights = [flight for flight in alternatives if flight["date"] == best["date"]]
+    return sorted(flights, key=lambda flight: flight["departure_time"])
+
+def _apply_flights_result(state: TravelPlanningState, flight_options: List[dict]) -> TravelPlanningState:
+    if not flight_options and FLEXIBLE_DATE_DAYS:
+        flight_options = _shift_to_flexible_date(state)
+    
+    flights_result = cheapest_flight(flight_options)
+    state["flight_options"] = flight_options
     state["flights_result"] = flights_result
     
     if flights_result:
@@ -316,9 +1182,12 @@ def search_flights_node(state: TravelPlanningState) -> TravelPlanningState:
         print(f"     航空公司: {flights_result['airline']}")
         print(f"     价格: {flights_result['price']}元")
         print(f"     起飞时间: {flights_result['departure_time']}")
+        print(f"     当天共 {len(flight_options)} 个航班可选")
     else:
         state["current_step"] = "flights_not_found"
         state["error_message"] = f"抱歉，{state['travel_date']} 前往 {state['destination']} 的航班已售罄或暂无航班"
+        if FLEXIBLE_DATE_DAYS:
+            state["error_message"] += f"（前后 {FLEXIBLE_DATE_DAYS} 天内也没有可订航班）"
         state["execution_log"].append("❌ 未找到合适航班")
         print("  ❌ 未找到合适航班")
         print(f"  💡 建议尝试其他日期或目的地")
@@ -334,11 +1203,37 @@ def search_hotels_node(state: TravelPlanningState) -> TravelPlanningState:
         state["current_step"] = "error"
         return state
     
+    check_in_date, check_out_date = _stay_dates(state)
+    hotels_result = search_hotels(state["destination"], check_in_date, check_out_date, _booked_hotel(state))
+    return _apply_hotels_result(state, hotels_result)
+
+async def asearch_hotels_node(state: TravelPlanningState) -> TravelPlanningState:
+    """查询酒店节点（异步）"""
+    print(f"\n📍 步骤3: 查询 {state['destination']} 的酒店...")
+    
+    if not state["flights_result"]:
+        state["error_message"] = "无法查询酒店：未找到可用航班"
+        state["current_step"] = "error"
+        return state
+    
+    check_in_date, check_out_date = _stay_dates(state)
+    hotels_result = await asearch_hotels(state["destination"], check_in_date, check_out_date, _booked_hotel(state))
+    return _apply_hotels_result(state, hotels_result)
+
+def _booked_hotel(state: TravelPlanningState) -> Optional[str]:
+    """该规划此前已按幂等键订到的酒店，没有时返回 None"""
+    key = state.get("idempotency_key")
+    booking = BOOKING_LEDGER.peek(key) if key else None
+    return booking["hotel_name"] if booking else None
+
+def _stay_dates(state: TravelPlanningState) -> tuple:
+    """根据出行日期和晚数计算入住、离店日期"""
     check_in_date = state["travel_date"]
     check_out_date = (datetime.strptime(check_in_date, "%Y-%m-%d") + 
                      timedelta(days=state["nights"])).strftime("%Y-%m-%d")
-    
-    hotels_result = search_hotels(state["destination"], check_in_date, check_out_date)
+    return check_in_date, check_out_date
+
+def _apply_hotels_result(state: TravelPlanningState, hotels_result: List[dict]) -> TravelPlanningState:
     state["hotels_result"] = hotels_result
     
     if hotels_result:
@@ -348,6 +1243,12 @@ def search_hotels_node(state: TravelPlanningState) -> TravelPlanningState:
         for i, hotel in enumerate(hotels_result, 1):
             total_price = hotel["price_per_night"] * state["nights"]
             print(f"     {i}. {hotel['name']} - 评分: {hotel['rating']} - {hotel['price_per_night']}元/晚 (总计: {total_price}元)")
+    elif get_hotel_inventory(HOTEL_INVENTORY_PATH).query(state["destination"]):
+        # 当地有酒店，只是入住期间都没有空房
+        state["current_step"] = "hotels_sold_out"
+        state["error_message"] = f"抱歉，{state['destination']} 的酒店在入住期间均已满房"
+        state["execution_log"].append("❌ 酒店均已满房")
+        print("  ❌ 酒店均已满房")
     else:
         state["current_step"] = "hotels_not_found"
         state["error_message"] = f"抱歉，未找到 {state['destination']} 的可用酒店"
@@ -356,6 +1257,59 @@ def search_hotels_node(state: TravelPlanningState) -> TravelPlanningState:
     
     return state
 
+# ==================== 并行查询节点 ====================
+# 并行分支在同一步内执行，只能写各自的字段，日志和步骤状态统一由汇合节点写入
+def search_flights_branch_node(state: TravelPlanningState) -> dict:
+    """并行查询航班分支"""
+    print(f"\n📍 步骤2: 查询前往 {state['destination']} 的航班（并行）...")
+    return {"flight_options": search_flight_options(state["destination"], state["travel_date"])}
+
+async def asearch_flights_branch_node(state: TravelPlanningState) -> dict:
+    """并行查询航班分支（异步）"""
+    print(f"\n📍 步骤2: 查询前往 {state['destination']} 的航班（并行）...")
+    return {"flight_options": await asearch_flight_options(state["destination"], state["travel_date"])}
+
+def search_hotels_branch_node(state: TravelPlanningState) -> dict:
+    """并行查询酒店分支"""
+    print(f"\n📍 步骤3: 查询 {state['destination']} 的酒店（并行）...")
+    check_in_date, check_out_date = _stay_dates(state)
+    return {"hotels_result": search_hotels(state["destination"], check_in_date, check_out_date, _booked_hotel(state))}
+
+async def asearch_hotels_branch_node(state: TravelPlanningState) -> dict:
+    """并行查询酒店分支（异步）"""
+    print(f"\n📍 步骤3: 查询 {state['destination']} 的酒店（并行）...")
+    check_in_date, check_out_date = _stay_dates(state)
+    return {"hotels_result": await asearch_hotels(state["destination"], check_in_date, check_out_date, _booked_hotel(state))}
+
+def join_searches_node(state: TravelPlanningState) -> TravelPlanningState:
+    """汇合节点：没有航班时丢弃酒店结果；航班改到邻近日期时按新的入住日期重新查询酒店"""
+    print(f"\n📍 汇合航班与酒店查询结果...")
+    
+    searched_date, hotels_result = state["travel_date"], state["hotels_result"]
+    state = _apply_flights_result(state, state["flight_options"])
+    if not state["flights_result"]:
+        state["hotels_result"] = []
+        return state
+    
+    if state["travel_date"] != searched_date:
+        # 并行分支按原日期查询的酒店不适用于新的入住日期
+        hotels_result = search_hotels(state["destination"], *_stay_dates(state), _booked_hotel(state))
+    return _apply_hotels_result(state, hotels_result)
+
+async def ajoin_searches_node(state: TravelPlanningState) -> TravelPlanningState:
+    """汇合节点（异步）"""
+    print(f"\n📍 汇合航班与酒店查询结果...")
+    
+    searched_date, hotels_result = state["travel_date"], state["hotels_result"]
+    state = _apply_flights_result(state, state["flight_options"])
+    if not state["flights_result"]:
+        state["hotels_result"] = []
+        return state
+    
+    if state["travel_date"] != searched_date:
+        hotels_result = await asearch_hotels(state["destination"], *_stay_dates(state), _booked_hotel(state))
+    return _apply_hotels_result(state, hotels_result)
+
 def select_hotel_node(state: TravelPlanningState) -> TravelPlanningState:
     """选择酒店节点"""
     print(f"\n📍 步骤4: 选择酒店...")
@@ -365,20 +1319,15 @@ def select_hotel_node(state: TravelPlanningState) -> TravelPlanningState:
         state["current_step"] = "error"
         return state
     
-    hotels = state["hotels_result"]
-    
-    # 智能选择策略：选择性价比最高的（评分/价格）
-    best_hotel = None
-    best_score = 0
-    
-    for hotel in hotels:
-        # 简单的性价比计算：评分 * 100 / 价格
-        value_score = (hotel.get("rating", 4.0) * 100) / hotel["price_per_night"]
-        if value_score > best_score:
-            best_score = value_score
-            best_hotel = hotel
+    # 智能选择策略：向量化多指标打分（默认即性价比 评分/价格），保留前 K 名作为备选
+    ranked = rank_hotels(
+        state["hotels_result"], state["nights"], state.get("budget"),
+        HOTEL_RANKING_WEIGHTS, HOTEL_TOP_K
+    )
+    best_hotel = ranked[0][0]
     
     state["selected_hotel"] = best_hotel
+    state["hotel_alternatives"] = [hotel for hotel, _ in ranked[1:]]
     state["current_step"] = "hotel_selected"
     state["execution_log"].append(f"✅ 已选择酒店: {best_hotel['name']}")
     
@@ -387,9 +1336,15 @@ def select_hotel_node(state: TravelPlanningState) -> TravelPlanningState:
     print(f"     评分: {best_hotel['rating']}")
     print(f"     价格: {best_hotel['price_per_night']}元/晚")
     print(f"     总价: {total_price}元 ({state['nights']}晚)")
+    for hotel in state["hotel_alternatives"]:
+        print(f"     备选: {hotel['name']} - 评分: {hotel['rating']} - {hotel['price_per_night']}元/晚")
     
     return state
 
+async def aselect_hotel_node(state: TravelPlanningState) -> TravelPlanningState:
+    """选择酒店节点（异步）：纯计算，直接复用同步实现"""
+    return select_hotel_node(state)
+
 def booking_node(state: TravelPlanningState) -> TravelPlanningState:
     """预订节点"""
     print(f"\n📍 步骤5: 执行预订操作...")
@@ -399,12 +1354,57 @@ def booking_node(state: TravelPlanningState) -> TravelPlanningState:
         state["current_step"] = "error"
         return state
     
-    flight_number = state["flights_result"]["flight_number"]
-    hotel_name = state["selected_hotel"]["name"]
-    guest_name = state["guest_name"]
+    # 首选酒店满房时依次尝试备选酒店
+    for hotel in _booking_candidates(state):
+        booking_result = book_flight_and_hotel(
+            state["flights_result"]["flight_number"], hotel["name"], state["guest_name"],
+            state.get("idempotency_key"), state["travel_date"], state["nights"]
+        )
+        if booking_result["status"] != "sold_out":
+            break
+        print(f"  ⚠️  {hotel['name']} 已满房，尝试备选酒店")
+    return _apply_booking_result(state, booking_result)
+
+async def abooking_node(state: TravelPlanningState) -> TravelPlanningState:
+    """预订节点（异步）"""
+    print(f"\n📍 步骤5: 执行预订操作...")
+    
+    if not state["flights_result"] or not state["selected_hotel"]:
+        state["error_message"] = "无法执行预订：缺少航班或酒店信息"
+        state["current_step"] = "error"
+        return state
+    
+    for hotel in _booking_candidates(state):
+        booking_result = await abook_flight_and_hotel(
+            state["flights_result"]["flight_number"], hotel["name"], state["guest_name"],
+            state.get("idempotency_key"), state["travel_date"], state["nights"]
+        )
+        if booking_result["status"] != "sold_out":
+            break
+        print(f"  ⚠️  {hotel['name']} 已满房，尝试备选酒店")
+    return _apply_booking_result(state, booking_result)
+
+def _booking_candidates(state: TravelPlanningState) -> List[dict]:
+    return [state["selected_hotel"]] + list(state.get("hotel_alternatives") or [])
+
+def _apply_booking_result(state: TravelPlanningState, booking_result: dict) -> TravelPlanningState:
+    flight_number = booking_result["flight_number"]
+    hotel_name = booking_result["hotel_name"]
+    guest_name = booking_result["guest_name"]
+    
+    if booking_result["status"] == "sold_out":
+        state["error_message"] = "无法执行预订：所选酒店及备选酒店在入住期间均已满房"
+        state["current_step"] = "booking_sold_out"
+        return state
     
-    booking_result = book_flight_and_hotel(flight_number, hotel_name, guest_name)
     state["booking_result"] = booking_result
+    # 实际订到的是备选酒店时，更新所选酒店与备选列表
+    candidates = _booking_candidates(state)
+    booked = next((hotel for hotel in candidates if hotel["name"] == hotel_name), None)
+    if booked is not None and booked is not state["selected_hotel"]:
+        state["selected_hotel"] = booked
+        state["hotel_alternatives"] = [hotel for hotel in candidates if hotel is not booked]
+    
     state["current_step"] = "booking_completed"
     state["execution_log"].append("✅ 预订完成")
     
@@ -423,10 +1423,17 @@ def error_handling_node(state: TravelPlanningState) -> TravelPlanningState:
     state["execution_log"].append(f"❌ 流程中断: {state['error_message']}")
     return state
 
+async def aerror_handling_node(state: TravelPlanningState) -> TravelPlanningState:
+    """错误处理节点（异步）"""
+    return error_handling_node(state)
+
 # ==================== 条件路由 ====================
 def route_after_extraction(state: TravelPlanningState) -> str:
     return "search_flights"
 
+def route_to_parallel_searches(state: TravelPlanningState) -> List[str]:
+    return ["search_flights", "search_hotels"]
+
 def route_after_flight_search(state: TravelPlanningState) -> str:
     if state["flights_result"]:
         return "search_hotels"
@@ -439,6 +1446,12 @@ def route_after_hotel_search(state: TravelPlanningState) -> str:
     else:
         return "error"
 
+def route_after_join(state: TravelPlanningState) -> str:
+    if state["flights_result"] and state["hotels_result"]:
+        return "select_hotel"
+    else:
+        return "error"
+
 def route_after_hotel_selection(state: TravelPlanningState) -> str:
     if state["selected_hotel"]:
         return "booking"
@@ -452,27 +1465,148 @@ def route_after_booking(state: TravelPlanningState) -> str:
         return "error"
 
 # ==================== 构建工作流 ====================
-def create_travel_agent():
-    """创建旅行规划Agent"""
+def _build_workflow(nodes: Dict[str, Callable], parallel_search: bool):
+    """按节点实现组装工作流，同步/异步两套节点共享同一拓扑"""
+    from langgraph.graph import END, StateGraph
+    
     workflow = StateGraph(TravelPlanningState)
     
-    workflow.add_node("extract_information", extract_information_node)
-    workflow.add_node("search_flights", search_flights_node)
-    workflow.add_node("search_hotels", search_hotels_node)
-    workflow.add_node("select_hotel", select_hotel_node)
-    workflow.add_node("booking", booking_node)
-    workflow.add_node("error", error_handling_node)
+    for name, node in nodes.items():
+        workflow.add_node(name, METRICS.instrument_node(name, node) if METRICS_ENABLED else node)
+    
+    # 路由也包一层，统计每个节点之后走了成功路径还是 error
+    track = METRICS.instrument_route if METRICS_ENABLED else (lambda source, route: route)
     
     workflow.set_entry_point("extract_information")
     
-    workflow.add_conditional_edges("extract_information", route_after_extraction, {"search_flights": "search_flights"})
-    workflow.add_conditional_edges("search_flights", route_after_flight_search, {"search_hotels": "search_hotels", "error": "error"})
-    workflow.add_conditional_edges("search_hotels", route_after_hotel_search, {"select_hotel": "select_hotel", "error": "error"})
-    workflow.add_conditional_edges("select_hotel", route_after_hotel_selection, {"booking": "booking", "error": "error"})
-    workflow.add_conditional_edges("booking", route_after_booking, {"end": END, "error": "error"})
+    if parallel_search:
+        # 扇出：提取完成后同时查询航班和酒店；汇合：两者都完成后再判断走向
+        workflow.add_conditional_edges("extract_information", track("extract_information", route_to_parallel_searches), {"search_flights": "search_flights", "search_hotels": "search_hotels"})
+        workflow.add_edge(["search_flights", "search_hotels"], "join_searches")
+        workflow.add_conditional_edges("join_searches", track("join_searches", route_after_join), {"select_hotel": "select_hotel", "error": "error"})
+    else:
+        workflow.add_conditional_edges("extract_information", track("extract_information", route_after_extraction), {"search_flights": "search_flights"})
+        workflow.add_conditional_edges("search_flights", track("search_flights", route_after_flight_search), {"search_hotels": "search_hotels", "error": "error"})
+        workflow.add_conditional_edges("search_hotels", track("search_hotels", route_after_hotel_search), {"select_hotel": "select_hotel", "error": "error"})
+    workflow.add_conditional_edges("select_hotel", track("select_hotel", route_after_hotel_selection), {"booking": "booking", "error": "error"})
+    workflow.add_conditional_edges("booking", track("booking", route_after_booking), {"end": END, "error": "error"})
     workflow.add_edge("error", END)
     
-    return workflow.compile()
+    return workflow
+
+def create_travel_agent(parallel_search: Optional[bool] = None, checkpointer=None):
+    """创建旅行规划Agent
+
+    parallel_search 为 True 时航班与酒店并行查询，默认取 PARALLEL_SEARCH；
+    checkpointer 默认按 CHECKPOINT_BACKEND 创建，配合 run_plan 按 thread_id 续跑。
+    """
+    if parallel_search is None:
+        parallel_search = PARALLEL_SEARCH
+    
+    nodes = {
+        "extract_information": extract_information_node,
+        "search_flights": search_flights_node,
+        "search_hotels": search_hotels_node,
+        "select_hotel": select_hotel_node,
+        "booking": booking_node,
+        "error": error_handling_node,
+    }
+    if parallel_search:
+        nodes["search_flights"] = search_flights_branch_node
+        nodes["search_hotels"] = search_hotels_branch_node
+        nodes["join_searches"] = join_searches_node
+    
+    if checkpointer is None and CHECKPOINT_BACKEND:
+        from checkpoints import create_checkpointer
+        checkpointer = create_checkpointer(CHECKPOINT_BACKEND, CHECKPOINT_DB)
+    return _build_workflow(nodes, parallel_search).compile(checkpointer=checkpointer)
+
+def create_async_travel_agent(parallel_search: Optional[bool] = None, checkpointer=None):
+    """创建异步旅行规划Agent，使用 ainvoke / astream 调用，单个事件循环即可承载大量并发规划"""
+    if parallel_search is None:
+        parallel_search = PARALLEL_SEARCH
+    
+    nodes = {
+        "extract_information": aextract_information_node,
+        "search_flights": asearch_flights_node,
+        "search_hotels": asearch_hotels_node,
+        "select_hotel": aselect_hotel_node,
+        "booking": abooking_node,
+        "error": aerror_handling_node,
+    }
+    if parallel_search:
+        nodes["search_flights"] = asearch_flights_branch_node
+        nodes["search_hotels"] = asearch_hotels_branch_node
+        nodes["join_searches"] = ajoin_searches_node
+    
+    if checkpointer is None and CHECKPOINT_BACKEND:
+        from checkpoints import create_checkpointer
+        checkpointer = create_checkpointer(CHECKPOINT_BACKEND, CHECKPOINT_DB)
+    return _build_workflow(nodes, parallel_search).compile(checkpointer=checkpointer)
+
+# ==================== 断点续跑 ====================
+def plan_idempotency_key(thread_id: str, user_input: str, today: Optional[str] = None) -> str:
+    """同一会话中同一天同一需求的预订幂等键：从检查点续跑或整体重试都不会重复预订
+
+    today（YYYY-MM-DD，默认今天）是解析"明天"等相对日期的基准，也计入幂等键：改天重跑同一句话
+    会解析出新的出行日期，应当是一笔新的预订，而不是取回之前那一笔。
+    """
+    today = today or datetime.now().strftime("%Y-%m-%d")
+    return hashlib.sha256(f"{thread_id}\n{today}\n{user_input}".encode("utf-8")).hexdigest()[:32]
+
+def _plan_start(snapshot, user_input: str, thread_id: str, budget: Optional[float],
+                idempotency_key: Optional[str]) -> tuple:
+    """根据检查点快照（没有检查点时为 None）决定如何执行规划，返回 (图的输入, 当前状态, 是否已完成)
+
+    只有输入与幂等键都与检查点一致时才续跑或返回保存的结果，改天重跑同一句话会重新规划。
+    """
+    idempotency_key = idempotency_key or plan_idempotency_key(thread_id, user_input)
+    if (snapshot is not None and snapshot.values and snapshot.values.get("user_input") == user_input
+            and snapshot.values.get("idempotency_key") == idempotency_key):
+        # 检查点不保存值为 None 的字段，用初始状态补齐
+        state = {**create_initial_state(user_input, budget), **snapshot.values}
+        if snapshot.next:
+            print(f"♻️  从检查点继续: {', '.join(snapshot.next)}")
+        return None, state, not snapshot.next
+    initial_state = create_initial_state(user_input, budget, idempotency_key)
+    return initial_state, dict(initial_state), False
+
+def plan_start(agent, user_input: str, thread_id: str, budget: Optional[float] = None,
+               idempotency_key: Optional[str] = None) -> tuple:
+    """run_plan 的续跑判断，供自行驱动图的调用方（如逐节点流式输出）使用
+
+    返回 (配置, 图的输入, 当前状态, 是否已完成)：同一输入已完成时当前状态即保存的结果，不应再执行图；
+    中途中断时图的输入为 None，从最后完成的节点继续；否则图的输入为新的初始状态。
+    """
+    from checkpoints import thread_config
+    
+    config = thread_config(thread_id)
+    snapshot = agent.get_state(config) if agent.checkpointer is not None else None
+    return (config, *_plan_start(snapshot, user_input, thread_id, budget, idempotency_key))
+
+def run_plan(agent, user_input: str, thread_id: str, budget: Optional[float] = None,
+             idempotency_key: Optional[str] = None) -> TravelPlanningState:
+    """按 thread_id 执行规划：同一输入已完成则直接返回保存的结果，中途失败则从最后完成的节点继续
+
+    agent 没有检查点时等同于 agent.invoke(create_initial_state(...))。预订幂等键默认由
+    thread_id、当天日期与 user_input 派生，调用方也可以自行提供。
+    """
+    config, graph_input, state, finished = plan_start(agent, user_input, thread_id, budget, idempotency_key)
+    if finished:
+        return state
+    return agent.invoke(graph_input, config)
+
+async def arun_plan(agent, user_input: str, thread_id: str, budget: Optional[float] = None,
+                    idempotency_key: Optional[str] = None) -> TravelPlanningState:
+    """run_plan 的异步版本"""
+    from checkpoints import thread_config
+    
+    config = thread_config(thread_id)
+    snapshot = await agent.aget_state(config) if agent.checkpointer is not None else None
+    graph_input, state, finished = _plan_start(snapshot, user_input, thread_id, budget, idempotency_key)
+    if finished:
+        return state
+    return await agent.ainvoke(graph_input, config)
 
 # ==================== 改进的交互模式 ====================
 def interactive_demo():
@@ -490,6 +1624,7 @@ def interactive_demo():
     print("=" * 60)
     
     agent = create_travel_agent()
+    warm_up_llm(background=True)
     
     while True:
         user_input = input("\n🎯 请输入您的旅行需求: ").strip()
@@ -506,13 +1641,7 @@ def interactive_demo():
         print(f"📝 处理中: {user_input}")
         print("=" * 60)
         
-        initial_state: TravelPlanningState = {
-            "user_input": user_input,
-            "guest_name": "", "destination": "", "travel_date": "", "nights": 0,
-            "extracted_info": {}, "flights_result": None, "hotels_result": [],
-            "selected_hotel": None, "booking_result": None, "current_step": "start",
-            "error_message": None, "execution_log": []
-        }
+        initial_state = create_initial_state(user_input)
         
         try:
             final_state = agent.invoke(initial_state)
@@ -537,6 +1666,8 @@ def interactive_demo():
                 print(f"   👤 客人: {booking['guest_name']}")
                 print(f"   💰 总费用: {total_cost}元")
                 print(f"   📅 行程: {final_state['travel_date']} 起, {final_state['nights']}晚")
+                if final_state.get("requested_travel_date"):
+                    print(f"   🔁 原定 {final_state['requested_travel_date']} 无航班，已改为上述日期")
                 print(f"   ⏰ 预订时间: {booking['timestamp']}")
                 print(f"\n   💌 {booking['message']}")
             elif final_state["error_message"]:
@@ -0,0 +1,368 @@
+# travel_service.py
+"""旅行规划 HTTP 服务（asyncio，仅依赖标准库）
+
+在同一个编译好的 create_travel_agent() 图上提供：
+    POST /v1/plan          单个规划，返回结果记录（与 batch_planner 的输出格式相同）
+    POST /v1/plan/batch    批量规划，{"requests": [...]}，按顺序返回结果
+    POST /v1/plan/stream   以 SSE 逐个推送节点结果（event: node），最后推送 event: done
+    GET  /healthz          存活、工作池与 LLM 熔断器状态
+    GET  /metrics          Prometheus 文本格式指标
+
+图在固定大小的线程池中执行；在途 + 排队的规划数超过上限时直接返回 503 和 Retry-After，
+而不是无限排队拖垮延迟，负载均衡器可以据此把请求转给其他实例。
+
+运行方式：
+    python travel_service.py --port 8080 --workers 16 --queue-size 64
+    curl -s localhost:8080/v1/plan -d '{"user_input": "明天去上海，住两晚，我叫李华"}'
+    curl -N localhost:8080/v1/plan/stream -d '{"user_input": "后天去杭州住三晚"}'
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Dict, List, Optional, Tuple
+
+import travel_agent
+from batch_planner import summarize_state
+from booking_ledger import BookingLedger
+from checkpoints import create_checkpointer
+from metrics import label_set
+from travel_agent import METRICS, create_travel_agent, plan_start, run_plan
+
+# ==================== 配置区域 ====================
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_WORKERS = 8          # 同时执行的规划数（线程池大小）
+DEFAULT_QUEUE_SIZE = 32      # 超出 workers 后最多排队的规划数，再多返回 503
+MAX_BATCH_SIZE = 100         # 单个批量请求最多包含的规划数
+MAX_BODY_BYTES = 1 << 20
+RETRY_AFTER_S = 1
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+# ==================== 工作池与背压 ====================
+class WorkerPool:
+    """固定大小的线程池 + 准入控制：在途与排队的规划总数不超过 workers + queue_size"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.admitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan")
+        self._lock = threading.Lock()
+
+    def try_admit(self, count: int = 1) -> bool:
+        """为 count 个规划预留名额，名额不足时一个也不预留"""
+        with self._lock:
+            if self.admitted + count > self.capacity:
+                self.rejected += count
+                return False
+            self.admitted += count
+            return True
+
+    def done(self, count: int = 1):
+        with self._lock:
+            self.admitted -= count
+            self.completed += count
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.admitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+# ==================== 规划 ====================
+def parse_plan_request(payload) -> dict:
+    """校验单个规划请求：{"user_input": ..., "budget"?, "thread_id"?, "idempotency_key"?}"""
+    if isinstance(payload, str):
+        payload = {"user_input": payload}
+    if not isinstance(payload, dict) or not isinstance(payload.get("user_input"), str) \
+            or not payload["user_input"].strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "缺少 user_input")
+    request = dict(payload)
+    request.setdefault("thread_id", uuid.uuid4().hex)
+    return request
+
+class TravelService:
+    def __init__(self, agent, pool: WorkerPool):
+        self.agent = agent
+        self.pool = pool
+        METRICS.register_collected(
+            "travel_service_pool", "规划工作池状态",
+            lambda: {label_set(field=field): value for field, value in self.pool.stats().items()}
+        )
+
+    def plan(self, request: dict) -> dict:
+        """在工作线程中执行单个规划，异常也转换为结果记录"""
+        start = time.perf_counter()
+        try:
+            final_state = run_plan(
+                self.agent, request["user_input"], request["thread_id"],
+                request.get("budget"), request.get("idempotency_key")
+            )
+            result = summarize_state(final_state)
+        except Exception as e:
+            result = {"status": "error", "error_message": f"{type(e).__name__}: {e}"}
+        result["thread_id"] = request["thread_id"]
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        return result
+
+    def _admit(self, count: int = 1):
+        if not self.pool.try_admit(count):
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "服务繁忙，请稍后重试",
+                            {"Retry-After": str(RETRY_AFTER_S)})
+
+    async def handle_plan(self, payload) -> dict:
+        request = parse_plan_request(payload)
+        self._admit()
+        try:
+            return await self.pool.run(self.plan, request)
+        finally:
+            self.pool.done()
+
+    async def handle_batch(self, payload) -> dict:
+        requests = payload.get("requests") if isinstance(payload, dict) else None
+        if not isinstance(requests, list) or not requests:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "缺少 requests 数组")
+        # 超过工作池容量的批次永远无法整批准入，直接 413 而不是让客户端按 Retry-After 无限重试
+        limit = min(MAX_BATCH_SIZE, self.pool.capacity)
+        if len(requests) > limit:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"单次最多 {limit} 个规划")
+        requests = [parse_plan_request(request) for request in requests]
+
+        # 整批一次性准入：要么全部排队执行，要么整体返回 503，不会只执行一半
+        self._admit(len(requests))
+        start = time.perf_counter()
+        try:
+            results = await asyncio.gather(*(self.pool.run(self.plan, request) for request in requests))
+        finally:
+            self.pool.done(len(requests))
+        return {"results": results, "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+    def stream_plan(self, request: dict, emit):
+        """在工作线程中逐节点执行图，每个节点完成后调用 emit(event, data)
+
+        与 run_plan 相同的续跑逻辑：同一 thread_id 的同一需求已完成时直接推送保存的结果，不会再次预订；
+        中途中断时只推送剩余的节点。
+        """
+        start = time.perf_counter()
+        try:
+            config, graph_input, state, finished = plan_start(
+                self.agent, request["user_input"], request["thread_id"],
+                request.get("budget"), request.get("idempotency_key")
+            )
+            # 已完成时不再执行图
+            updates = [] if finished else self.agent.stream(graph_input, config)
+            for update in updates:
+                for node_name, node_output in update.items():
+                    if not isinstance(node_output, dict):
+                        continue
+                    # 并行分支只返回自己写入的字段，合并后得到完整状态
+                    state.update(node_output)
+                    emit("node", {"node": node_name, "current_step": state.get("current_step"),
+                                  "output": node_output})
+            result = summarize_state(state)
+        except Exception as e:
+            result = {"status": "error", "error_message": f"{type(e).__name__}: {e}"}
+        result["thread_id"] = request["thread_id"]
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        emit("done", result)
+
+# ==================== HTTP ====================
+def _encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes, str]]:
+    """读取一个 HTTP/1.1 请求，连接已关闭时返回 None"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "请求头过大")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "无效的请求行")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "无效的 Content-Length")
+    if length < 0:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "无效的 Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "请求体过大")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body, version
+
+async def write_response(writer: asyncio.StreamWriter, status: HTTPStatus, body: bytes,
+                         content_type: str = "application/json; charset=utf-8",
+                         headers: Optional[Dict[str, str]] = None, keep_alive: bool = True):
+    lines = [f"HTTP/1.1 {status.value} {status.phrase}", f"Content-Type: {content_type}",
+             f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+class HTTPServer:
+    def __init__(self, service: TravelService):
+        self.service = service
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body, version = request
+                    keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                    if method == "POST" and path == "/v1/plan/stream":
+                        await self.stream(writer, self._json(body))
+                        break
+                    status, payload, extra_headers = await self.dispatch(method, path, body)
+                except HTTPError as e:
+                    status, payload, extra_headers, keep_alive = e.status, {"error": str(e)}, e.headers, False
+
+                if isinstance(payload, str):
+                    await write_response(writer, status, payload.encode("utf-8"),
+                                         "text/plain; version=0.0.4; charset=utf-8", extra_headers, keep_alive)
+                else:
+                    await write_response(writer, status, _encode(payload), headers=extra_headers, keep_alive=keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _json(body: bytes):
+        try:
+            return json.loads(body or b"null")
+        except json.JSONDecodeError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "请求体不是有效的 JSON")
+
+    async def dispatch(self, method: str, path: str, body: bytes):
+        if method == "POST" and path == "/v1/plan":
+            return HTTPStatus.OK, await self.service.handle_plan(self._json(body)), None
+        if method == "POST" and path == "/v1/plan/batch":
+            return HTTPStatus.OK, await self.service.handle_batch(self._json(body)), None
+        if method == "GET" and path == "/healthz":
+            return HTTPStatus.OK, {
+                "status": "ok", "pool": self.service.pool.stats(),
+                "llm_circuit": travel_agent.CIRCUIT_BREAKER.stats(),
+            }, None
+        if method == "GET" and path == "/metrics":
+            return HTTPStatus.OK, METRICS.to_prometheus(), None
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"未知的接口: {method} {path}")
+
+    async def stream(self, writer: asyncio.StreamWriter, payload):
+        """SSE：每个节点完成后推送一个事件，客户端无需等待整个规划结束"""
+        request = parse_plan_request(payload)
+        self.service._admit()
+
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        emit = lambda event, data: loop.call_soon_threadsafe(events.put_nowait, (event, data))
+        worker = self.service.pool.run(self.service.stream_plan, request, emit)
+        task = asyncio.ensure_future(worker)
+        task.add_done_callback(lambda _: self.service.pool.done())
+
+        writer.write((
+            "HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+            "Cache-Control: no-cache\r\nConnection: close\r\n\r\n"
+        ).encode("latin-1"))
+        await writer.drain()
+        while True:
+            event, data = await events.get()
+            writer.write(f"event: {event}\ndata: ".encode("utf-8") + _encode(data) + b"\n\n")
+            await writer.drain()
+            if event == "done":
+                break
+        await task
+
+# ==================== 命令行入口 ====================
+async def serve(host: str, port: int, service: TravelService):
+    server = await asyncio.start_server(HTTPServer(service).handle_connection, host, port)
+    address = server.sockets[0].getsockname()
+    print(f"🌐 旅行规划服务: http://{address[0]}:{address[1]} "
+          f"(workers={service.pool.workers}, 容量={service.pool.capacity})", file=sys.stderr, flush=True)
+    async with server:
+        await server.serve_forever()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="旅行规划 HTTP 服务")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="同时执行的规划数")
+    parser.add_argument("-q", "--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="超出 workers 后最多排队的规划数，再多返回 503")
+    parser.add_argument("--parallel-search", action="store_true", default=None, help="并行查询航班和酒店")
+    parser.add_argument("--rule-only", action="store_true", help="只用规则引擎提取信息")
+    parser.add_argument("--checkpoint-db", help="把每一步的状态写入该 SQLite 文件")
+    parser.add_argument("--ledger-db", help="预订账本写入该 SQLite 文件")
+    parser.add_argument("--batch-window-ms", type=float, default=0.0,
+                        help="把该窗口内并发的信息提取合并成一次 LLM 调用（毫秒），0 表示不合并")
+    parser.add_argument("-v", "--verbose", action="store_true", help="保留各节点的打印输出")
+    args = parser.parse_args(argv)
+    if args.rule_only:
+        travel_agent.configure(rule_only=True)
+    if args.ledger_db:
+        travel_agent.configure(ledger=BookingLedger(args.ledger_db))
+    if args.batch_window_ms > 0:
+        travel_agent.configure(extraction_batching=True)
+        travel_agent.EXTRACTION_BATCHER.window_s = args.batch_window_ms / 1000
+
+    checkpointer = create_checkpointer("sqlite", args.checkpoint_db) if args.checkpoint_db else None
+    service = TravelService(
+        create_travel_agent(parallel_search=args.parallel_search, checkpointer=checkpointer),
+        WorkerPool(args.workers, args.queue_size)
+    )
+    travel_agent.warm_up_llm(background=True)
+
+    try:
+        if args.verbose:
+            asyncio.run(serve(args.host, args.port, service))
+        else:
+            # 节点中的 print 在服务中只是噪音，统一丢弃
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                asyncio.run(serve(args.host, args.port, service))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.pool.shutdown()
+
+if __name__ == "__main__":
+    main()